@@ -0,0 +1,6 @@
+"""
+性能基准
+
+synthetic_dicom 生成可离线使用的合成 CT 序列，run_benchmarks 分阶段测量读取、解析、
+管线初始化、首帧、交互帧与图像编码耗时，并输出 JSON 便于版本间对比。
+"""
@@ -0,0 +1,522 @@
+"""
+wslink 多客户端压测
+
+启动 N 个模拟 websocket 客户端，按脚本回放真实操作：start_render、订阅图像推送、
+窗宽窗位拖动、colormap 切换以及经 vtkWebMouseHandler 的鼠标旋转。
+按并发数逐级加压，报告每个 RPC 与每帧的延迟分位数、吞吐以及服务端内存。
+
+目标可以是已运行的 `_WebVR`（--url），也可以由压测脚本在本机拉起一个
+（默认，数据为合成 CT 序列，--workers 大于 1 时经前置路由分发到多个 worker）。
+
+用法（在仓库根目录）：
+    python -m benchmarks.load_test --clients 1 2 4 8 --duration 20
+    python -m benchmarks.load_test --url ws://host:1234/ws --secret KEY --dicom-dir /data/series
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import msgpack
+from wslink.chunking import UnChunker, generate_chunks
+
+from benchmarks.run_benchmarks import DEFAULT_DATA_DIR, DEFAULT_RESULTS_DIR, SRC_DIR, summarize
+from benchmarks.synthetic_dicom import generate_ct_series, parse_size
+
+# 延迟报告的分位数
+PERCENTILES = (50, 90, 99)
+
+IMAGE_TOPIC = "viewport.image.push.subscription"
+
+# colormap 切换时轮流使用的预设
+COLORMAPS = [
+    [[-1000, 0, 0, 0], [0, 0.9, 0.8, 0.8], [400, 1, 1, 1]],
+    [[-1000, 0, 0, 0], [-500, 0.2, 0.1, 0.1], [300, 1, 0.7, 0.7], [1500, 1, 1, 1]],
+    [[-200, 0, 0, 0], [200, 0.8, 0.2, 0.1], [1000, 1, 1, 0.9]],
+]
+
+
+class WslinkError(Exception):
+    """服务端返回的 RPC 错误"""
+
+
+@dataclass
+class ClientStats:
+    """单个客户端的采样结果（秒）"""
+
+    rpc: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    frame_latency: List[float] = field(default_factory=list)
+    frames: int = 0
+    frame_bytes: int = 0
+
+
+class WslinkClient:
+    """
+    最小的 wslink websocket 客户端
+
+    与浏览器端 wslink 相同的 msgpack + 分块协议；图像推送按到达时间统计，
+    每次交互 RPC 之后收到的第一帧计为该交互的帧延迟。
+    """
+
+    def __init__(self, url: str, secret: str, name: str = "c0"):
+        self.url = url
+        self.secret = secret
+        self.name = name
+        self.stats = ClientStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._unchunker = UnChunker()
+        self._unchunker.set_max_message_size(4 * 1024 ** 3)
+        self._max_msg_size = 0
+        # 最近一次交互发出的时间，收到下一帧时清空
+        self._awaiting_frame: Optional[float] = None
+        self._frame_event = asyncio.Event()
+
+    async def connect(self) -> None:
+        self._session = aiohttp.ClientSession()
+        self._ws = await self._session.ws_connect(self.url, max_msg_size=0)
+        self._reader = asyncio.create_task(self._read_loop())
+        reply = await self._send("system:c0:0", "wslink.hello", [{"secret": self.secret}])
+        self._max_msg_size = reply.get("maxMsgSize", 0)
+
+    async def close(self) -> None:
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._session is not None:
+            await self._session.close()
+
+    async def _send(self, rpc_id: str, method: str, args=None, kwargs=None) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[rpc_id] = future
+        message = msgpack.packb({
+            "wslink": "1.0",
+            "id": rpc_id,
+            "method": method,
+            "args": args or [],
+            "kwargs": kwargs or {},
+        })
+        for chunk in generate_chunks(message, self._max_msg_size):
+            await self._ws.send_bytes(chunk)
+        return await future
+
+    async def call(self, method: str, *args, interactive: bool = False, **kwargs) -> Any:
+        """调用 RPC 并记录往返延迟；interactive 为 True 时同时等待并统计下一帧"""
+        rpc_id = f"rpc:{self.name}:{next(self._ids)}"
+        start = time.perf_counter()
+        if interactive and self._awaiting_frame is None:
+            self._awaiting_frame = start
+        try:
+            result = await self._send(rpc_id, method, list(args), kwargs)
+        except WslinkError:
+            self.stats.errors[method] = self.stats.errors.get(method, 0) + 1
+            raise
+        finally:
+            self.stats.rpc.setdefault(method, []).append(time.perf_counter() - start)
+        return result
+
+    async def wait_for_frame(self, timeout: float = 5.0) -> bool:
+        """等待当前交互对应的帧到达，超时返回 False"""
+        if self._awaiting_frame is None:
+            return True
+        try:
+            await asyncio.wait_for(self._frame_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._awaiting_frame = None
+            return False
+        finally:
+            self._frame_event.clear()
+
+    async def _read_loop(self) -> None:
+        try:
+            async for msg in self._ws:
+                if msg.type != aiohttp.WSMsgType.BINARY:
+                    if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.ERROR):
+                        break
+                    continue
+                # 分块拼齐后 UnChunker 直接返回 msgpack 解码后的消息
+                message = self._unchunker.process_chunk(msg.data)
+                if message is not None:
+                    self._dispatch(message)
+        finally:
+            error = ConnectionError("websocket 已关闭")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        rpc_id = message.get("id", "")
+        if rpc_id.startswith("publish:"):
+            if rpc_id.split(":")[1] == IMAGE_TOPIC:
+                self._on_frame(message.get("result") or {})
+            return
+        future = self._pending.pop(rpc_id, None)
+        if future is None or future.done():
+            return
+        if "error" in message:
+            future.set_exception(WslinkError(message["error"].get("message", "RPC error")))
+        else:
+            future.set_result(message.get("result"))
+
+    def _on_frame(self, reply: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        self.stats.frames += 1
+        image = reply.get("image")
+        if isinstance(image, (bytes, bytearray)):
+            self.stats.frame_bytes += len(image)
+        if self._awaiting_frame is not None:
+            self.stats.frame_latency.append(now - self._awaiting_frame)
+            self._awaiting_frame = None
+            self._frame_event.set()
+
+
+def _mouse_event(action: str, x: float, y: float) -> Dict[str, Any]:
+    return {
+        "view": -1,
+        "action": action,
+        "x": x,
+        "y": y,
+        "buttonLeft": action != "up",
+        "buttonMiddle": False,
+        "buttonRight": False,
+        "shiftKey": False,
+        "ctrlKey": False,
+        "altKey": False,
+        "metaKey": False,
+    }
+
+
+async def run_script(client: WslinkClient, dicom_dir: str, deadline: float,
+                     interval: float = 1 / 30, drag_steps: int = 20) -> None:
+    """
+    回放一个客户端的操作脚本，直到 deadline
+
+    每轮依次为：窗宽窗位拖动、colormap 切换、鼠标旋转一圈。
+    每一步发送后等待对应的帧（或超时），再按 interval 的节奏发送下一步。
+    """
+
+    async def step(method, *args):
+        try:
+            await client.call(method, *args, interactive=True)
+        except WslinkError:
+            return
+        await client.wait_for_frame()
+        await asyncio.sleep(interval)
+
+    await client.call("app.action.start_render", {"dicom_dir": dicom_dir})
+    await client.call("viewport.image.push.observer.add", -1)
+    await client.wait_for_frame()
+
+    for loop in itertools.count():
+        # 窗宽窗位拖动
+        for i in range(drag_steps):
+            if time.perf_counter() >= deadline:
+                return
+            phase = (i / drag_steps) * 2 * math.pi
+            await step("app.action.set_window_level",
+                       400 + 300 * math.sin(phase), 40 + 200 * math.cos(phase))
+        # colormap 切换
+        if time.perf_counter() >= deadline:
+            return
+        await step("app.action.set_colormap", COLORMAPS[loop % len(COLORMAPS)])
+        # 鼠标拖动旋转
+        await step("viewport.mouse.interaction", _mouse_event("down", 0.5, 0.5))
+        for i in range(drag_steps):
+            if time.perf_counter() >= deadline:
+                break
+            angle = (i + 1) / drag_steps * 2 * math.pi
+            await step("viewport.mouse.interaction",
+                       _mouse_event("move", 0.5 + 0.3 * math.cos(angle), 0.5 + 0.3 * math.sin(angle)))
+        await step("viewport.mouse.interaction", _mouse_event("up", 0.5, 0.5))
+
+
+def _process_tree_rss(pid: int) -> Optional[int]:
+    """本机进程及其子进程的常驻内存之和（字节），仅 Linux"""
+    total = 0
+    stack = [pid]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    try:
+        while stack:
+            current = stack.pop()
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+    except (OSError, ValueError):
+        return total or None
+    return total
+
+
+async def _sample_memory(monitor: Optional[WslinkClient], pid: Optional[int],
+                         samples: List[int], interval: float) -> None:
+    while True:
+        rss = None
+        if pid is not None:
+            rss = _process_tree_rss(pid)
+        elif monitor is not None:
+            try:
+                status = await monitor.call("app.action.session_status")
+                rss = status.get("process_rss_bytes")
+            except (WslinkError, ConnectionError):
+                rss = None
+        if rss:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+async def run_level(url: str, secret: str, dicom_dir: str, clients: int, duration: float,
+                    interval: float, server_pid: Optional[int] = None,
+                    memory_interval: float = 0.5) -> Dict[str, Any]:
+    """以给定并发数压测 duration 秒，返回该级别的汇总"""
+    workers = [WslinkClient(url, secret, name=f"c{i}") for i in range(clients)]
+    await asyncio.gather(*(w.connect() for w in workers))
+
+    monitor = None
+    if server_pid is None:
+        monitor = WslinkClient(url, secret, name="monitor")
+        await monitor.connect()
+    memory: List[int] = []
+    sampler = asyncio.create_task(_sample_memory(monitor, server_pid, memory, memory_interval))
+
+    start = time.perf_counter()
+    deadline = start + duration
+    results = await asyncio.gather(
+        *(run_script(w, dicom_dir, deadline, interval) for w in workers),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    sampler.cancel()
+    try:
+        await sampler
+    except asyncio.CancelledError:
+        pass
+    for client in workers + ([monitor] if monitor else []):
+        await client.close()
+
+    failures = [repr(r) for r in results if isinstance(r, Exception)]
+    return summarize_level(clients, elapsed, [w.stats for w in workers], memory, failures)
+
+
+def summarize_level(clients: int, elapsed: float, stats: List[ClientStats],
+                    memory: List[int], failures: Optional[List[str]] = None) -> Dict[str, Any]:
+    rpc: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    frame_latency: List[float] = []
+    frames = frame_bytes = 0
+    for s in stats:
+        for method, samples in s.rpc.items():
+            rpc.setdefault(method, []).extend(samples)
+        for method, count in s.errors.items():
+            errors[method] = errors.get(method, 0) + count
+        frame_latency.extend(s.frame_latency)
+        frames += s.frames
+        frame_bytes += s.frame_bytes
+
+    calls = sum(len(samples) for samples in rpc.values())
+    return {
+        "clients": clients,
+        "seconds": round(elapsed, 3),
+        "rpc": {
+            method: {**summarize(samples, PERCENTILES), "errors": errors.get(method, 0)}
+            for method, samples in sorted(rpc.items())
+        },
+        "frame_latency": summarize(frame_latency, PERCENTILES),
+        "throughput": {
+            "rpc_per_s": round(calls / elapsed, 2) if elapsed else 0.0,
+            "interactions_per_s": round(len(frame_latency) / elapsed, 2) if elapsed else 0.0,
+            "frames_received_per_s": round(frames / elapsed, 2) if elapsed else 0.0,
+            "frame_mbytes_per_s": round(frame_bytes / elapsed / 1024 ** 2, 3) if elapsed else 0.0,
+        },
+        "server_memory": {
+            "samples": len(memory),
+            "start_bytes": memory[0] if memory else None,
+            "peak_bytes": max(memory) if memory else None,
+            "end_bytes": memory[-1] if memory else None,
+        },
+        "failures": failures or [],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class LocalServer:
+    """在本机拉起 `python -m core.server`，供没有现成部署时压测"""
+
+    def __init__(self, secret: str, workers: int = 1, port: Optional[int] = None,
+                 quiet: bool = True):
+        self.secret = secret
+        self.workers = workers
+        self.port = port or _free_port()
+        self.quiet = quiet
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def start(self, ready_timeout: float = 60.0) -> None:
+        cmd = [
+            sys.executable, "-m", "core.server",
+            "--host", "127.0.0.1",
+            "--port", str(self.port),
+            "--authKey", self.secret,
+            "--timeout", "0",
+            "--workers", str(self.workers),
+            "--metrics-port", "0",
+        ]
+        if self.workers > 1:
+            cmd += ["--worker-base-port", str(_free_port())]
+        output = subprocess.DEVNULL if self.quiet else None
+        self.process = subprocess.Popen(cmd, cwd=SRC_DIR, stdout=output, stderr=output)
+        if not _wait_for_port(self.port, ready_timeout):
+            self.stop()
+            raise RuntimeError(f"本地服务未在 {ready_timeout:.0f}s 内就绪")
+
+    def stop(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def format_level(level: Dict[str, Any]) -> str:
+    lines = [f"[{level['clients']} clients, {level['seconds']:.1f}s]"]
+    for method, stats in level["rpc"].items():
+        if stats["n"]:
+            lines.append(
+                f"  {method:<36} n={stats['n']:<6} p50 {stats['p50_ms']:8.1f}  "
+                f"p90 {stats['p90_ms']:8.1f}  p99 {stats['p99_ms']:8.1f} ms  err={stats['errors']}"
+            )
+    frame = level["frame_latency"]
+    if frame["n"]:
+        lines.append(
+            f"  {'frame':<36} n={frame['n']:<6} p50 {frame['p50_ms']:8.1f}  "
+            f"p90 {frame['p90_ms']:8.1f}  p99 {frame['p99_ms']:8.1f} ms"
+        )
+    throughput = level["throughput"]
+    lines.append(
+        f"  rpc/s {throughput['rpc_per_s']}  interactions/s {throughput['interactions_per_s']}  "
+        f"frames/s {throughput['frames_received_per_s']}  MB/s {throughput['frame_mbytes_per_s']}"
+    )
+    peak = level["server_memory"]["peak_bytes"]
+    if peak:
+        lines.append(f"  server rss peak {peak / 1024 ** 2:.0f} MB")
+    for failure in level["failures"]:
+        lines.append(f"  failure: {failure}")
+    return "\n".join(lines)
+
+
+async def run(url: str, secret: str, dicom_dir: str, levels: List[int], duration: float,
+              interval: float, server_pid: Optional[int] = None) -> List[Dict[str, Any]]:
+    results = []
+    for clients in levels:
+        level = await run_level(url, secret, dicom_dir, clients, duration, interval, server_pid)
+        print(format_level(level))
+        results.append(level)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="wslink 多客户端压测")
+    parser.add_argument("--url", help="已运行服务的 websocket 地址，如 ws://host:1234/ws；不指定时在本机拉起")
+    parser.add_argument("--secret", default="wslink-secret", help="wslink 认证密钥")
+    parser.add_argument("--dicom-dir", help="服务端可访问的 DICOM 序列目录；不指定时使用合成序列")
+    parser.add_argument("--size", default="small", help="合成序列尺寸 (default: small)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="合成数据目录")
+    parser.add_argument("--workers", type=int, default=1, help="本机拉起时的 render worker 数 (default: 1)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="逐级并发数 (default: 1 2 4 8)")
+    parser.add_argument("--duration", type=float, default=20.0, help="每级压测秒数 (default: 20)")
+    parser.add_argument("--interval", type=float, default=1 / 30,
+                        help="客户端两次操作的间隔秒数 (default: 1/30)")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/load-<时间>.json")
+    args = parser.parse_args(argv)
+
+    dicom_dir = args.dicom_dir or generate_ct_series(args.data_dir, parse_size(args.size))
+    server = None
+    url = args.url
+    if url is None:
+        server = LocalServer(args.secret, workers=args.workers)
+        server.start()
+        url = server.url
+        print(f"本地服务已启动: {url} (pid {server.process.pid})")
+    try:
+        levels = asyncio.run(run(
+            url, args.secret, dicom_dir, args.clients, args.duration, args.interval,
+            server_pid=server.process.pid if server else None,
+        ))
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": url,
+        "local_server": server is not None,
+        "workers": args.workers if server is not None else None,
+        "dicom_dir": dicom_dir,
+        "params": {"duration": args.duration, "interval": args.interval},
+        "levels": levels,
+    }
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output_dir = os.path.dirname(output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""
+体渲染性能基准
+
+对每个尺寸的合成 CT 序列分阶段计时：
+
+    read_dicom_series.cold    未命中缓存，从磁盘读取
+    read_dicom_series.cached  命中进程内体数据缓存
+    parse_dicom_metadata      pydicom 解析全部文件头
+    pipeline_setup            VRRender.setup（mapper、传输函数、相机）
+    first_frame               新渲染窗口的首帧（上下文、纹理上传、着色器编译）
+    interactive_frame         相机旋转后的单帧渲染
+    readback                  帧缓冲读回
+    encode.jpeg / encode.png  读回图像编码
+    server_frame              与 wslink 推图相同的 StillRenderToBuffer（渲染 + 读回 + JPEG）
+
+结果写为 JSON，可用 --baseline 与旧版本的结果对比。
+
+用法（在仓库根目录）：
+    python -m benchmarks.run_benchmarks --sizes small 256 512x512x300 --frames 60
+    python -m benchmarks.run_benchmarks --sizes small --baseline old.json --fail-on-regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# 基准期间不做后台预取，避免干扰读取计时
+os.environ.setdefault("PREFETCH_ENABLED", "False")
+
+from benchmarks.synthetic_dicom import generate_ct_series, parse_size, size_name  # noqa: E402
+
+DEFAULT_DATA_DIR = os.getenv(
+    "BENCH_DATA_DIR", os.path.join(tempfile.gettempdir(), "webvr-bench-data")
+)
+DEFAULT_RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+# 对比时以 p50 为准
+COMPARE_STAT = "p50_ms"
+
+
+class StageTimer:
+    """按阶段名收集耗时样本"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.extra: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def note(self, stage: str, **values: float) -> None:
+        self.extra.setdefault(stage, {}).update(values)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for stage, samples in self.samples.items():
+            result[stage] = {**summarize(samples), **self.extra.get(stage, {})}
+        return result
+
+
+def summarize(samples: List[float], percentiles=(50, 95)) -> Dict[str, float]:
+    """耗时样本（秒）的统计，单位毫秒"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    if ms.size == 0:
+        return {"n": 0}
+    result = {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+    }
+    for q in percentiles:
+        result[f"p{q}_ms"] = round(float(np.percentile(ms, q)), 3)
+    result["max_ms"] = round(float(ms.max()), 3)
+    return result
+
+
+def _create_view(width: int, height: int):
+    from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow, vtkRenderWindowInteractor
+    import vtkmodules.vtkRenderingOpenGL2  # noqa: F401
+
+    render_window = vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(width, height)
+    renderer = vtkRenderer()
+    renderer.SetBackground(0.2, 0.2, 0.2)
+    render_window.AddRenderer(renderer)
+    interactor = vtkRenderWindowInteractor()
+    interactor.SetRenderWindow(render_window)
+    return render_window, renderer, interactor
+
+
+def _render(render_window) -> None:
+    render_window.Render()
+    render_window.WaitForCompletion()
+
+
+def _encode(image, writer_cls, **options) -> bytes:
+    writer = writer_cls()
+    for name, value in options.items():
+        getattr(writer, f"Set{name}")(value)
+    writer.WriteToMemoryOn()
+    writer.SetInputData(image)
+    writer.Write()
+    result = writer.GetResult()
+    return bytes(memoryview(result)) if result is not None else b""
+
+
+def benchmark_series(series_dir: str, frames: int = 60, repeat: int = 3,
+                     window_size=(1024, 1024), quality: int = 100) -> Dict[str, Dict[str, float]]:
+    """
+    对单个序列逐阶段计时
+
+    Args:
+        series_dir: DICOM 序列目录
+        frames: 交互帧数（相机每帧旋转 360 / frames 度）
+        repeat: 读取、解析、初始化与首帧的重复次数
+        window_size: 渲染窗口尺寸
+        quality: JPEG 质量（与 wslink 推图一致，默认 100）
+
+    Returns:
+        阶段名 -> 统计结果
+    """
+    from vtkmodules.vtkIOImage import vtkJPEGWriter, vtkPNGWriter
+    from vtkmodules.vtkRenderingCore import vtkWindowToImageFilter
+    from vtkmodules.vtkWebCore import vtkWebApplication
+
+    from core.server import VRRender
+    from render.dicom_io import parse_dicom_metadata, read_dicom_series
+    from render.volume_cache import volume_cache
+
+    timer = StageTimer()
+    key = os.path.abspath(series_dir)
+
+    for _ in range(repeat):
+        volume_cache.discard(key)
+        with timer.measure("read_dicom_series.cold"):
+            image_data = read_dicom_series(series_dir)
+        with timer.measure("read_dicom_series.cached"):
+            read_dicom_series(series_dir)
+    timer.note("read_dicom_series.cold",
+               voxels=image_data.GetNumberOfPoints(),
+               bytes=image_data.GetActualMemorySize() * 1024)
+
+    for _ in range(repeat):
+        with timer.measure("parse_dicom_metadata"):
+            parse_dicom_metadata(series_dir)
+
+    vr = None
+    for _ in range(repeat):
+        if vr is not None:
+            vr.release()
+            vr.render_window.Finalize()
+        render_window, renderer, interactor = _create_view(*window_size)
+        vr = VRRender(series_dir, render_window, renderer, interactor)
+        with timer.measure("pipeline_setup"):
+            vr.setup()
+        with timer.measure("first_frame"):
+            _render(render_window)
+
+    render_window = vr.render_window
+    camera = vr.renderer.GetActiveCamera()
+    step = 360.0 / max(frames, 1)
+    for _ in range(frames):
+        camera.Azimuth(step)
+        with timer.measure("interactive_frame"):
+            _render(render_window)
+    frame_ms = timer.samples["interactive_frame"]
+    timer.note("interactive_frame", fps=round(len(frame_ms) / sum(frame_ms), 2))
+
+    grabber = vtkWindowToImageFilter()
+    grabber.SetInput(render_window)
+    grabber.ShouldRerenderOff()
+    grabber.ReadFrontBufferOff()
+    jpeg_bytes = png_bytes = 0
+    for _ in range(repeat):
+        grabber.Modified()
+        with timer.measure("readback"):
+            grabber.Update()
+        image = grabber.GetOutput()
+        with timer.measure("encode.jpeg"):
+            jpeg_bytes = len(_encode(image, vtkJPEGWriter, Quality=quality))
+        with timer.measure("encode.png"):
+            png_bytes = len(_encode(image, vtkPNGWriter))
+    timer.note("encode.jpeg", bytes=jpeg_bytes)
+    timer.note("encode.png", bytes=png_bytes)
+
+    app = vtkWebApplication()
+    app.SetImageEncoding(0)
+    server_bytes = 0
+    for _ in range(frames):
+        camera.Azimuth(step)
+        with timer.measure("server_frame"):
+            # 与 vtkWebPublishImageDelivery 相同：失效缓存后渲染，并等待异步编码线程交付
+            app.InvalidateCache(render_window)
+            buffer = app.StillRenderToBuffer(render_window, 0, quality)
+            while app.GetHasImagesBeingProcessed(render_window):
+                time.sleep(0.0005)
+                buffer = app.StillRenderToBuffer(render_window, 0, quality)
+        server_bytes = buffer.GetNumberOfTuples() if buffer is not None else 0
+    timer.note("server_frame", bytes=server_bytes)
+
+    vr.release()
+    render_window.Finalize()
+    volume_cache.discard(key)
+    return timer.summary()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info() -> Dict[str, Optional[str]]:
+    from vtkmodules.vtkCommonCore import vtkVersion
+
+    try:
+        import pydicom
+        pydicom_version = pydicom.__version__
+    except ImportError:
+        pydicom_version = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "vtk": vtkVersion.GetVTKVersion(),
+        "numpy": np.__version__,
+        "pydicom": pydicom_version,
+        "git": _git_revision(),
+    }
+
+
+def run(sizes: List[str], data_dir: str = DEFAULT_DATA_DIR, frames: int = 60,
+        repeat: int = 3, window_size=(1024, 1024), quality: int = 100) -> Dict:
+    """生成（或复用）各尺寸的合成序列并逐个测量"""
+    results = []
+    for size in sizes:
+        shape = parse_size(size)
+        start = time.perf_counter()
+        series_dir = generate_ct_series(data_dir, shape)
+        generate_seconds = time.perf_counter() - start
+        print(f"[{size_name(shape)}] 数据就绪 ({generate_seconds:.1f}s): {series_dir}")
+        stages = benchmark_series(series_dir, frames, repeat, window_size, quality)
+        results.append({
+            "size": size_name(shape),
+            "shape": list(shape),
+            "stages": stages,
+        })
+        print(format_stages(size_name(shape), stages))
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "params": {
+            "frames": frames,
+            "repeat": repeat,
+            "window_size": list(window_size),
+            "quality": quality,
+        },
+        "results": results,
+    }
+
+
+def format_stages(size: str, stages: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"[{size}]"]
+    for stage, stats in stages.items():
+        lines.append(
+            f"  {stage:<26} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  n={stats['n']}"
+        )
+    return "\n".join(lines)
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.1) -> List[Dict]:
+    """
+    与基线结果对比
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: p50 相对增长超过该比例视为回退
+
+    Returns:
+        每个 (尺寸, 阶段) 的对比，regression 标记是否回退
+    """
+    base = {r["size"]: r["stages"] for r in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        old_stages = base.get(result["size"])
+        if old_stages is None:
+            continue
+        for stage, stats in result["stages"].items():
+            old = old_stages.get(stage)
+            if old is None or not old.get(COMPARE_STAT):
+                continue
+            ratio = stats[COMPARE_STAT] / old[COMPARE_STAT]
+            rows.append({
+                "size": result["size"],
+                "stage": stage,
+                "baseline_ms": old[COMPARE_STAT],
+                "current_ms": stats[COMPARE_STAT],
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1.0 + threshold,
+            })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="合成 DICOM 体渲染基准")
+    parser.add_argument("--sizes", nargs="+", default=["small"],
+                        help="尺寸：small / medium / large / xlarge、N（N³）或 RxCxS (default: small)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="合成数据目录，已生成的序列会复用")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/bench-<时间>.json")
+    parser.add_argument("--frames", type=int, default=60, help="交互帧数 (default: 60)")
+    parser.add_argument("--repeat", type=int, default=3, help="其余阶段重复次数 (default: 3)")
+    parser.add_argument("--window-size", type=int, nargs=2, default=[1024, 1024],
+                        metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--quality", type=int, default=100, help="JPEG 质量 (default: 100)")
+    parser.add_argument("--baseline", help="用于对比的历史结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="回退判定阈值 (default: 0.1)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="存在回退时以非零状态码退出")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.data_dir, args.frames, args.repeat,
+                 tuple(args.window_size), args.quality)
+
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output_dir = os.path.dirname(output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.threshold)
+        for row in rows:
+            flag = "  <-- 回退" if row["regression"] else ""
+            print(f"  {row['size']:<14} {row['stage']:<26} {row['baseline_ms']:9.2f} -> "
+                  f"{row['current_ms']:9.2f} ms  x{row['ratio']:.2f}{flag}")
+        if args.fail_on_regression and any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,6 +31,51 @@ class Config:
     VTK_DEFAULT_FOCAL_POINT = (0, 0, 0)
     VTK_DEFAULT_VIEW_UP = (0, 1, 0)
 
+    # 会话配置
+    SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", 900))  # 空闲回收秒数，0 表示不回收
+
+    # 体数据缓存与预取配置
+    VOLUME_CACHE_MAX_BYTES = int(os.getenv("VOLUME_CACHE_MAX_BYTES", 4 * 1024 ** 3))
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "True").lower() == "true"
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 1))
+    PREFETCH_MAX_SERIES = int(os.getenv("PREFETCH_MAX_SERIES", 4))  # 每次最多预取的同检查序列数
+    RESAMPLE_SPACING = os.getenv("RESAMPLE_SPACING", "")  # 默认重采样间距：空为不重采样，iso 为各向同性，或 "x,y,z"
+    RESAMPLE_THREADS = int(os.getenv("RESAMPLE_THREADS", 0))  # 重采样线程数，0 表示由 VTK 决定
+    ISOSURFACE_THREADS = int(os.getenv("ISOSURFACE_THREADS", 0))  # 等值面提取线程数，0 表示由 VTK 决定
+    MESH_CACHE_MAX_BYTES = int(os.getenv("MESH_CACHE_MAX_BYTES", 512 * 1024 ** 2))  # 等值面负载缓存（压缩后）
+    PLAYBACK_BUFFER_SIZE = int(os.getenv("PLAYBACK_BUFFER_SIZE", 8))  # 4D 回放环形缓冲区的期相数
+    PLAYBACK_WORKERS = int(os.getenv("PLAYBACK_WORKERS", 2))  # 期相解码线程数
+    PLAYBACK_FPS = float(os.getenv("PLAYBACK_FPS", 10))  # 默认回放帧率
+    BATCH_RENDER_WORKERS = int(os.getenv("BATCH_RENDER_WORKERS", 0))  # 离线批量渲染进程数，0 为 CPU 核数
+    EXPORT_DIR = os.getenv("EXPORT_DIR", "logs/exports")  # 高分辨率截图导出目录
+    EXPORT_TILE_SIZE = int(os.getenv("EXPORT_TILE_SIZE", 1024))  # 分块渲染的单块边长上限
+    EXPORT_MAX_SIZE = int(os.getenv("EXPORT_MAX_SIZE", 16384))  # 导出图像单边像素上限
+    EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 1))  # 同时运行的导出进程数
+    EXPORT_NICENESS = int(os.getenv("EXPORT_NICENESS", 10))  # 导出进程的 nice 增量
+    COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", 2))  # 体数据分析（统计、ROI、等值面、体数据负载）线程数
+    SEGMENTATION_CACHE_MAX_BYTES = int(os.getenv("SEGMENTATION_CACHE_MAX_BYTES", 256 * 1024 ** 2))  # 分割掩膜缓存（按位压缩后）
+
+    # 追踪配置
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.05))  # 根 span 采样率
+    TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 20000))  # 环形缓冲区事件数
+    TRACE_DIR = os.getenv("TRACE_DIR", "logs/traces")
+
+    # 指标配置
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 默认只对本机暴露
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))  # 0 表示不启动 /metrics 端点
+
+    # 采样 profiler 配置
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
+    PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))  # 采样间隔（秒）
+    PROFILE_DURATION = float(os.getenv("PROFILE_DURATION", 30))  # 默认采样时长（秒）
+    PROFILE_MAX_DURATION = float(os.getenv("PROFILE_MAX_DURATION", 300))  # 单次采样时长上限（秒）
+
+    # 点云配置
+    POINT_CLOUD_LOD_BUDGETS = tuple(
+        int(n) for n in os.getenv("POINT_CLOUD_LOD_BUDGETS", "2000000,250000").split(",") if n
+    )  # 交互时可用的降采样层次（点数上限）
+    POINT_CLOUD_POINT_SIZE = float(os.getenv("POINT_CLOUD_POINT_SIZE", 2))
+
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
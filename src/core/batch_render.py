@@ -0,0 +1,308 @@
+"""
+离线批量渲染
+
+报告截图、旋转动画等不需要交互的输出不再经由 RPC 逐帧驱动交互视图：给定检查序列、
+传输函数预设与一组相机位姿，把位姿按顺序切分给进程池中的 worker，每个 worker 用自己的
+离屏渲染窗口与 VRRender 初始化一次后连续渲染、编码并写盘，最后汇总吞吐量（帧/秒）。
+
+用法（在 src 目录下）：
+    python -m core.batch_render /data/study/series --preset ct-bone --turntable 72 -o out/turntable
+    python -m core.batch_render /data/study/series --poses poses.json --format png --size 2048 2048
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Sequence, Tuple
+
+from config import Config
+from core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 传输函数预设（CT，HU）：window / level 之外给出 colormap 与 opacity_map 时以后者为准
+TF_PRESETS: Dict[str, Dict[str, Any]] = {
+    "grayscale": {"window": 2000, "level": 1000},
+    "ct-bone": {
+        "window": 2000, "level": 1000,
+        "colormap": [(-1000, 0.0, 0.0, 0.0), (150, 0.55, 0.25, 0.15), (400, 0.9, 0.82, 0.7),
+                     (1500, 1.0, 1.0, 0.95)],
+        "opacity_map": [(-1000, 0.0), (150, 0.0), (400, 0.6), (1500, 0.9)],
+    },
+    "ct-soft-tissue": {
+        "window": 400, "level": 40,
+        "colormap": [(-1000, 0.0, 0.0, 0.0), (-200, 0.55, 0.25, 0.15), (40, 0.88, 0.6, 0.5),
+                     (300, 1.0, 0.94, 0.9)],
+        "opacity_map": [(-1000, 0.0), (-200, 0.0), (40, 0.2), (300, 0.6)],
+    },
+    "ct-lung": {
+        "window": 1500, "level": -600,
+        "colormap": [(-1000, 0.0, 0.0, 0.0), (-900, 0.3, 0.4, 0.6), (-500, 0.8, 0.85, 0.9),
+                     (200, 1.0, 1.0, 1.0)],
+        "opacity_map": [(-1000, 0.0), (-900, 0.05), (-500, 0.15), (200, 0.0)],
+    },
+}
+
+IMAGE_FORMATS = ("jpeg", "png")
+
+# 相对位姿字段（相对于 ResetCamera 后的默认视角依次施加）与绝对位姿字段
+_RELATIVE_KEYS = ("azimuth", "elevation", "roll", "zoom")
+_ABSOLUTE_KEYS = ("position", "focal_point", "view_up", "view_angle")
+
+
+def resolve_tf_preset(name: str) -> Dict[str, Any]:
+    if name not in TF_PRESETS:
+        raise ValueError(f"未知的传输函数预设: {name}，可选 {list(TF_PRESETS)}")
+    return TF_PRESETS[name]
+
+
+def turntable_poses(frames: int, elevation: float = 0.0, zoom: float = 1.0) -> List[Dict[str, float]]:
+    """绕默认视角的竖直轴旋转一周的 frames 个位姿"""
+    if frames <= 0:
+        raise ValueError("frames 必须大于 0")
+    return [{"azimuth": 360.0 * i / frames, "elevation": elevation, "zoom": zoom} for i in range(frames)]
+
+
+def validate_pose(pose: Dict[str, Any]) -> Dict[str, Any]:
+    unknown = set(pose) - set(_RELATIVE_KEYS) - set(_ABSOLUTE_KEYS)
+    if unknown:
+        raise ValueError(f"未知的位姿字段: {sorted(unknown)}，可选 {list(_RELATIVE_KEYS + _ABSOLUTE_KEYS)}")
+    if "zoom" in pose and pose["zoom"] <= 0:
+        raise ValueError("zoom 必须大于 0")
+    return pose
+
+
+def split_chunks(count: int, parts: int) -> List[range]:
+    """把 [0, count) 切成至多 parts 段连续下标，每个 worker 只初始化一次渲染管线"""
+    parts = max(1, min(parts, count))
+    size, extra = divmod(count, parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(range(start, end))
+        start = end
+    return [chunk for chunk in chunks if len(chunk)]
+
+
+@dataclass
+class BatchResult:
+    """一次批量渲染的结果"""
+
+    frames: int
+    seconds: float
+    # 吞吐量：总帧数 / 总耗时（含 worker 启动与管线初始化）
+    fps: float
+    # 只计渲染、读回、编码与写盘的吞吐量（各 worker 之和）
+    render_fps: float
+    bytes: int
+    workers: int
+    files: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def create_offscreen_view(width: int, height: int):
+    from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow, vtkRenderWindowInteractor
+    import vtkmodules.vtkRenderingOpenGL2  # noqa: F401
+
+    render_window = vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(width, height)
+    renderer = vtkRenderer()
+    renderer.SetBackground(*Config.VTK_BACKGROUND_COLOR)
+    render_window.AddRenderer(renderer)
+    interactor = vtkRenderWindowInteractor()
+    interactor.SetRenderWindow(render_window)
+    return render_window, renderer, interactor
+
+
+def _apply_pose(renderer, home, pose: Dict[str, Any]) -> Dict[str, Any]:
+    """先恢复默认视角并施加相对位姿，返回留给 apply_view_state 的绝对位姿字段"""
+    camera = renderer.GetActiveCamera()
+    camera.DeepCopy(home)
+    if pose.get("azimuth"):
+        camera.Azimuth(pose["azimuth"])
+    if pose.get("elevation"):
+        camera.Elevation(pose["elevation"])
+        camera.OrthogonalizeViewUp()
+    if pose.get("roll"):
+        camera.Roll(pose["roll"])
+    if pose.get("zoom", 1.0) != 1.0:
+        camera.Zoom(pose["zoom"])
+    renderer.ResetCameraClippingRange()
+    return {k: pose[k] for k in _ABSOLUTE_KEYS if k in pose}
+
+
+def _init_worker() -> None:
+    # 批量渲染只读一个序列，不需要预取同检查的其他序列
+    Config.PREFETCH_ENABLED = False
+
+
+def _render_chunk(job: Dict[str, Any], indexed_poses: Sequence[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    在当前进程中渲染一段位姿（进程池任务）
+
+    Returns:
+        {"files": [(下标, 路径, 字节数), ...], "setup_seconds", "render_seconds"}
+    """
+    from vtkmodules.vtkIOImage import vtkJPEGWriter, vtkPNGWriter
+    from vtkmodules.vtkRenderingCore import vtkCamera, vtkWindowToImageFilter
+
+    from core.server import VRRender
+
+    preset = resolve_tf_preset(job["preset"])
+    started = time.perf_counter()
+    render_window, renderer, interactor = create_offscreen_view(*job["size"])
+    vr = VRRender(job["study"], render_window, renderer, interactor,
+                  window=preset["window"], level=preset["level"], spacing=job["spacing"])
+    vr.setup()
+    home = vtkCamera()
+    home.DeepCopy(renderer.GetActiveCamera())
+    # 传输函数只设置一次，之后每帧只改相机
+    vr.apply_view_state(preset["window"], preset["level"], preset.get("colormap"), preset.get("opacity_map"))
+
+    grabber = vtkWindowToImageFilter()
+    grabber.SetInput(render_window)
+    grabber.ShouldRerenderOff()
+    grabber.ReadFrontBufferOff()
+    if job["format"] == "jpeg":
+        writer = vtkJPEGWriter()
+        writer.SetQuality(job["quality"])
+    else:
+        writer = vtkPNGWriter()
+    writer.SetInputConnection(grabber.GetOutputPort())
+    setup_seconds = time.perf_counter() - started
+
+    files = []
+    started = time.perf_counter()
+    try:
+        for index, pose in indexed_poses:
+            with tracer.span("batch.frame", "render", index=index):
+                vr.apply_view_state(camera=_apply_pose(renderer, home, pose))
+                grabber.Modified()
+                path = os.path.join(job["output_dir"], f"{job['prefix']}{index:05d}.{job['extension']}")
+                writer.SetFileName(path)
+                writer.Write()
+            files.append((index, path, os.path.getsize(path)))
+    finally:
+        render_seconds = time.perf_counter() - started
+        vr.release()
+        render_window.Finalize()
+    return {"files": files, "setup_seconds": setup_seconds, "render_seconds": render_seconds}
+
+
+def render_batch(study: str, poses: Sequence[Dict[str, Any]], output_dir: str,
+                 preset: str = "grayscale", size: Tuple[int, int] = (1024, 1024),
+                 image_format: str = "jpeg", quality: int = 95,
+                 workers: int = Config.BATCH_RENDER_WORKERS, spacing=None,
+                 prefix: str = "frame_") -> BatchResult:
+    """
+    离屏批量渲染一组相机位姿并写盘
+
+    Args:
+        study: DICOM 序列目录
+        poses: 相机位姿列表；相对字段 azimuth / elevation / roll（度）与 zoom 基于 ResetCamera 后的默认视角，
+            绝对字段 position / focal_point / view_up / view_angle 在其后生效
+        output_dir: 输出目录，文件名为 <prefix><下标>.jpg / .png
+        preset: 传输函数预设名，见 TF_PRESETS
+        size: 输出图像尺寸 (width, height)
+        image_format: jpeg 或 png
+        quality: JPEG 质量
+        workers: 渲染进程数；0 为 CPU 核数，1 为在当前进程中渲染
+        spacing: 重采样间距，取值见 render.resample.resolve_spacing
+
+    Returns:
+        BatchResult，files 按位姿顺序排列
+    """
+    if not os.path.isdir(study):
+        raise ValueError(f"DICOM directory {study} not found")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图像格式: {image_format}，可选 {IMAGE_FORMATS}")
+    if not poses:
+        raise ValueError("位姿列表为空")
+    resolve_tf_preset(preset)
+    poses = [validate_pose(dict(pose)) for pose in poses]
+    os.makedirs(output_dir, exist_ok=True)
+    job = {
+        "study": os.path.abspath(study),
+        "preset": preset,
+        "size": (int(size[0]), int(size[1])),
+        "format": image_format,
+        "extension": "jpg" if image_format == "jpeg" else "png",
+        "quality": int(quality),
+        "spacing": spacing,
+        "output_dir": os.path.abspath(output_dir),
+        "prefix": prefix,
+    }
+    chunks = [[(i, poses[i]) for i in chunk]
+              for chunk in split_chunks(len(poses), workers or os.cpu_count() or 1)]
+
+    started = time.perf_counter()
+    if len(chunks) == 1:
+        results = [_render_chunk(job, chunks[0])]
+    else:
+        # spawn：子进程各自创建 GL 上下文，不继承父进程的 VTK / GL 状态
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(len(chunks), mp_context=context, initializer=_init_worker) as pool:
+            results = list(pool.map(_render_chunk, [job] * len(chunks), chunks))
+    seconds = time.perf_counter() - started
+
+    files = sorted(entry for result in results for entry in result["files"])
+    # 各 worker 纯渲染吞吐量之和
+    render_fps = sum(len(r["files"]) / r["render_seconds"] for r in results if r["render_seconds"] > 0)
+    result = BatchResult(
+        frames=len(files),
+        seconds=round(seconds, 3),
+        fps=round(len(files) / seconds, 2) if seconds > 0 else 0.0,
+        render_fps=round(render_fps, 2),
+        bytes=sum(nbytes for _, _, nbytes in files),
+        workers=len(chunks),
+        files=[path for _, path, _ in files],
+    )
+    logger.info("批量渲染 %s: %d 帧 / %.2fs = %.2f fps（%d 个 worker）",
+                study, result.frames, result.seconds, result.fps, result.workers)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="离线批量体渲染（旋转动画 / 报告截图）")
+    parser.add_argument("study", help="DICOM 序列目录")
+    parser.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    poses = parser.add_mutually_exclusive_group(required=True)
+    poses.add_argument("--turntable", type=int, metavar="FRAMES", help="绕竖直轴旋转一周的帧数")
+    poses.add_argument("--poses", help="相机位姿 JSON 文件（位姿列表）")
+    parser.add_argument("--elevation", type=float, default=0.0, help="旋转动画的俯仰角 (default: 0)")
+    parser.add_argument("--preset", default="grayscale", choices=sorted(TF_PRESETS),
+                        help="传输函数预设 (default: grayscale)")
+    parser.add_argument("--size", type=int, nargs=2, default=[1024, 1024], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--format", default="jpeg", choices=IMAGE_FORMATS, dest="image_format")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG 质量 (default: 95)")
+    parser.add_argument("--workers", type=int, default=Config.BATCH_RENDER_WORKERS,
+                        help="渲染进程数，0 为 CPU 核数 (default: %(default)s)")
+    parser.add_argument("--spacing", default=Config.RESAMPLE_SPACING or None,
+                        help="重采样间距：iso / 数值 / x,y,z")
+    args = parser.parse_args(argv)
+
+    if args.turntable is not None:
+        pose_list = turntable_poses(args.turntable, args.elevation)
+    else:
+        with open(args.poses, encoding="utf-8") as f:
+            pose_list = json.load(f)
+    result = render_batch(args.study, pose_list, args.output_dir, args.preset, tuple(args.size),
+                          args.image_format, args.quality, args.workers, args.spacing)
+    print(f"{result.frames} 帧 -> {args.output_dir}，耗时 {result.seconds:.2f}s，"
+          f"{result.fps:.2f} fps（渲染 {result.render_fps:.2f} fps，{result.workers} 个 worker，"
+          f"{result.bytes / 1024 ** 2:.1f} MB）")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
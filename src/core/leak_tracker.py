@@ -0,0 +1,220 @@
+"""
+VTK 对象与内存泄漏诊断
+
+统计进程内存活的 VTK 对象（按类名计数）以及 vtkImageData / vtkDataArray 占用的字节数，
+按会话标注归属，并给出两次快照之间的增量，用于排查反复加载 / 清除后 RSS 持续增长的问题。
+
+只有被 Python 引用过的 VTK 对象才能从 gc 中找到，因此从这些对象出发，
+再沿渲染窗口 → renderer → prop → mapper → 输入数据 → 数据数组的连接补齐只在 C++ 侧被持有的对象。
+遍历 gc 开销较大，只在诊断时按需调用。
+"""
+
+import gc
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from vtkmodules.vtkCommonCore import vtkDataArray, vtkObjectBase
+
+from core.session import SessionManager, process_rss_bytes
+
+# 未归属任何会话的对象（缓存、共享渲染窗口等）
+UNOWNED = "unowned"
+
+
+def _key(obj: vtkObjectBase) -> str:
+    return obj.__this__
+
+
+def _collection_items(collection) -> Iterator[Any]:
+    if collection is None:
+        return
+    for i in range(collection.GetNumberOfItems()):
+        yield collection.GetItemAsObject(i)
+
+
+def _vtk_children(obj: vtkObjectBase) -> Iterator[Any]:
+    """沿渲染与数据管线的连接列出 obj 直接持有的 VTK 对象（只调用无副作用的 getter）"""
+    if obj.IsA("vtkRenderWindow"):
+        yield from _collection_items(obj.GetRenderers())
+        yield obj.GetInteractor()
+    elif obj.IsA("vtkRenderer"):
+        yield from _collection_items(obj.GetViewProps())
+    elif obj.IsA("vtkProp3D") and hasattr(obj, "GetMapper"):
+        yield obj.GetMapper()
+    if obj.IsA("vtkAlgorithm"):
+        for port in range(obj.GetNumberOfInputPorts()):
+            for conn in range(obj.GetNumberOfInputConnections(port)):
+                yield obj.GetInputDataObject(port, conn)
+    if obj.IsA("vtkDataSet"):
+        for attributes in (obj.GetPointData(), obj.GetCellData()):
+            yield from (attributes.GetAbstractArray(i) for i in range(attributes.GetNumberOfArrays()))
+        if obj.IsA("vtkPointSet") and obj.GetPoints() is not None:
+            yield obj.GetPoints().GetData()
+
+
+def _reachable(roots: Iterable[Any]) -> Dict[str, vtkObjectBase]:
+    """从 roots 出发可达的 VTK 对象，按 C++ 地址去重"""
+    found: Dict[str, vtkObjectBase] = {}
+    pending = [r for r in roots if isinstance(r, vtkObjectBase)]
+    while pending:
+        obj = pending.pop()
+        key = _key(obj)
+        if key in found:
+            continue
+        found[key] = obj
+        pending.extend(c for c in _vtk_children(obj) if isinstance(c, vtkObjectBase))
+    return found
+
+
+def _resource_roots(resource: Any) -> List[Any]:
+    """会话资源直接持有的 VTK 对象；资源可实现 vtk_objects() 排除与其他会话共享的对象"""
+    if hasattr(resource, "vtk_objects"):
+        return list(resource.vtk_objects())
+    values = list(vars(resource).values()) if hasattr(resource, "__dict__") else []
+    return [v for v in values if isinstance(v, vtkObjectBase)]
+
+
+def _object_bytes(obj: vtkObjectBase) -> int:
+    return obj.GetActualMemorySize() * 1024
+
+
+@dataclass
+class _Census:
+    classes: Counter = field(default_factory=Counter)
+    image_data_bytes: int = 0
+    data_array_bytes: int = 0
+
+    def add(self, obj: vtkObjectBase) -> None:
+        self.classes[obj.GetClassName()] += 1
+        if obj.IsA("vtkImageData"):
+            self.image_data_bytes += _object_bytes(obj)
+        elif isinstance(obj, vtkDataArray):
+            self.data_array_bytes += _object_bytes(obj)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "objects": sum(self.classes.values()),
+            "classes": dict(self.classes),
+            "image_data_bytes": self.image_data_bytes,
+            "data_array_bytes": self.data_array_bytes,
+        }
+
+
+@dataclass
+class VTKSnapshot:
+    """一次 VTK 对象普查结果"""
+
+    taken_at: float
+    total: Dict[str, Any]
+    sessions: Dict[str, Dict[str, Any]]
+    process_rss_bytes: Optional[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "taken_at": self.taken_at,
+            "total": self.total,
+            "sessions": self.sessions,
+            "process_rss_bytes": self.process_rss_bytes,
+        }
+
+
+def take_snapshot(sessions: Optional[SessionManager] = None) -> VTKSnapshot:
+    """
+    统计当前存活的 VTK 对象
+
+    Args:
+        sessions: 指定时按会话资源标注对象归属
+
+    Returns:
+        VTKSnapshot，total / 各会话均包含 objects、classes、image_data_bytes、data_array_bytes
+    """
+    gc.collect()
+    everything = _reachable(o for o in gc.get_objects() if isinstance(o, vtkObjectBase))
+
+    owner: Dict[str, str] = {}
+    if sessions is not None:
+        for session_id, resources in sessions.resources_by_session().items():
+            roots = [root for resource in resources for root in _resource_roots(resource)]
+            for key, obj in _reachable(roots).items():
+                owner.setdefault(key, session_id)
+                everything.setdefault(key, obj)
+
+    total = _Census()
+    per_session: Dict[str, _Census] = {}
+    for key, obj in everything.items():
+        total.add(obj)
+        per_session.setdefault(owner.get(key, UNOWNED), _Census()).add(obj)
+    return VTKSnapshot(
+        taken_at=time.time(),
+        total=total.to_dict(),
+        sessions={sid: census.to_dict() for sid, census in per_session.items()},
+        process_rss_bytes=process_rss_bytes(),
+    )
+
+
+def _census_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    classes = Counter(after.get("classes", {}))
+    classes.subtract(before.get("classes", {}))
+    return {
+        "objects": after.get("objects", 0) - before.get("objects", 0),
+        "classes": {name: n for name, n in sorted(classes.items()) if n},
+        "image_data_bytes": after.get("image_data_bytes", 0) - before.get("image_data_bytes", 0),
+        "data_array_bytes": after.get("data_array_bytes", 0) - before.get("data_array_bytes", 0),
+    }
+
+
+def diff_snapshots(before: VTKSnapshot, after: VTKSnapshot) -> Dict[str, Any]:
+    """
+    两次快照之间的增量
+
+    Returns:
+        {"seconds", "total", "sessions", "process_rss_bytes", "grown"}，
+        grown 为对象数或字节数增长的类名 / 字段列表，为空表示没有增长
+    """
+    session_ids = sorted(set(before.sessions) | set(after.sessions))
+    total = _census_delta(before.total, after.total)
+    grown = [name for name, n in total["classes"].items() if n > 0]
+    grown += [k for k in ("image_data_bytes", "data_array_bytes") if total[k] > 0]
+    rss = None
+    if before.process_rss_bytes is not None and after.process_rss_bytes is not None:
+        rss = after.process_rss_bytes - before.process_rss_bytes
+    return {
+        "seconds": round(after.taken_at - before.taken_at, 3),
+        "total": total,
+        "sessions": {
+            sid: _census_delta(before.sessions.get(sid, {}), after.sessions.get(sid, {}))
+            for sid in session_ids
+        },
+        "process_rss_bytes": rss,
+        "grown": grown,
+    }
+
+
+class LeakTracker:
+    """
+    保存命名快照，按需报告与快照之间的增量
+
+    Args:
+        sessions: 用于标注对象归属的会话管理器
+    """
+
+    def __init__(self, sessions: Optional[SessionManager] = None):
+        self.sessions = sessions
+        self._marks: Dict[str, VTKSnapshot] = {}
+
+    def mark(self, name: str = "baseline") -> Dict[str, Any]:
+        """记录一次快照作为之后比较的基线"""
+        snapshot = take_snapshot(self.sessions)
+        self._marks[name] = snapshot
+        return snapshot.to_dict()
+
+    def report(self, name: str = "baseline") -> Dict[str, Any]:
+        """与基线快照的增量；还没有该基线时先记录并返回空增量"""
+        after = take_snapshot(self.sessions)
+        before = self._marks.get(name)
+        if before is None:
+            self._marks[name] = after
+            before = after
+        return diff_snapshots(before, after)
@@ -0,0 +1,420 @@
+"""
+进程内指标注册表
+
+提供 Counter / Gauge / Histogram 三类指标，按 Prometheus 文本格式（0.0.4）导出，
+并通过仅监听本机的 HTTP 端点 /metrics 供抓取。wslink 渲染服务与 trame 应用共用同一个
+注册表 `registry`，指标在模块内定义、各处直接使用。
+
+缓存命中、常驻字节与会话数等读取型指标在抓取时通过回调取值，热路径没有额外开销。
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 耗时直方图默认分桶（秒）
+DEFAULT_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 字节数直方图分桶：4KB ~ 16MB，按 4 倍递增
+BYTE_BUCKETS = tuple(4096 * 4 ** i for i in range(7))
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, float, Tuple[str, ...]]]:
+        """(名称后缀, 标签值, 数值, 额外标签名)"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, values, value, extra_names in self.samples():
+            labels = _format_labels(self.labelnames + extra_names, values)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, func: Callable[[], float], **labels: str) -> None:
+        """抓取时由 func 取值（用于已有的单调计数，如缓存命中数）"""
+        with self._lock:
+            self._functions[self._key(labels)] = func
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        func = self._functions.get(key)
+        return float(func()) if func is not None else self._values.get(key, 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, func in functions.items():
+            try:
+                values[key] = float(func())
+            except Exception as e:
+                logger.debug("指标 %s 取值失败: %s", self.name, e)
+        for key, value in sorted(values.items()):
+            yield "_total", key, value, ()
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], Optional[float]]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], Optional[float]], **labels: str) -> None:
+        """抓取时由 func 取值，返回 None 时不输出该样本"""
+        with self._lock:
+            self._functions[self._key(labels)] = func
+
+    def value(self, **labels: str) -> Optional[float]:
+        key = self._key(labels)
+        func = self._functions.get(key)
+        return func() if func is not None else self._values.get(key)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, func in functions.items():
+            try:
+                result = func()
+            except Exception as e:
+                logger.debug("指标 %s 取值失败: %s", self.name, e)
+                result = None
+            if result is None:
+                values.pop(key, None)
+            else:
+                values[key] = float(result)
+        for key, value in sorted(values.items()):
+            yield "", key, value, ()
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_TIME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., +Inf 计数], 总和
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """记录代码块耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def sum(self, **labels: str) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            snapshot = {k: (list(v), self._sums[k]) for k, v in self._counts.items()}
+        for key, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", key + (_format_value(bound),), cumulative, ("le",)
+            yield "_count", key, cumulative, ()
+            yield "_sum", key, total, ()
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    同名指标重复声明时返回已有实例（类型与标签须一致），
+    因此 wslink 服务与 trame 应用可以各自声明、共用同一份数据。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已以不同类型或标签注册")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_TIME_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的注册表
+registry = MetricsRegistry()
+
+# ---------------------------------------------------------------------------
+# 指标定义
+# ---------------------------------------------------------------------------
+
+CACHE_HITS = registry.counter("webvr_cache_hits", "体数据相关缓存命中次数", ["cache"])
+CACHE_MISSES = registry.counter("webvr_cache_misses", "体数据相关缓存未命中次数", ["cache"])
+CACHE_EVICTIONS = registry.counter("webvr_cache_evictions", "缓存淘汰次数", ["cache"])
+CACHE_RESIDENT_BYTES = registry.gauge("webvr_cache_resident_bytes", "缓存常驻字节数", ["cache"])
+CACHE_ENTRIES = registry.gauge("webvr_cache_entries", "缓存条目数", ["cache"])
+
+VOLUME_LOAD_SECONDS = registry.histogram("webvr_volume_load_seconds", "从磁盘读取 DICOM 序列的耗时")
+RESAMPLE_SECONDS = registry.histogram("webvr_resample_seconds", "体数据重采样耗时")
+EXPORT_JOBS = registry.gauge("webvr_export_jobs", "排队与运行中的高分辨率导出任务数")
+RENDER_SECONDS = registry.histogram("webvr_render_seconds", "单次 Render() 耗时", ["app"])
+FRAME_ENCODE_SECONDS = registry.histogram(
+    "webvr_frame_encode_seconds", "推图时渲染 + 读回 + 编码的耗时", ["app"]
+)
+FRAME_BYTES = registry.histogram("webvr_frame_bytes", "编码后的帧大小（字节）", ["app"], buckets=BYTE_BUCKETS)
+RENDER_QUEUE_DEPTH = registry.gauge("webvr_render_queue_depth", "渲染线程队列中等待执行的任务数")
+RENDER_QUEUE_SECONDS = registry.histogram("webvr_render_queue_seconds", "渲染任务从提交到开始执行的等待时间")
+RENDER_SUPERSEDED = registry.counter("webvr_render_superseded", "执行前被同 key 的新请求取代的渲染任务数")
+
+ACTIVE_SESSIONS = registry.gauge("webvr_active_sessions", "活跃会话数", ["app"])
+SESSION_RESIDENT_BYTES = registry.gauge("webvr_session_resident_bytes", "会话持有的体数据字节数", ["app"])
+PROCESS_RESIDENT_BYTES = registry.gauge("webvr_process_resident_bytes", "进程常驻内存（字节）")
+
+RPC_SECONDS = registry.histogram("webvr_rpc_seconds", "RPC / state 回调耗时", ["method"])
+RPC_ERRORS = registry.counter("webvr_rpc_errors", "RPC / state 回调异常次数", ["method"])
+
+
+def watch_cache(name: str, cache) -> None:
+    """把 VolumeCache 的统计接入注册表（抓取时读取）"""
+    CACHE_HITS.set_function(lambda: cache.hits, cache=name)
+    CACHE_MISSES.set_function(lambda: cache.misses, cache=name)
+    CACHE_EVICTIONS.set_function(lambda: cache.evictions, cache=name)
+    CACHE_RESIDENT_BYTES.set_function(lambda: cache.nbytes, cache=name)
+    CACHE_ENTRIES.set_function(lambda: len(cache), cache=name)
+
+
+def watch_sessions(app: str, sessions) -> None:
+    """把 SessionManager 的会话数与常驻字节接入注册表"""
+    ACTIVE_SESSIONS.set_function(lambda: len(sessions), app=app)
+    SESSION_RESIDENT_BYTES.set_function(sessions.resident_bytes, app=app)
+
+
+def _process_rss() -> Optional[float]:
+    from core.session import process_rss_bytes
+
+    return process_rss_bytes()
+
+
+PROCESS_RESIDENT_BYTES.set_function(_process_rss)
+
+
+def metered(method: str):
+    """记录函数耗时与异常次数的装饰器（RPC / state 回调，支持协程函数）"""
+    import functools
+    import inspect
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    RPC_ERRORS.inc(method=method)
+                    raise
+                finally:
+                    RPC_SECONDS.observe(time.perf_counter() - start, method=method)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                RPC_ERRORS.inc(method=method)
+                raise
+            finally:
+                RPC_SECONDS.observe(time.perf_counter() - start, method=method)
+
+        return wrapper
+
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# HTTP 端点
+# ---------------------------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = registry
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics %s", format % args)
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1",
+                         metrics_registry: MetricsRegistry = registry) -> Optional[ThreadingHTTPServer]:
+    """
+    在后台线程中启动 /metrics 端点（默认只监听本机），重复调用返回已启动的实例
+
+    Args:
+        port: 监听端口，0 表示不启动
+        host: 监听地址
+        metrics_registry: 导出的注册表
+    """
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+    if not port:
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": metrics_registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.warning("指标端点启动失败 %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    _metrics_server = server
+    logger.info("指标端点已启动: http://%s:%s/metrics", host, server.server_port)
+    return server
+
+
+def stop_metrics_server() -> None:
+    global _metrics_server
+    if _metrics_server is not None:
+        _metrics_server.shutdown()
+        _metrics_server.server_close()
+        _metrics_server = None
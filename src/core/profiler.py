@@ -0,0 +1,220 @@
+"""
+按需采样 profiler
+
+由管理 RPC 或 trame trigger 打开，在固定时间窗内以后台线程周期性采集各线程的 Python 调用栈，
+结束后写出 flamegraph 可用的 collapsed-stack 文件（`flamegraph.pl`、speedscope 可直接打开）。
+
+VTK 的 Render / Update 等调用在 C++ 中执行且可能一直持有 GIL，采样线程在这段时间内拿不到样本，
+因此名称以 `vtk.` 开头的 span 结束时按实际耗时记一条 `调用栈;[vtk.Render]`，
+采样线程则跳过正处于这类 span 中的线程，避免重复计数。
+collapsed 文件中的数值单位为微秒：Python 样本按采样间隔计，VTK 调用按 span 实际耗时计。
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from config import Config
+from core.tracing import Tracer, tracer
+
+logger = logging.getLogger(__name__)
+
+# 视为 VTK 原生调用的 span 名称前缀
+NATIVE_SPAN_PREFIX = "vtk."
+
+# 线程空闲等待时的栈顶（文件名, 函数名），默认不计入
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+# 构造调用栈时跳过的内部帧（span 上下文管理器与 profiler 自身）
+_SKIP_FILES = {
+    os.path.abspath(__file__),
+    os.path.abspath(sys.modules[Tracer.__module__].__file__),
+    os.path.abspath(sys.modules["contextlib"].__file__),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> Optional[str]:
+    """由外向内拼接调用栈，分号分隔"""
+    labels = []
+    while frame is not None:
+        if os.path.abspath(frame.f_code.co_filename) not in _SKIP_FILES:
+            labels.append(_frame_label(frame))
+        frame = frame.f_back
+    if not labels:
+        return None
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    固定时间窗的采样 profiler，同一时间只允许一次采样
+
+    Args:
+        interval: 采样间隔（秒）
+        trace: 用于统计 VTK 调用耗时的 tracer
+        include_idle: 是否计入空闲等待中的线程
+    """
+
+    def __init__(self, interval: float = 0.005, trace: Tracer = tracer, include_idle: bool = False):
+        self.interval = interval
+        self.tracer = trace
+        self.include_idle = include_idle
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.native_calls = 0
+        self.last_result: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float, path: str,
+              on_done: Optional[Callable[[Dict], None]] = None) -> bool:
+        """
+        开始一次采样，duration 秒后写出 collapsed-stack 文件
+
+        Args:
+            duration: 采样时长（秒）
+            path: 输出文件路径
+            on_done: 写出后在采样线程中回调，参数为结果摘要
+
+        Returns:
+            已有采样在进行时返回 False
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.native_calls = 0
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(duration, path, on_done),
+                name="sampling-profiler", daemon=True,
+            )
+            self.tracer.add_listener(self._on_span_end)
+            self._thread.start()
+        logger.info("采样 profiler 已启动: %.1fs, 间隔 %.1fms", duration, self.interval * 1000)
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """提前结束采样并等待文件写出"""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        return self.last_result
+
+    def collapsed(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stacks)
+
+    def _run(self, duration, path, on_done):
+        started = time.monotonic()
+        deadline = started + duration
+        own_id = threading.get_ident()
+        try:
+            while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+                self._sample(own_id)
+        finally:
+            self.tracer.remove_listener(self._on_span_end)
+        result = {
+            "path": path,
+            "duration": round(time.monotonic() - started, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            "native_calls": self.native_calls,
+            "stacks": len(self._stacks),
+        }
+        try:
+            self.write_collapsed(path)
+        except OSError as e:
+            logger.warning("写出 profile 失败 %s: %s", path, e)
+            result["error"] = str(e)
+        self.last_result = result
+        logger.info("采样 profiler 已结束: %s", result)
+        if on_done is not None:
+            on_done(result)
+
+    def _sample(self, own_id: int) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        weight = int(self.interval * 1e6)
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            # VTK 调用的耗时在 span 结束时按实际值计入
+            if any(s.startswith(NATIVE_SPAN_PREFIX)
+                   for s in self.tracer.active_spans(thread_id, include_unsampled=True)):
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                continue
+            stack = _collapse(frame, names.get(thread_id, str(thread_id)))
+            if stack:
+                with self._lock:
+                    self._stacks[stack] += weight
+                self.samples += 1
+
+    def _on_span_end(self, name: str, cat: str, start_ns: int, end_ns: int) -> None:
+        if not name.startswith(NATIVE_SPAN_PREFIX):
+            return
+        # 外层已有 VTK span 时由外层统一计入
+        thread_id = threading.get_ident()
+        if any(s.startswith(NATIVE_SPAN_PREFIX)
+               for s in self.tracer.active_spans(thread_id, include_unsampled=True)):
+            return
+        stack = _collapse(sys._getframe(1), threading.current_thread().name)
+        if stack:
+            with self._lock:
+                self._stacks[f"{stack};[{name}]"] += max(1, (end_ns - start_ns) // 1000)
+            self.native_calls += 1
+
+    def write_collapsed(self, path: str) -> None:
+        """写出 collapsed-stack 文件：每行 `栈帧;栈帧;... 微秒`"""
+        profile_dir = os.path.dirname(path)
+        if profile_dir and not os.path.exists(profile_dir):
+            os.makedirs(profile_dir)
+        stacks = self.collapsed()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, value in sorted(stacks.items()):
+                f.write(f"{stack} {value}\n")
+
+
+# 进程内共享的 profiler
+profiler = SamplingProfiler(Config.PROFILE_INTERVAL)
+
+
+def start_profile(prefix: str, duration: Optional[float] = None,
+                  on_done: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    按配置启动一次采样，输出到 PROFILE_DIR
+
+    Args:
+        prefix: 文件名前缀（webvr / trame）
+        duration: 采样时长（秒），默认 PROFILE_DURATION，不超过 PROFILE_MAX_DURATION
+        on_done: 结束回调
+
+    Returns:
+        {"started", "path", "duration"}，已有采样进行中时 started 为 False
+    """
+    duration = min(float(duration or Config.PROFILE_DURATION), Config.PROFILE_MAX_DURATION)
+    path = os.path.join(Config.PROFILE_DIR, f"{prefix}-{os.getpid()}-{int(time.time())}.collapsed")
+    started = profiler.start(duration, path, on_done)
+    return {"started": started, "path": path if started else None, "duration": duration}
@@ -0,0 +1,311 @@
+"""
+渲染线程
+
+GL 上下文只能同时在一个线程上 current，且一次 Render() 可能要上百毫秒：
+在事件循环线程里渲染会让鼠标事件、心跳以及其他会话的消息都排在它后面。
+这里由一个专用线程持有 GL 上下文，所有触碰渲染窗口的工作（创建窗口、Render()、
+读回与编码、释放 GL 资源）都经队列提交到该线程按顺序执行，事件循环只负责收发消息。
+
+带 key 的任务在开始执行前会被同 key 的新请求就地取代（连续的鼠标移动、同一视图的推图、
+回放换帧），队列长度因此不会随请求速率增长。
+"""
+
+import asyncio
+import atexit
+import collections
+import functools
+import inspect
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from config import Config
+from core.metrics import RENDER_QUEUE_DEPTH, RENDER_QUEUE_SECONDS, RENDER_SUPERSEDED
+
+logger = logging.getLogger(__name__)
+
+
+class _Task:
+    __slots__ = ("fn", "args", "kwargs", "key", "future", "submitted")
+
+    def __init__(self, fn, args, kwargs, key):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class RenderExecutor:
+    """
+    单线程渲染执行器
+
+    首次从事件循环中提交任务时记下该循环，渲染线程上的回调（推送、state 写入）经 call_in_loop 切回；
+    没有事件循环时（脚本 / 测试）call_in_loop 直接调用。
+
+    Args:
+        name: 线程名
+    """
+
+    def __init__(self, name: str = "render"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: collections.deque = collections.deque()
+        # key -> 尚未开始执行的任务
+        self._pending: Dict[Hashable, _Task] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        # 线程退出前需在本线程上 Finalize 的渲染窗口（弱引用，窗口释放后自动移除）
+        self._windows: weakref.WeakSet = weakref.WeakSet()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """等待执行的任务数（不含正在执行的任务）"""
+        return len(self._tasks)
+
+    def on_render_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def in_loop(self) -> bool:
+        """当前是否在事件循环线程中"""
+        try:
+            return asyncio.get_running_loop() is not None
+        except RuntimeError:
+            return False
+
+    def submit(self, fn: Callable, *args: Any, key: Optional[Hashable] = None, **kwargs: Any) -> Future:
+        """
+        提交任务到渲染线程
+
+        Args:
+            key: 不为 None 时，尚未开始执行的同 key 任务改为执行本次的 fn / 参数，
+                并返回该任务的 Future（队列位置不变）
+
+        Returns:
+            concurrent.futures.Future
+        """
+        return self._enqueue(fn, args, kwargs, key)[0]
+
+    def _enqueue(self, fn, args, kwargs, key):
+        if self.loop is None and self.in_loop():
+            self.loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("渲染线程已停止")
+            task = self._pending.get(key) if key is not None else None
+            if task is not None:
+                task.fn, task.args, task.kwargs = fn, args, kwargs
+                RENDER_SUPERSEDED.inc()
+                return task.future, False
+            task = _Task(fn, args, kwargs, key)
+            self._tasks.append(task)
+            if key is not None:
+                self._pending[key] = task
+            self._cond.notify()
+        return task.future, True
+
+    def post(self, fn: Callable, *args: Any, key: Optional[Hashable] = None, **kwargs: Any) -> Future:
+        """提交任务且不等待结果，异常写日志"""
+        future, created = self._enqueue(fn, args, kwargs, key)
+        if created:
+            future.add_done_callback(_log_error)
+        return future
+
+    def run(self, fn: Callable, *args: Any, key: Optional[Hashable] = None, **kwargs: Any):
+        """在事件循环中调用：提交任务并返回可 await 的 asyncio.Future"""
+        future = self.submit(fn, *args, key=key, **kwargs)
+        return asyncio.wrap_future(future, loop=asyncio.get_running_loop())
+
+    def call(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """阻塞等待执行结果；已在渲染线程上时直接调用"""
+        if self.on_render_thread():
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def call_in_loop(self, fn: Callable, *args: Any) -> None:
+        """在事件循环线程中调用 fn（已在事件循环中或没有事件循环时直接调用）"""
+        loop = self.loop
+        if loop is None or loop.is_closed() or self.in_loop():
+            fn(*args)
+        else:
+            loop.call_soon_threadsafe(fn, *args)
+
+    def own_window(self, render_window) -> None:
+        """
+        登记由渲染线程持有的渲染窗口：线程退出前在本线程上 Finalize 释放 GL 上下文，
+        否则解释器退出时在主线程析构窗口会因上下文仍属于渲染线程而失败
+        """
+        self._windows.add(render_window)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止接受任务，执行完已排队的任务后退出线程"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if not self.on_render_thread():
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._tasks and not self._stopped:
+                    self._cond.wait()
+                if not self._tasks:
+                    break
+                task = self._tasks.popleft()
+                if task.key is not None:
+                    del self._pending[task.key]
+            RENDER_QUEUE_SECONDS.observe(time.perf_counter() - task.submitted)
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = task.fn(*task.args, **task.kwargs)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+        for render_window in list(self._windows):
+            render_window.Finalize()
+
+
+def _log_error(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        error = future.exception()
+        logger.error("渲染任务失败: %s", error, exc_info=(type(error), error, error.__traceback__))
+
+
+_executor: Optional[RenderExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_render_executor() -> RenderExecutor:
+    """进程内共享的渲染执行器（同一进程的所有视图共用一个 GL 线程），首次调用时创建"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = RenderExecutor()
+            RENDER_QUEUE_DEPTH.set_function(lambda: _executor.depth)
+            # 解释器退出前让渲染线程执行完当前任务并退出，避免在 VTK 调用中途被终止
+            atexit.register(_executor.stop, 5.0)
+        return _executor
+
+
+_compute_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_compute_executor() -> ThreadPoolExecutor:
+    """
+    体数据分析（统计、ROI、等值面提取等）用的线程池，首次调用时创建
+
+    这类计算只读取在渲染线程上取得的 vtkImageData，不触碰渲染窗口，放在这里既不占用事件循环也不阻塞渲染。
+    """
+    global _compute_executor
+    with _executor_lock:
+        if _compute_executor is None:
+            _compute_executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.COMPUTE_WORKERS), thread_name_prefix="compute"
+            )
+        return _compute_executor
+
+
+def run_compute(func: Callable, *args: Any, **kwargs: Any):
+    """在事件循环中调用：把计算提交到分析线程池，返回可 await 的 Future"""
+    return asyncio.get_running_loop().run_in_executor(
+        get_compute_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def on_render_thread(key: Optional[Callable[..., Optional[Hashable]]] = None):
+    """
+    把函数放到渲染线程执行的装饰器
+
+    在事件循环中调用时返回可 await 的 Future（wslink / trame 会等待它完成后回复客户端），
+    在渲染线程上调用时直接执行，在其他线程中调用时阻塞等待结果。
+
+    Args:
+        key: 以调用参数为参数的函数；返回值不为 None 时该次调用只投递、不等待（返回 None），
+            尚未执行的同 key 调用被新的取代
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            executor = get_render_executor()
+            if executor.on_render_thread():
+                return func(*args, **kwargs)
+            task_key = key(*args, **kwargs) if key is not None else None
+            if task_key is not None:
+                executor.post(func, *args, key=task_key, **kwargs)
+                return None
+            if executor.in_loop():
+                return executor.run(func, *args, **kwargs)
+            return executor.call(func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def in_event_loop(func):
+    """在渲染线程等非事件循环线程上被调用时，改为投递到事件循环执行（返回 None）"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        executor = get_render_executor()
+        if executor.in_loop() or executor.loop is None:
+            return func(*args, **kwargs)
+        executor.call_in_loop(functools.partial(func, *args, **kwargs))
+        return None
+
+    return wrapper
+
+
+def render_thread_protocol(protocol_class: type, methods: Optional[Iterable[str]] = None,
+                           keys: Optional[Dict[str, Callable[..., Optional[Hashable]]]] = None) -> type:
+    """
+    生成 wslink 协议类的子类，其 RPC 方法在渲染线程上执行
+
+    functools.wraps 会一并复制 wslink 的注册信息（_wslinkuris），子类方法沿用原 URI。
+    实例的 on_call 不为 None 时，每次 RPC 提交前先在调用线程（事件循环）上调用它，
+    例如刷新发起方会话的活跃时间。
+
+    Args:
+        protocol_class: vtkWebMouseHandler / vtkWebViewPort 等协议类
+        methods: 只处理这些方法，默认为全部 RPC 方法
+        keys: {方法名: key 函数}，见 on_render_thread
+    """
+    keys = keys or {}
+    namespace: Dict[str, Any] = {"on_call": None}
+    for name, func in inspect.getmembers(protocol_class, inspect.isfunction):
+        if "_wslinkuris" not in func.__dict__ or (methods is not None and name not in methods):
+            continue
+        namespace[name] = _notify_call(on_render_thread(key=keys.get(name))(func))
+    return type(f"RenderThread{protocol_class.__name__}", (protocol_class,), namespace)
+
+
+def _notify_call(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self.on_call is not None:
+            self.on_call()
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def mouse_move_key(protocol, event):
+    """鼠标交互 RPC 的合并 key：移动为绝对坐标，尚未处理的移动可被新的取代；按下 / 抬起不合并"""
+    if event.get("action") == "move":
+        return ("mouse.move", id(protocol), event.get("view"))
+    return None
+
+
+def camera_update_key(protocol, view_id, *args, **kwargs):
+    """相机更新 RPC 的合并 key：只保留同一视图最新的相机"""
+    return ("camera.update", id(protocol), view_id)
@@ -1,16 +1,67 @@
-from wslink import server, register as exportRpc
-from vtkmodules.web.wslink import ServerProtocol
-from vtkmodules.web import protocols, wslink as vtk_wslink
-import vtk
 import argparse
+import base64
+import functools
+import logging
 import os
+import threading
 import time
 
+from core.startup import startup, preload_modules
+
+with startup.phase("import.wslink"):
+    from wslink import server, register as exportRpc, schedule_callback
+    from vtkmodules.web.wslink import ServerProtocol
+    from vtkmodules.web import protocols
+with startup.phase("import.vtk"):
+    # 只导入用到的 VTK 模块；体渲染 mapper 在首次渲染时导入，并在监听后后台预热
+    from vtkmodules.vtkCommonCore import vtkCommand
+    from vtkmodules.vtkCommonDataModel import vtkPiecewiseFunction
+    from vtkmodules.vtkInteractionStyle import vtkInteractorStyleTrackballCamera
+    from vtkmodules.vtkRenderingCore import (
+        vtkColorTransferFunction,
+        vtkRenderer,
+        vtkRenderWindow,
+        vtkRenderWindowInteractor,
+        vtkTextActor,
+        vtkVolume,
+        vtkVolumeProperty,
+    )
+    import vtkmodules.vtkRenderingOpenGL2  # noqa: F401  渲染窗口的 OpenGL 实现
+    import vtkmodules.vtkRenderingFreeType  # noqa: F401  FPS 文字渲染
+with startup.phase("import.app"):
+    from config import Config
+    from core.metrics import (
+        FRAME_BYTES,
+        FRAME_ENCODE_SECONDS,
+        RENDER_SECONDS,
+        metered,
+        start_metrics_server,
+        watch_sessions,
+    )
+    from core.leak_tracker import LeakTracker
+    from core.profiler import profiler, start_profile
+    from core.render_thread import (
+        camera_update_key,
+        get_render_executor,
+        in_event_loop,
+        mouse_move_key,
+        on_render_thread,
+        render_thread_protocol,
+        run_compute,
+    )
+    from core.session import SessionManager
+    from core.tracing import tracer, traced
+    from render.dicom_io import read_volume, get_series_prefetcher
+    from render.volume_cache import volume_cache
+
+logger = logging.getLogger(__name__)
+
+
 class FPSCallback:
     def __init__(self, render_window, renderer):
         self.render_window = render_window
         self.renderer = renderer
-        self.text_actor = vtk.vtkTextActor()        
+        self.text_actor = vtkTextActor()        
         self.text_actor.GetTextProperty().SetFontSize(24)
         self.text_actor.GetTextProperty().SetColor(1, 1, 0)
         # 调整位置到右上角
@@ -34,6 +85,125 @@ class FPSCallback:
         self.render_window.Render()
 
 
+class _TracedImageDelivery(protocols.vtkWebPublishImageDelivery):
+    """
+    在图像推送链路上打点：渲染 + 像素读回 + 编码、websocket 推送
+
+    渲染与编码在渲染线程上执行，推送与 stale 重试的调度留在事件循环：
+    同一视图尚未开始的推送只保留一个，渲染慢于请求时不会积压。
+    """
+
+    def __init__(self, decode=True):
+        super().__init__(decode)
+        # 视图 id -> 尚未完成的推送（渲染线程上的 Future）
+        self._pushing = {}
+        # 下一次推送前需要使图像缓存失效的视图
+        self._invalidated = set()
+
+    def init(self, publish, addAttachment, stopServer):
+        def traced_publish(*args, **kwargs):
+            with tracer.span("ws.publish", "send"):
+                return publish(*args, **kwargs)
+
+        super().init(traced_publish, addAttachment, stopServer)
+
+    @in_event_loop
+    def pushRender(self, vId, ignoreAnimation=False):
+        if vId not in self.trackingViews or not self.trackingViews[vId]["enabled"]:
+            return
+        if not ignoreAnimation and len(self.viewsInAnimations) > 0:
+            return
+        executor = get_render_executor()
+        future = executor.submit(self._render_view, vId, key=("image.push", id(self), vId))
+        if self._pushing.get(vId) is not future:
+            self._pushing[vId] = future
+            future.add_done_callback(
+                lambda f: executor.call_in_loop(self._publish_view, vId, f)
+            )
+
+    def _render_view(self, vId):
+        """渲染线程：渲染并编码一帧"""
+        with tracer.span("image.push", "image", view=vId):
+            view = self.getView(vId)
+            if vId in self._invalidated:
+                self._invalidated.discard(vId)
+                self.getApplication().InvalidateCache(view)
+            tracking = self.trackingViews[vId]
+            if "originalSize" not in tracking:
+                tracking["originalSize"] = list(view.GetSize())
+            ratio = tracking.get("ratio", 1)
+            size = [int(s * ratio) for s in tracking["originalSize"]]
+            return self.stillRender(
+                {"view": vId, "mtime": tracking["mtime"], "quality": tracking["quality"], "size": size}
+            )
+
+    def _publish_view(self, vId, future):
+        """事件循环：发布渲染结果，图像仍在编码时稍后重试（同 pushRender 的原有逻辑）"""
+        if self._pushing.get(vId) is future:
+            del self._pushing[vId]
+        if future.exception() is not None:
+            logger.error("推送画面失败: %s", future.exception(), exc_info=future.exception())
+            return
+        reply = future.result()
+        if reply["image"]:
+            if self.decode:
+                reply["image"] = base64.standard_b64decode(reply["image"])
+            reply["image"] = self.addAttachment(reply["image"])
+            reply["format"] = "jpeg"
+            if vId in self.trackingViews:
+                self.trackingViews[vId]["mtime"] = reply["mtime"]
+            reply["id"] = vId
+            self.publish("viewport.image.push.subscription", reply)
+        if reply["stale"]:
+            self.lastStaleTime = time.time()
+            if self.staleHandlerCount == 0:
+                self.staleHandlerCount += 1
+                schedule_callback(
+                    self.deltaStaleTimeBeforeRender, lambda: self.renderStaleImage(vId)
+                )
+        else:
+            self.lastStaleTime = 0
+
+    def stillRender(self, options):
+        with tracer.span("image.still_render", "encode"), \
+                FRAME_ENCODE_SECONDS.time(app="wslink"):
+            reply = super().stillRender(options)
+        if reply and reply.get("image"):
+            FRAME_BYTES.observe(len(reply["image"]), app="wslink")
+        return reply
+
+    # 交互开始 / 结束由渲染线程上的鼠标事件触发，动画调度须回到事件循环
+    @exportRpc("viewport.image.animation.start")
+    @in_event_loop
+    def startViewAnimation(self, viewId="-1"):
+        return super().startViewAnimation(viewId)
+
+    @exportRpc("viewport.image.animation.stop")
+    @in_event_loop
+    def stopViewAnimation(self, viewId="-1"):
+        return super().stopViewAnimation(viewId)
+
+    @exportRpc("viewport.image.push")
+    def imagePush(self, options):
+        realViewId = str(self.getGlobalId(self.getView(options["view"])))
+        # 图像缓存在渲染线程上、下一帧渲染前失效，保证推送一帧新画面
+        self._invalidated.add(realViewId)
+        self.pushRender(realViewId)
+
+    # 会调整窗口尺寸或触碰图像缓存的 RPC 放到渲染线程
+    setViewQuality = on_render_thread()(protocols.vtkWebPublishImageDelivery.setViewQuality)
+    invalidateCache = on_render_thread()(protocols.vtkWebPublishImageDelivery.invalidateCache)
+
+
+# 鼠标交互与视口操作会调用交互器 / 渲染窗口，整体在渲染线程上执行
+_MouseHandler = render_thread_protocol(
+    protocols.vtkWebMouseHandler, keys={"mouseInteraction": mouse_move_key}
+)
+_ViewPort = render_thread_protocol(
+    protocols.vtkWebViewPort, keys={"updateCamera": camera_update_key}
+)
+
+
 # VR实现
 # 1. 初始化渲染器
 # 2. io数据解析
@@ -51,13 +221,20 @@ class VRRender:
         level=1000,
         colormap=None,  # colormap: list of (value, r, g, b) tuples or None
         opacity_map=None,  # opacity_map: list of (value, opacity) tuples or None
+        spacing=None,  # 重采样间距：None 不重采样，"iso" 各向同性，或 (x, y, z)
     ):
         if renderer is None or render_window is None or interactor is None:
             raise ValueError(
                 "renderer, render_window, and interactor must all be provided and cannot be None"
             )
         self.dicom_dir = dicom_dir
-        self.image_reader = None
+        self.spacing = spacing
+        # 体数据标识（含重采样间距），统计 / ROI / 传输负载按它缓存
+        self.volume_key = None
+        # 当前显示的体数据所在序列目录与重采样间距（回放换帧后为期相目录、不重采样），导出按它重建画面
+        self.source_dir = None
+        self.source_spacing = None
+        self.image_data = None
         self.volume = None
         self.render_window = render_window
         self.renderer = renderer
@@ -66,14 +243,19 @@ class VRRender:
         self.level = level
         self.colormap = colormap
         self.opacity_map = opacity_map
+        # 视图状态版本号，每次 apply_view_state 成功后递增
+        self.state_version = 0
 
     def setup(self):
         if not self.dicom_dir or not os.path.exists(self.dicom_dir):
             raise ValueError(f"DICOM directory {self.dicom_dir} not found")
-        # 读取DICOM数据，实际上是data source
-        self.image_reader = vtk.vtkDICOMImageReader()
-        self.image_reader.SetDirectoryName(self.dicom_dir)
-        self.image_reader.Update()
+        # 读取DICOM数据，实际上是data source（经由进程内体数据缓存，重采样结果同样缓存）
+        with tracer.span("io.read_dicom_series", "io", dicom_dir=self.dicom_dir):
+            self.volume_key, self.image_data = read_volume(self.dicom_dir, self.spacing)
+        self.source_dir, self.source_spacing = self.dicom_dir, self.spacing
+        prefetcher = get_series_prefetcher()
+        if prefetcher is not None:
+            prefetcher.prefetch_siblings(self.dicom_dir)
 
         # 确保 renderer 已添加到 render_window
         renderers = [
@@ -86,20 +268,22 @@ class VRRender:
         # 确保 interactor 绑定了 render_window 并设置交互样式
         if self.interactor.GetRenderWindow() != self.render_window:
             self.interactor.SetRenderWindow(self.render_window)
-        interactor_style = vtk.vtkInteractorStyleTrackballCamera()
+        interactor_style = vtkInteractorStyleTrackballCamera()
         self.interactor.SetInteractorStyle(interactor_style)
 
         # 这里使用系统自动选择，如果是GPU服务器的话，可以直接选择用GPU去生成， mapper构建
-        volume_mapper = vtk.vtkSmartVolumeMapper()
-        volume_mapper.SetInputConnection(self.image_reader.GetOutputPort())
+        from vtkmodules.vtkRenderingVolumeOpenGL2 import vtkSmartVolumeMapper
 
-        self.volume = vtk.vtkVolume()
+        volume_mapper = vtkSmartVolumeMapper()
+        volume_mapper.SetInputData(self.image_data)
+
+        self.volume = vtkVolume()
         self.volume.SetMapper(volume_mapper)
 
-        volume_property = vtk.vtkVolumeProperty()
+        volume_property = vtkVolumeProperty()
 
         # 设置colormap
-        color_func = vtk.vtkColorTransferFunction()
+        color_func = vtkColorTransferFunction()
         if self.colormap is not None:
             for pt in self.colormap:
                 if len(pt) == 4:
@@ -113,7 +297,7 @@ class VRRender:
         volume_property.SetColor(color_func)
 
         # 设置opacity
-        opacity_func = vtk.vtkPiecewiseFunction()
+        opacity_func = vtkPiecewiseFunction()
         if self.opacity_map is not None:
             for pt in self.opacity_map:
                 if len(pt) == 2:
@@ -127,12 +311,12 @@ class VRRender:
         # 设置窗宽窗位（通过调整color/opacity transfer function实现窗宽窗位）
         min_val = self.level - self.window / 2
         max_val = self.level + self.window / 2
-        color_func = vtk.vtkColorTransferFunction()
+        color_func = vtkColorTransferFunction()
         color_func.AddRGBPoint(min_val, 0.0, 0.0, 0.0)
         color_func.AddRGBPoint(max_val, 1.0, 1.0, 1.0)
         volume_property.SetColor(color_func)
 
-        opacity_func = vtk.vtkPiecewiseFunction()
+        opacity_func = vtkPiecewiseFunction()
         opacity_func.AddPoint(min_val, 0.0)
         opacity_func.AddPoint(max_val, 1.0)
         volume_property.SetScalarOpacity(opacity_func)
@@ -144,6 +328,7 @@ class VRRender:
     # 优化：去除此处的 self.render_window.Render()，统一在 RendererPicker 渲染
 
     # 调窗调用
+    @traced(cat="tf")
     def set_window_level(self, window, level):
         """设置窗宽窗位"""
         self.window = window
@@ -155,27 +340,28 @@ class VRRender:
             # 这里简单实现为重新设置 colormap 和 opacity_map
             # 你可以根据需要自定义窗宽窗位的映射方式
             # 例如，线性拉伸灰度范围
-            color_func = vtk.vtkColorTransferFunction()
+            color_func = vtkColorTransferFunction()
             min_val = self.level - self.window / 2
             max_val = self.level + self.window / 2
             color_func.AddRGBPoint(min_val, 0.0, 0.0, 0.0)
             color_func.AddRGBPoint(max_val, 1.0, 1.0, 1.0)
             prop.SetColor(color_func)
 
-            opacity_func = vtk.vtkPiecewiseFunction()
+            opacity_func = vtkPiecewiseFunction()
             opacity_func.AddPoint(min_val, 0.0)
             opacity_func.AddPoint(max_val, 1.0)
             prop.SetScalarOpacity(opacity_func)
 
             if self.render_window is not None:
-                self.render_window.Render()
+                self._render()
 
     # 设置传输样条曲线
+    @traced(cat="tf")
     def set_colormap(self, colormap):
         """设置伪彩色映射，colormap为[(value, r, g, b), ...]"""
         self.colormap = colormap
         if self.volume is not None:
-            color_func = vtk.vtkColorTransferFunction()
+            color_func = vtkColorTransferFunction()
             for pt in colormap:
                 if len(pt) == 4:
                     value, r, g, b = pt
@@ -183,14 +369,15 @@ class VRRender:
             prop = self.volume.GetProperty()
             prop.SetColor(color_func)
             if self.render_window is not None:
-                self.render_window.Render()
+                self._render()
 
     # 设置不透明度映射
+    @traced(cat="tf")
     def set_opacity_map(self, opacity_map):
         """设置不透明度映射，opacity_map为[(value, opacity), ...]"""
         self.opacity_map = opacity_map
         if self.volume is not None:
-            opacity_func = vtk.vtkPiecewiseFunction()
+            opacity_func = vtkPiecewiseFunction()
             for pt in opacity_map:
                 if len(pt) == 2:
                     value, opacity = pt
@@ -198,18 +385,209 @@ class VRRender:
             prop = self.volume.GetProperty()
             prop.SetScalarOpacity(opacity_func)
             if self.render_window is not None:
-                self.render_window.Render()
+                self._render()
+
+    # 批量应用视图状态
+    @traced(cat="tf")
+    def apply_view_state(self, window=None, level=None, colormap=None,
+                         opacity_map=None, camera=None):
+        """
+        一次性应用窗宽窗位、colormap、opacity_map 与相机，仅渲染一次
+
+        colormap / opacity_map 优先于窗宽窗位生成的线性灰阶；
+        camera 为 {"position", "focal_point", "view_up", "view_angle"} 的任意子集。
+        所有参数先校验再统一生效，返回新的状态版本号。
+        """
+        if (window is None) != (level is None):
+            raise ValueError("window 与 level 必须同时提供")
+        try:
+            if window is not None:
+                window, level = float(window), float(level)
+            colormap = [tuple(float(v) for v in pt) for pt in colormap] if colormap is not None else None
+            opacity_map = [tuple(float(v) for v in pt) for pt in opacity_map] if opacity_map is not None else None
+        except (TypeError, ValueError):
+            raise ValueError("window / level 与 colormap / opacity_map 的点必须为数值") from None
+        if colormap is not None and any(len(pt) != 4 for pt in colormap):
+            raise ValueError("colormap 每个点必须为 (value, r, g, b)")
+        if opacity_map is not None and any(len(pt) != 2 for pt in opacity_map):
+            raise ValueError("opacity_map 每个点必须为 (value, opacity)")
+        camera = _validate_camera(camera) if camera else None
+
+        if window is not None:
+            self.window = window
+            self.level = level
+        if colormap is not None:
+            self.colormap = colormap
+        if opacity_map is not None:
+            self.opacity_map = opacity_map
+
+        if self.volume is not None:
+            prop = self.volume.GetProperty()
+            min_val = self.level - self.window / 2
+            max_val = self.level + self.window / 2
+            if colormap is not None or window is not None:
+                color_func = vtkColorTransferFunction()
+                if colormap is not None:
+                    for value, r, g, b in colormap:
+                        color_func.AddRGBPoint(value, r, g, b)
+                else:
+                    color_func.AddRGBPoint(min_val, 0.0, 0.0, 0.0)
+                    color_func.AddRGBPoint(max_val, 1.0, 1.0, 1.0)
+                prop.SetColor(color_func)
+            if opacity_map is not None or window is not None:
+                opacity_func = vtkPiecewiseFunction()
+                if opacity_map is not None:
+                    for value, opacity in opacity_map:
+                        opacity_func.AddPoint(value, opacity)
+                else:
+                    opacity_func.AddPoint(min_val, 0.0)
+                    opacity_func.AddPoint(max_val, 1.0)
+                prop.SetScalarOpacity(opacity_func)
+
+        if camera:
+            vtk_camera = self.renderer.GetActiveCamera()
+            if "position" in camera:
+                vtk_camera.SetPosition(*camera["position"])
+            if "focal_point" in camera:
+                vtk_camera.SetFocalPoint(*camera["focal_point"])
+            if "view_up" in camera:
+                vtk_camera.SetViewUp(*camera["view_up"])
+            if "view_angle" in camera:
+                vtk_camera.SetViewAngle(camera["view_angle"])
+            self.renderer.ResetCameraClippingRange()
+
+        self.state_version += 1
+        if self.render_window is not None:
+            self._render()
+        return self.state_version
+
+    def show_volume(self, volume_key, image_data, source_dir=None):
+        """
+        只替换 mapper 输入（4D 回放换帧），volume、传输函数与相机保持不变
+
+        Args:
+            volume_key: 新体数据的标识
+            image_data: 与当前体数据同尺寸的 vtkImageData
+            source_dir: 新体数据所在的序列目录（未经重采样）
+        """
+        if self.volume is None:
+            return
+        self.volume.GetMapper().SetInputData(image_data)
+        self.volume_key = volume_key
+        self.image_data = image_data
+        self.source_dir, self.source_spacing = source_dir, None
+        self._render()
+
+    def _render(self):
+        with tracer.span("vtk.Render", "render"), RENDER_SECONDS.time(app="wslink"):
+            self.render_window.Render()
 
     def get_render_window(self):
         return self.render_window
 
+    def memory_bytes(self):
+        """当前持有的体数据内存（字节）"""
+        if self.image_data is None:
+            return 0
+        return self.image_data.GetActualMemorySize() * 1024
+
+    def vtk_objects(self):
+        """本会话独占的 VTK 对象（渲染窗口与 renderer 为所有会话共享，不计入）"""
+        return [obj for obj in (self.volume, self.image_data) if obj is not None]
+
+    def release(self):
+        """移除 volume 并释放 mapper 的 GL 资源与体数据引用（体数据本身由缓存管理）"""
+        if self.volume is not None:
+            mapper = self.volume.GetMapper()
+            if self.renderer is not None:
+                self.renderer.RemoveVolume(self.volume)
+            if mapper is not None:
+                mapper.ReleaseGraphicsResources(self.render_window)
+                mapper.RemoveAllInputConnections(0)
+            self.volume = None
+        self.image_data = None
+
     def clear(self):
         """只移除本类创建的 volume，不影响其他渲染内容"""
-        if self.volume is not None and self.renderer is not None:
-            self.renderer.RemoveVolume(self.volume)
-            self.volume = None
+        self.release()
         if self.render_window is not None:
-            self.render_window.Render()
+            self._render()
+
+
+_CAMERA_VECTORS = ("position", "focal_point", "view_up")
+
+
+def _validate_camera(camera):
+    """校验相机参数：position / focal_point / view_up 为 3 个数值，view_angle 为数值；返回转换为 float 的副本"""
+    validated = {}
+    try:
+        for name in _CAMERA_VECTORS:
+            if name in camera:
+                vector = tuple(float(v) for v in camera[name])
+                if len(vector) != 3:
+                    raise ValueError
+                validated[name] = vector
+        if "view_angle" in camera:
+            validated["view_angle"] = float(camera["view_angle"])
+    except (TypeError, ValueError):
+        raise ValueError(
+            "camera 的 position / focal_point / view_up 必须为 3 个数值，view_angle 必须为数值"
+        ) from None
+    return validated
+
+
+def rpc_traced(name):
+    """
+    RPC span 同时记录消息到达后（事件循环 + 渲染队列中）的排队耗时，并计入 RPC 耗时 / 异常指标
+
+    在事件循环上被调用时刷新发起方会话的活跃时间（经 render_rpc 提交的 RPC 已在提交时刷新）。
+    """
+    span = traced(name, cat="rpc", queued_since=lambda protocol: protocol.rpc_arrival())
+
+    def decorator(func):
+        traced_func = span(metered(name)(func))
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not get_render_executor().on_render_thread():
+                self.touch_session()
+            return traced_func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# 渲染线程上正在执行的 RPC 的 (会话 id, 消息到达时间)，提交时在事件循环上取得
+_rpc_context = threading.local()
+
+
+def render_rpc(func):
+    """
+    RPC 主体提交到渲染线程执行，事件循环在等待期间继续处理其他消息
+
+    发起方会话与消息到达时间须在提交时取得（事件循环随后会处理下一条消息），随任务带到渲染线程。
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        executor = get_render_executor()
+        if executor.on_render_thread():
+            return func(self, *args, **kwargs)
+        # 事件循环按到达顺序逐条分派消息，进入这里的时刻即本条消息的到达时间
+        context = (self.current_session_id(), tracer.now())
+        self.sessions.touch(context[0])
+
+        def call():
+            _rpc_context.current = context
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                _rpc_context.current = None
+
+        return executor.run(call)
+
+    return wrapper
 
 
 class _WebVR(ServerProtocol):
@@ -217,16 +595,50 @@ class _WebVR(ServerProtocol):
     view = None
     authKey = "wslink-secret"
     vr_render = None
+    # 当前 vr_render 所属的会话（wslink client_id）
+    vr_owner = None
+    # 点云图层及其所属会话
+    point_cloud = None
+    point_cloud_owner = None
+    # 分割结果图层及其所属会话（与 vr_render 为同一会话，mask 模式下替换其 mapper 输入）
+    segmentation = None
+    segmentation_owner = None
+    # 4D 回放及其所属会话（与 vr_render 为同一会话）
+    playback = None
+    playback_owner = None
+    # 高分辨率截图导出（所有会话共用的后台进程池，首次导出时创建）
+    exporter = None
+    ws_server = None
+    # 空闲回收检查间隔（秒）
+    eviction_interval = 30
+    # /metrics 端点端口，0 表示不启动
+    metrics_port = 0
 
     def initialize(self):
         # 设置交互协议
-        self.registerVtkWebProtocol(protocols.vtkWebMouseHandler())
-        self.registerVtkWebProtocol(protocols.vtkWebViewPort())
-        self.registerVtkWebProtocol(protocols.vtkWebPublishImageDelivery(decode=False))
+        # 鼠标交互与相机操作在提交到渲染线程前刷新发起方会话的活跃时间
+        mouse_handler, view_port = _MouseHandler(), _ViewPort()
+        mouse_handler.on_call = view_port.on_call = self.touch_session
+        self.registerVtkWebProtocol(mouse_handler)
+        self.registerVtkWebProtocol(view_port)
+        self.registerVtkWebProtocol(_TracedImageDelivery(decode=False))
         # 不需要这个协议
         # self.registerVtkWebProtocol(protocols.vtkWebViewPortGeometryDelivery())
         self.updateSecret(_WebVR.authKey)
 
+        self.sessions = SessionManager(
+            Config.SESSION_IDLE_TIMEOUT, on_evict=self._on_session_released
+        )
+        watch_sessions("wslink", self.sessions)
+        self.leak_tracker = LeakTracker(self.sessions)
+        # 处理客户端消息（渲染）期间暂停后台预取
+        prefetcher = get_series_prefetcher()
+        if prefetcher is not None:
+            self.network_monitor.add_listener(
+                prefetcher.begin_interactive, prefetcher.end_interactive
+            )
+        schedule_callback(self.eviction_interval, self._evict_idle_sessions)
+
         app = self.getApplication()
         if app and hasattr(app, "SetImageEncoding"):
             app.SetImageEncoding(0)
@@ -237,9 +649,11 @@ class _WebVR(ServerProtocol):
                 "getApplication() returned None or does not have SetImageEncoding"
             )
 
-        # 初始化默认视图
+        # 初始化默认视图（GL 上下文在渲染线程上创建，此后只在该线程上使用）
+        executor = get_render_executor()
         if not _WebVR.view:
-            self.render_window = self.initRenderWindow()
+            with startup.phase("render_window.init"):
+                self.render_window = executor.call(self.initRenderWindow)
             # 设置默认视图
             _WebVR.view = self.render_window
 
@@ -252,20 +666,99 @@ class _WebVR(ServerProtocol):
                 logging.warning(
                     "getApplication() returned None or does not have GetObjectIdMap"
                 )
-            _WebVR.view.Render()
+            with startup.phase("render_window.first_render"):
+                executor.call(_WebVR.view.Render)
+
+    def port_callback(self, port):
+        """由 wslink 在开始监听后回调：输出启动阶段报告并后台预热渲染模块"""
+        startup.mark_ready()
+        print(f"render 服务已在端口 {port} 监听\n{startup.format_report()}")
+        preload_modules()
+        if self.metrics_port:
+            start_metrics_server(self.metrics_port, Config.METRICS_HOST)
+
+    def rpc_arrival(self):
+        """当前 RPC 消息的到达时间（渲染线程上执行的 RPC 为提交时刻；在事件循环上直接执行的 RPC 没有排队）"""
+        context = getattr(_rpc_context, "current", None)
+        if context is not None:
+            return context[1]
+        return None
+
+    def set_server(self, ws_server):
+        """由 wslink 在启动时回调，用于获取当前发起 RPC 的 client_id"""
+        self.ws_server = ws_server
+
+    def current_session_id(self):
+        context = getattr(_rpc_context, "current", None)
+        if context is not None:
+            return context[0]
+        if self.ws_server is not None and self.ws_server.last_active_client_id:
+            return self.ws_server.last_active_client_id
+        return "default"
+
+    def touch_session(self):
+        """刷新当前 RPC 发起方会话的活跃时间，须在收到消息时（事件循环上）调用"""
+        self.sessions.touch(self.current_session_id())
+
+    def onConnect(self, request, client_id):
+        self.sessions.open(client_id)
+
+    def onClose(self, client_id):
+        # 释放 GL 资源须在渲染线程上进行
+        get_render_executor().post(self._close_session, client_id)
+
+    def _close_session(self, client_id):
+        self.sessions.close(client_id)
+        self._on_session_released(client_id)
+
+    def _on_session_released(self, session_id):
+        # 会话的资源已由 SessionManager 释放，这里只需解除引用并刷新画面
+        released = False
+        if self.playback_owner == session_id:
+            self.playback = None
+            self.playback_owner = None
+        if self.segmentation_owner == session_id:
+            self.segmentation = None
+            self.segmentation_owner = None
+            released = True
+        if self.point_cloud_owner == session_id:
+            self.point_cloud = None
+            self.point_cloud_owner = None
+            released = True
+        if self.vr_owner == session_id:
+            self.vr_render = None
+            self.vr_owner = None
+            released = True
+        if released:
+            if _WebVR.view:
+                _WebVR.view.Render()
+            self.force_refresh()
+
+    def _evict_idle_sessions(self):
+        try:
+            get_render_executor().post(self.sessions.evict_idle)
+        finally:
+            schedule_callback(self.eviction_interval, self._evict_idle_sessions)
 
     def initRenderWindow(self):
-        self.renderer = vtk.vtkRenderer()
-        self.render_window = vtk.vtkRenderWindow()
+        self.renderer = vtkRenderer()
+        self.render_window = vtkRenderWindow()
         self.render_window.SetOffScreenRendering(1)  # 启用离屏渲染
         self.render_window.AddRenderer(self.renderer)
         # 设置背景颜色为深灰色 (0.2, 0.2, 0.2)
         self.renderer.SetBackground(0.2, 0.2, 0.2)
+        # 交互器须在渲染窗口首次渲染前绑定，之后再创建并绑定会在下一次 Render 时崩溃
+        self.interactor = vtkRenderWindowInteractor()
+        self.interactor.SetRenderWindow(self.render_window)
+        self.interactor.SetInteractorStyle(vtkInteractorStyleTrackballCamera())
         fps_callback = FPSCallback(self.render_window, self.renderer)
-        self.render_window.AddObserver(vtk.vtkCommand.RenderEvent, fps_callback.execute)
+        self.render_window.AddObserver(vtkCommand.RenderEvent, fps_callback.execute)
+        get_render_executor().own_window(self.render_window)
         return self.render_window
 
     @exportRpc("app.action.start_render")
+    @render_rpc
+    @rpc_traced("app.action.start_render")
     def start_render(self, params):
         print(f"start_render: {params}")
 
@@ -276,15 +769,13 @@ class _WebVR(ServerProtocol):
 
         # 创建VR渲染器
         if not self.vr_render:
-            self.interactor = vtk.vtkRenderWindowInteractor()
-            self.interactor.SetRenderWindow(_WebVR.view)
-            interactor_style = vtk.vtkInteractorStyleTrackballCamera()
-            self.interactor.SetInteractorStyle(interactor_style)
-
             self.vr_render = VRRender(
-                params.get("dicom_dir"), _WebVR.view, self.renderer, self.interactor
+                params.get("dicom_dir"), _WebVR.view, self.renderer, _WebVR.view.GetInteractor(),
+                spacing=params.get("spacing", Config.RESAMPLE_SPACING),
             )
             self.vr_render.setup()
+            self.vr_owner = self.current_session_id()
+            self.sessions.attach(self.vr_owner, self.vr_render)
 
         self.renderer.ResetCamera()
         _WebVR.view.Render()
@@ -298,15 +789,230 @@ class _WebVR(ServerProtocol):
             app.InvokeEvent("UpdateEvent")
         
     @exportRpc("app.action.clear_render")
+    @render_rpc
+    @rpc_traced("app.action.clear_render")
     def clear_render(self):
+        self._clear_playback()
+        self._clear_segmentation()
         if self.vr_render:
-            self.vr_render.clear()
+            self.sessions.detach(self.vr_owner, self.vr_render)
             self.vr_render = None
+            self.vr_owner = None
+            _WebVR.view.Render()
         self.force_refresh()
         return {"status": "cleared"}
 
+    @exportRpc("app.action.segment")
+    @rpc_traced("app.action.segment")
+    async def segment(self, params):
+        """
+        阈值 + 连通域分割当前体数据并显示
+
+        params: {"low", "high"} 或 {"preset": "bone"}，可选 keep_largest、min_voxels、
+        seeds（世界坐标）、mode（overlay 叠加显示 / mask 只显示选中结构）、color、opacity
+        """
+        from render.segmentation import get_segmentation
+
+        if self.playback is not None:
+            # 回放换帧会替换分割所依据的体数据
+            return {"status": "unsupported", "reason": "回放期相序列时不支持分割，请先清除回放"}
+        volume = await self._displayed_volume()
+        if volume is None:
+            return {"status": "no_render"}
+        # 阈值与连通域标记在分析线程池中进行，渲染线程只负责挂载图层
+        result = await run_compute(get_segmentation, *volume, params)
+        return await get_render_executor().run(self._show_segmentation, volume, result, params)
+
+    def _show_segmentation(self, volume, result, params):
+        """渲染线程：显示分割结果；计算期间体数据已被替换或清除时不再显示"""
+        from render.segmentation import SegmentationLayer
+
+        if not self.vr_render or self.vr_render.image_data is not volume[1]:
+            return {"status": "stale"}
+        if self.playback is not None:
+            # 计算期间加载了回放
+            return {"status": "unsupported", "reason": "回放期相序列时不支持分割，请先清除回放"}
+        self._clear_segmentation()
+        self.segmentation = SegmentationLayer(
+            result, self.renderer, self.vr_render.volume,
+            mode=params.get("mode", "overlay"),
+            color=params.get("color", (1.0, 0.3, 0.2)),
+            opacity=float(params.get("opacity", 0.5)),
+        )
+        self.segmentation_owner = self.vr_owner
+        self.sessions.attach(self.segmentation_owner, self.segmentation)
+        _WebVR.view.Render()
+        self.force_refresh()
+        return {"status": "ok", **result.to_dict()}
+
+    @exportRpc("app.action.clear_segmentation")
+    @render_rpc
+    @rpc_traced("app.action.clear_segmentation")
+    def clear_segmentation(self):
+        if self._clear_segmentation():
+            _WebVR.view.Render()
+            self.force_refresh()
+        return {"status": "cleared"}
+
+    def _clear_segmentation(self):
+        if not self.segmentation:
+            return False
+        self.sessions.detach(self.segmentation_owner, self.segmentation)
+        self.segmentation = None
+        self.segmentation_owner = None
+        return True
+
+    @exportRpc("app.playback.load")
+    @render_rpc
+    @rpc_traced("app.playback.load")
+    def playback_load(self, params):
+        """
+        加载 4D / 多期相序列并显示第一个期相
+
+        params: {"phases": [期相目录, ...]} 或 {"phase_root": 目录}（其下每个子目录为一个期相），
+        可选 capacity（环形缓冲区期相数）、fps
+        """
+        from render.phase_playback import PhasePlayer, find_phase_series
+
+        phases = params.get("phases") or find_phase_series(params["phase_root"])
+        phases = [os.path.abspath(p) for p in phases]
+        self._clear_playback()
+        # 换帧替换 mapper 输入：mask 模式的分割图层会被覆盖、release 后也无法恢复，叠加层则停留在原期相
+        if self._clear_segmentation():
+            _WebVR.view.Render()
+        if not self.vr_render:
+            self.start_render({"dicom_dir": phases[0]})
+        player = PhasePlayer(
+            phases,
+            # 换帧渲染慢于帧率时，尚未渲染的旧帧被新帧取代
+            show=lambda index, image_data, frame: get_render_executor().post(
+                self._show_phase, player, phases[index], image_data, frame, key=("playback.show", id(self))
+            ),
+            schedule=schedule_callback,
+            capacity=int(params.get("capacity", Config.PLAYBACK_BUFFER_SIZE)),
+            fps=float(params.get("fps", Config.PLAYBACK_FPS)),
+        )
+        self.playback = player
+        self.playback_owner = self.vr_owner
+        self.sessions.attach(self.playback_owner, self.playback)
+        return {"status": "loaded", **self.playback.stats()}
+
+    @exportRpc("app.playback.play")
+    @rpc_traced("app.playback.play")
+    def playback_play(self, fps=None):
+        if not self.playback:
+            return {"status": "no_playback"}
+        self.playback.play(float(fps) if fps is not None else None)
+        return {"status": "playing", **self.playback.stats()}
+
+    @exportRpc("app.playback.pause")
+    @rpc_traced("app.playback.pause")
+    def playback_pause(self):
+        if not self.playback:
+            return {"status": "no_playback"}
+        self.playback.pause()
+        return {"status": "paused", **self.playback.stats()}
+
+    @exportRpc("app.playback.seek")
+    @rpc_traced("app.playback.seek")
+    def playback_seek(self, index):
+        if not self.playback:
+            return {"status": "no_playback"}
+        shown = self.playback.seek(int(index))
+        return {"status": "ok" if shown else "loading", **self.playback.stats()}
+
+    @exportRpc("app.playback.status")
+    @rpc_traced("app.playback.status")
+    def playback_status(self):
+        if not self.playback:
+            return {"status": "no_playback"}
+        return {"status": "ok", **self.playback.stats()}
+
+    def _show_phase(self, player, phase_dir, image_data, frame):
+        if self.vr_render and player is self.playback:
+            # show_volume 同步渲染，返回后计为已渲染的一帧
+            self.vr_render.show_volume(phase_dir, image_data, source_dir=phase_dir)
+            player.frame_rendered(frame)
+            self.force_refresh()
+
+    def _clear_playback(self):
+        if self.playback:
+            self.sessions.detach(self.playback_owner, self.playback)
+            self.playback = None
+            self.playback_owner = None
+
+    @exportRpc("app.action.load_point_cloud")
+    @render_rpc
+    @rpc_traced("app.action.load_point_cloud")
+    def load_point_cloud(self, params):
+        """
+        加载点云并替换当前点云图层
+
+        params 为 {"path": "xxx.npy"}（内存映射读取 N×3 数组），
+        或 {"random": 点数, "bounds": [...]}（随机点，用于演示与压测）
+        """
+        from render.point_cloud import PointCloud, PointCloudLayer
+        from utils import generate_random_points
+
+        if params.get("path"):
+            cloud = PointCloud.from_file(params["path"])
+        elif params.get("random"):
+            bounds = params.get("bounds") or [-5, 5, -5, 5, -5, 5]
+            cloud = PointCloud(generate_random_points(int(params["random"]), bounds))
+        else:
+            raise ValueError("需要提供 path 或 random")
+
+        if self.point_cloud:
+            self.sessions.detach(self.point_cloud_owner, self.point_cloud)
+        self.point_cloud = PointCloudLayer(cloud, self.renderer)
+        self.point_cloud_owner = self.current_session_id()
+        self.sessions.attach(self.point_cloud_owner, self.point_cloud)
+        self.renderer.ResetCamera()
+        _WebVR.view.Render()
+        self.force_refresh()
+        return {
+            "status": "loaded",
+            "points": len(cloud),
+            "bounds": cloud.bounds,
+            "levels": self.point_cloud.level_sizes(),
+        }
+
+    @exportRpc("app.action.pick_point")
+    @render_rpc
+    @rpc_traced("app.action.pick_point")
+    def pick_point(self, x, y, tolerance=None):
+        """
+        按屏幕位置拾取点云中离相机最近的点
+
+        Args:
+            x, y: 归一化视口坐标（0 ~ 1，原点在左下角，与鼠标交互事件一致）
+            tolerance: 距视线的容差（世界坐标），默认为索引单元大小的一半
+        """
+        if not self.point_cloud:
+            return {"index": None}
+        width, height = _WebVR.view.GetSize()
+        cloud = self.point_cloud.cloud
+        index = cloud.index.pick(self.renderer, x * width, y * height, tolerance)
+        if index is None:
+            return {"index": None}
+        return {"index": index, "position": [float(v) for v in cloud.points[index]]}
+
+    @exportRpc("app.action.clear_point_cloud")
+    @render_rpc
+    @rpc_traced("app.action.clear_point_cloud")
+    def clear_point_cloud(self):
+        if self.point_cloud:
+            self.sessions.detach(self.point_cloud_owner, self.point_cloud)
+            self.point_cloud = None
+            self.point_cloud_owner = None
+            _WebVR.view.Render()
+            self.force_refresh()
+        return {"status": "cleared"}
+
     # 调窗调用
     @exportRpc("app.action.set_window_level")
+    @render_rpc
+    @rpc_traced("app.action.set_window_level")
     def set_window_level(self, window, level):
         if self.vr_render:
             self.vr_render.set_window_level(window, level)
@@ -315,12 +1021,197 @@ class _WebVR(ServerProtocol):
 
     # 设置样条曲线
     @exportRpc("app.action.set_colormap")
+    @render_rpc
+    @rpc_traced("app.action.set_colormap")
     def set_colormap(self, colormap):
         if self.vr_render:
             self.vr_render.set_colormap(colormap)
         self.force_refresh()
         return {"status": "set_colormap", "colormap": colormap}
 
+    # 批量设置窗宽窗位、样条曲线、不透明度与相机，只渲染并推送一帧
+    @exportRpc("app.action.apply_view_state")
+    @render_rpc
+    @rpc_traced("app.action.apply_view_state")
+    def apply_view_state(self, view_state):
+        if not self.vr_render:
+            return {"status": "no_render", "version": 0}
+        version = self.vr_render.apply_view_state(
+            window=view_state.get("window"),
+            level=view_state.get("level"),
+            colormap=view_state.get("colormap"),
+            opacity_map=view_state.get("opacity_map"),
+            camera=view_state.get("camera"),
+        )
+        self.force_refresh()
+        return {"status": "ok", "version": version}
+
+    @render_rpc
+    def _displayed_volume(self):
+        """
+        在渲染线程上取得当前显示的 (volume_key, image_data)
+
+        回放换帧、clear_render 与空闲回收都在渲染线程上替换 / 释放 vr_render 的数据，
+        之后的计算只使用这里取得的引用，不再读取 vr_render。
+        """
+        if not self.vr_render or self.vr_render.image_data is None:
+            return None
+        return self.vr_render.volume_key, self.vr_render.image_data
+
+    # 本地渲染模式：一次性下发降采样、量化并经 zlib 压缩的体数据，之后交互全部在浏览器完成
+    @exportRpc("app.action.get_volume_payload")
+    @rpc_traced("app.action.get_volume_payload")
+    async def get_volume_payload(self, params=None):
+        params = params or {}
+        from render import volume_transfer
+
+        volume = await self._displayed_volume()
+        if volume is None:
+            return {"status": "no_render"}
+        payload = await run_compute(
+            volume_transfer.get_volume_payload,
+            *volume,
+            max_dim=int(params.get("max_dim", volume_transfer.DEFAULT_MAX_DIM)),
+            bits=int(params.get("bits", 8)),
+        )
+        return {"status": "ok", **payload}
+
+    # 等值面模式：下发量化压缩后的网格，由客户端本地渲染，之后旋转不再占用服务端
+    @exportRpc("app.action.get_isosurface")
+    @rpc_traced("app.action.get_isosurface")
+    async def get_isosurface(self, params=None):
+        """params: {"iso": HU} 或 {"preset": "bone" / "skin"}，可选 decimation（0 ~ 1 的减面比例）"""
+        params = params or {}
+        from render import isosurface
+
+        volume = await self._displayed_volume()
+        if volume is None:
+            return {"status": "no_render"}
+        iso = isosurface.resolve_iso_value(params.get("iso"), params.get("preset"))
+        payload = await run_compute(
+            isosurface.get_isosurface_payload,
+            *volume,
+            iso,
+            decimation=float(params.get("decimation", 0.0)),
+        )
+        return {"status": "ok", **payload}
+
+    # 体数据统计（范围、4096 bin 直方图、百分位、组织区间计数），每个体数据只计算一次
+    @exportRpc("app.action.get_volume_stats")
+    @rpc_traced("app.action.get_volume_stats")
+    async def get_volume_stats(self, include_histogram=True):
+        from render.volume_stats import get_volume_statistics
+
+        volume = await self._displayed_volume()
+        if volume is None:
+            return {"status": "no_render"}
+        stats = await run_compute(get_volume_statistics, *volume)
+        return {"status": "ok", **stats.to_dict(include_histogram)}
+
+    # ROI 测量（盒形 / 球形 / 手绘层块），结果按 (体数据, ROI) 缓存
+    @exportRpc("app.action.get_roi_stats")
+    @rpc_traced("app.action.get_roi_stats")
+    async def get_roi_stats(self, roi):
+        from render.roi_stats import get_roi_statistics
+
+        volume = await self._displayed_volume()
+        if volume is None:
+            return {"status": "no_render"}
+        stats = await run_compute(get_roi_statistics, *volume, roi)
+        return {"status": "ok", **stats.to_dict()}
+
+    # 高分辨率截图导出：在独立进程中按块渲染当前画面，流式写 PNG，通过 status 查询进度
+    @exportRpc("app.export.start")
+    @render_rpc
+    @rpc_traced("app.export.start")
+    def export_start(self, params=None):
+        """params: 可选 width、height（默认 7680×4320），以当前会话的传输函数、相机与背景色导出"""
+        params = params or {}
+        from core.tiled_export import TiledExporter, capture_view_state
+
+        if not self.vr_render or self.vr_render.volume is None:
+            return {"status": "no_render"}
+        if self.segmentation is not None:
+            # 导出进程按序列目录重建画面，分割图层与 mask 模式替换的主体输入都不会带过去
+            return {"status": "unsupported", "reason": "显示分割结果时不支持导出，请先清除分割"}
+        if _WebVR.exporter is None:
+            _WebVR.exporter = TiledExporter()
+        job = _WebVR.exporter.submit(
+            capture_view_state(self.vr_render),
+            int(params.get("width", 7680)),
+            int(params.get("height", 4320)),
+        )
+        return {"status": "ok", "job": job}
+
+    @exportRpc("app.export.status")
+    @rpc_traced("app.export.status")
+    def export_status(self, job_id=None):
+        if _WebVR.exporter is None:
+            return {"status": "ok", "jobs": []}
+        if job_id is None:
+            return {"status": "ok", "jobs": _WebVR.exporter.status()}
+        return {"status": "ok", "job": _WebVR.exporter.status(job_id)}
+
+    @exportRpc("app.export.cancel")
+    @rpc_traced("app.export.cancel")
+    def export_cancel(self, job_id):
+        """取消排队中的导出任务"""
+        cancelled = _WebVR.exporter is not None and _WebVR.exporter.cancel(job_id)
+        return {"status": "cancelled" if cancelled else "not_cancelled"}
+
+    @exportRpc("app.action.prefetch_status")
+    @rpc_traced("app.action.prefetch_status")
+    def prefetch_status(self):
+        prefetcher = get_series_prefetcher()
+        return {
+            "cache": volume_cache.stats(),
+            "prefetch": prefetcher.stats() if prefetcher is not None else None,
+        }
+
+    @exportRpc("app.action.session_status")
+    @rpc_traced("app.action.session_status")
+    def session_status(self):
+        return self.sessions.snapshot()
+
+    @exportRpc("app.action.startup_report")
+    def startup_report(self):
+        return startup.report()
+
+    @exportRpc("app.trace.configure")
+    def trace_configure(self, sample_rate):
+        tracer.set_sample_rate(sample_rate)
+        return {"sample_rate": tracer.sample_rate}
+
+    @exportRpc("app.trace.export")
+    def trace_export(self, clear=False):
+        """导出 Chrome trace-event JSON，同时写入 TRACE_DIR"""
+        path = os.path.join(Config.TRACE_DIR, f"webvr-{os.getpid()}-{int(time.time())}.json")
+        trace = tracer.export_chrome_trace(path)
+        if clear:
+            tracer.clear()
+        return {"path": path, "trace": trace}
+
+    @exportRpc("app.leaks.mark")
+    @render_rpc
+    def leaks_mark(self, name="baseline"):
+        """记录 VTK 对象快照作为基线"""
+        return self.leak_tracker.mark(name)
+
+    @exportRpc("app.leaks.report")
+    @render_rpc
+    def leaks_report(self, name="baseline"):
+        """与基线快照相比 VTK 对象数与字节数的增量（按会话）"""
+        return self.leak_tracker.report(name)
+
+    @exportRpc("app.profile.start")
+    def profile_start(self, duration=None):
+        """开始一次采样，结束后 collapsed-stack 文件写入 PROFILE_DIR"""
+        return start_profile("webvr", duration)
+
+    @exportRpc("app.profile.status")
+    def profile_status(self):
+        return {"running": profiler.running, "last": profiler.last_result}
+
 
 
 # =============================================================================
@@ -332,6 +1223,32 @@ if __name__ == "__main__":
     # Create argument parser
     parser = argparse.ArgumentParser(description="VTK/Web Cone web-application")
     server.add_arguments(parser)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("RENDER_WORKERS", 1)),
+        help="render worker 进程数，大于 1 时本进程作为前置路由 (default: 1)",
+    )
+    parser.add_argument(
+        "--worker-base-port",
+        type=int,
+        default=int(os.getenv("RENDER_WORKER_BASE_PORT", 9100)),
+        dest="worker_base_port",
+        help="render worker 监听的起始端口 (default: 9100)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=Config.METRICS_PORT,
+        dest="metrics_port",
+        help="Prometheus /metrics 端点端口，多 worker 时各 worker 依次递增，0 表示关闭 (default: %(default)s)",
+    )
     args = parser.parse_args()
     _WebVR.authKey = args.authKey
-    server.start_webserver(options=args, protocol=_WebVR)
+    _WebVR.metrics_port = args.metrics_port
+    if args.workers > 1:
+        from core.worker_pool import start_worker_pool
+
+        start_worker_pool(args, args.workers, args.worker_base_port)
+    else:
+        server.start_webserver(options=args, protocol=_WebVR)
@@ -0,0 +1,158 @@
+"""
+会话生命周期管理
+
+跟踪每个会话持有的渲染资源与内存占用，在清除 / 断开时释放 GL 资源与体数据引用，
+并按空闲超时回收会话，保证长时间运行的服务内存不会无限增长。
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_rss_bytes() -> Optional[int]:
+    """当前进程常驻内存（字节），仅 Linux 下可用"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class Session:
+    """单个会话及其持有的可释放资源（需实现 release() 与 memory_bytes()）"""
+
+    session_id: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_active: float = field(default_factory=time.monotonic)
+    connected: bool = True
+    resources: List[Any] = field(default_factory=list)
+
+    def memory_bytes(self) -> int:
+        return sum(r.memory_bytes() for r in self.resources)
+
+    def release(self) -> None:
+        for resource in self.resources:
+            try:
+                resource.release()
+            except Exception as e:
+                logger.error("释放会话 %s 资源失败: %s", self.session_id, e)
+        self.resources.clear()
+
+
+class SessionManager:
+    """
+    会话管理器
+
+    Args:
+        idle_timeout: 空闲超时秒数，<= 0 表示不做空闲回收
+        on_evict: 会话被回收后的回调，参数为 session_id
+    """
+
+    def __init__(self, idle_timeout: float = 900.0,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.RLock()
+
+    def open(self, session_id: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                self._sessions[session_id] = session
+            session.connected = True
+            session.last_active = time.monotonic()
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def touch(self, session_id: Optional[str]) -> None:
+        if session_id is None:
+            return
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_active = time.monotonic()
+
+    def attach(self, session_id: str, resource: Any) -> None:
+        """把资源挂到会话上，会话关闭或回收时统一释放"""
+        with self._lock:
+            session = self.open(session_id)
+            if resource not in session.resources:
+                session.resources.append(resource)
+
+    def detach(self, session_id: str, resource: Any) -> None:
+        """释放并移除单个资源（例如 clear_render）"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and resource in session.resources:
+                session.resources.remove(resource)
+        resource.release()
+
+    def close(self, session_id: str) -> None:
+        """断开连接：释放会话的全部资源并移除会话"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.release()
+            logger.info("会话 %s 已关闭并释放资源", session_id)
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """回收空闲超时的会话，返回被回收的 session_id 列表"""
+        if self.idle_timeout <= 0:
+            return []
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                sid for sid, s in self._sessions.items()
+                if now - s.last_active > self.idle_timeout
+            ]
+            sessions = [self._sessions.pop(sid) for sid in expired]
+        for session in sessions:
+            session.release()
+            logger.info("会话 %s 空闲超时，已回收", session.session_id)
+            if self.on_evict is not None:
+                self.on_evict(session.session_id)
+        return expired
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(s.memory_bytes() for s in self._sessions.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def resources_by_session(self) -> Dict[str, List[Any]]:
+        """各会话当前持有的资源（副本）"""
+        with self._lock:
+            return {sid: list(s.resources) for sid, s in self._sessions.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            sessions = [
+                {
+                    "session_id": s.session_id,
+                    "connected": s.connected,
+                    "idle_seconds": round(now - s.last_active, 1),
+                    "memory_bytes": s.memory_bytes(),
+                    "resources": len(s.resources),
+                }
+                for s in self._sessions.values()
+            ]
+        return {
+            "sessions": sessions,
+            "resident_bytes": sum(s["memory_bytes"] for s in sessions),
+            "process_rss_bytes": process_rss_bytes(),
+        }
@@ -0,0 +1,104 @@
+"""
+启动耗时分析
+
+记录 render 服务启动过程中各阶段（模块导入、参数解析、协议初始化、GL 上下文、端口监听）的耗时，
+服务开始监听时输出一份阶段报告，便于定位冷启动与 worker 重启的瓶颈。
+
+另提供后台预热：把首次渲染才用到的重量级模块放到监听之后的后台线程中导入。
+"""
+
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 首次渲染才需要的 VTK 模块，服务开始监听后在后台预热
+RENDER_MODULES = (
+    "vtkmodules.vtkRenderingVolumeOpenGL2",
+    "vtkmodules.vtkIOImage",
+    "numpy",
+)
+
+
+class StartupProfiler:
+    """
+    启动阶段计时器
+
+    阶段按开始顺序记录；阶段之间未被覆盖的时间在报告中单独列为 other。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float, float]] = []
+        self.ready_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个启动阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - self.started, time.perf_counter() - start))
+
+    def mark_ready(self) -> float:
+        """标记服务可以接受连接，返回自进程启动计时以来的总耗时（秒）"""
+        if self.ready_at is None:
+            self.ready_at = time.perf_counter() - self.started
+        return self.ready_at
+
+    def report(self) -> Dict[str, object]:
+        total = self.ready_at if self.ready_at is not None else time.perf_counter() - self.started
+        phases = [
+            {"name": name, "start": round(offset, 4), "seconds": round(seconds, 4)}
+            for name, offset, seconds in self.phases
+        ]
+        # 只统计顶层阶段，嵌套阶段完全包含在外层之内
+        covered = 0.0
+        end = 0.0
+        for _, offset, seconds in sorted(self.phases, key=lambda p: p[1]):
+            if offset >= end:
+                covered += seconds
+                end = offset + seconds
+            elif offset + seconds > end:
+                covered += offset + seconds - end
+                end = offset + seconds
+        return {
+            "total": round(total, 4),
+            "other": round(max(total - covered, 0.0), 4),
+            "phases": phases,
+        }
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [f"启动耗时 {report['total'] * 1000:.0f} ms"]
+        for phase in report["phases"]:
+            lines.append(f"  {phase['name']:<28} {phase['seconds'] * 1000:8.1f} ms")
+        lines.append(f"  {'other':<28} {report['other'] * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+# 进程内共享的启动计时器，尽早导入以覆盖后续模块的导入耗时
+startup = StartupProfiler()
+
+
+def preload_modules(modules: Iterable[str] = RENDER_MODULES) -> threading.Thread:
+    """在后台线程中预先导入模块，首个渲染请求不再承担导入耗时"""
+
+    def run():
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                logger.warning("预热模块 %s 失败: %s", name, e)
+                continue
+            logger.debug("预热模块 %s 用时 %.3fs", name, time.perf_counter() - start)
+
+    thread = threading.Thread(target=run, name="module-preload", daemon=True)
+    thread.start()
+    return thread
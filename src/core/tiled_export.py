@@ -0,0 +1,385 @@
+"""
+高分辨率分块截图导出
+
+交互渲染窗口固定为 1024×1024，打印用的 8K 等大图按 m×m 块渲染：导出窗口为单块大小，
+每块缩小相机视角（透视为 tan(θ/2)/m，平行投影为 parallel_scale/m）并用 WindowCenter 平移到
+该块的位置，与 vtkRenderLargeImage 的做法相同，但不在内存中拼出整幅图像：每渲染完一行块
+就把这条带按扫描线写进流式 PNG 编码器，内存占用只与一条带的大小有关。
+
+导出在独立的低优先级进程中进行（各自的离屏 GL 上下文与体数据副本），
+不占用交互会话所在的事件循环线程与 GL 上下文；进度经进程间队列回传，由 RPC 查询。
+"""
+
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from core.metrics import EXPORT_JOBS
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 压缩输出累计到该大小后写出一个 IDAT 块
+_IDAT_SIZE = 1 << 20
+
+
+class PNGStreamWriter:
+    """
+    逐扫描线写 8 位 RGB PNG，只缓存一个 IDAT 块的压缩输出
+
+    每行使用 Sub 滤波（与左侧像素的差值），对渲染图像中大片平滑区域压缩效果明显好于不滤波。
+    """
+
+    def __init__(self, path: str, width: int, height: int, level: int = 6):
+        self.path = path
+        self.width = int(width)
+        self.height = int(height)
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj(level)
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._file.write(PNG_SIGNATURE)
+        # 位深 8、颜色类型 2（RGB）、压缩 / 滤波 / 隔行均为 0
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _emit(self, data: bytes, force: bool = False) -> None:
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending_size >= _IDAT_SIZE or (force and self._pending_size):
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending.clear()
+            self._pending_size = 0
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """
+        追加扫描线
+
+        Args:
+            rows: (n, width, 3) uint8，自上而下
+        """
+        if rows.ndim != 3 or rows.shape[1:] != (self.width, 3) or rows.dtype != np.uint8:
+            raise ValueError(f"扫描线需为 (n, {self.width}, 3) uint8，实际为 {rows.shape} {rows.dtype}")
+        if self.rows + len(rows) > self.height:
+            raise ValueError("写入的行数超过图像高度")
+        flat = rows.reshape(len(rows), -1)
+        filtered = np.empty((len(rows), flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1  # Sub
+        filtered[:, 1:4] = flat[:, :3]
+        np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+        self._emit(self._compressor.compress(filtered.tobytes()))
+        self.rows += len(rows)
+
+    def abort(self) -> None:
+        """放弃写入并删除未完成的文件"""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        try:
+            if self.rows != self.height:
+                raise ValueError(f"只写入了 {self.rows} / {self.height} 行")
+            self._emit(self._compressor.flush(), force=True)
+            self._chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+
+def tile_layout(width: int, height: int, max_tile: int) -> Tuple[int, int, int]:
+    """
+    分块方式
+
+    Returns:
+        (m, tile_width, tile_height)：m×m 块，每块 tile_width×tile_height，拼接后不小于 width×height
+        （多出的右侧 / 底部不足一个像素宽的余量在写出时裁掉）
+    """
+    if width <= 0 or height <= 0:
+        raise ValueError("导出尺寸必须大于 0")
+    m = max(1, -(-max(width, height) // max_tile))
+    return m, -(-width // m), -(-height // m)
+
+
+def _read_pixels(render_window) -> np.ndarray:
+    """读回后缓冲，返回自上而下的 (h, w, 3) uint8"""
+    from vtkmodules.vtkCommonCore import vtkUnsignedCharArray
+
+    from render.numpy_bridge import vtk_to_array
+
+    # 设置了 TileScale 的窗口 GetSize 会放大，这里取实际尺寸
+    w, h = render_window.GetActualSize()
+    pixels = vtkUnsignedCharArray()
+    render_window.GetPixelData(0, 0, w - 1, h - 1, 0, pixels, 0)
+    return vtk_to_array(pixels).reshape(h, w, 3)[::-1]
+
+
+def render_tiles(render_window, renderer, width: int, height: int,
+                 on_rows: Callable[[np.ndarray], None], max_tile: int = Config.EXPORT_TILE_SIZE,
+                 progress: Optional[Callable[[int, int], None]] = None) -> None:
+    """
+    按块渲染 width×height 的图像，每完成一行块回调一次 on_rows(自上而下的扫描线)
+
+    渲染期间临时修改窗口尺寸与相机，结束后恢复。
+
+    Args:
+        render_window: 离屏渲染窗口
+        renderer: 其中唯一的 renderer
+        width, height: 导出尺寸
+        on_rows: 接收 (n, width, 3) uint8 扫描线
+        max_tile: 单块边长上限
+        progress: progress(已完成块数, 总块数)
+    """
+    from vtkmodules.vtkRenderingCore import vtkCamera
+
+    m, tile_w, tile_h = tile_layout(width, height, max_tile)
+    camera = renderer.GetActiveCamera()
+    saved = vtkCamera()
+    saved.DeepCopy(camera)
+    saved_size = render_window.GetSize()
+    band = np.empty((tile_h, tile_w * m, 3), dtype=np.uint8)
+    total = m * m
+    try:
+        render_window.SetSize(tile_w, tile_h)
+        if camera.GetParallelProjection():
+            camera.SetParallelScale(saved.GetParallelScale() / m)
+        else:
+            half = np.radians(saved.GetViewAngle()) / 2
+            camera.SetViewAngle(np.degrees(2 * np.arctan(np.tan(half) / m)))
+        cx, cy = saved.GetWindowCenter()
+        renderer.ResetCameraClippingRange()
+        for row, ty in enumerate(range(m - 1, -1, -1)):
+            for tx in range(m):
+                # WindowCenter 以单块的半宽 / 半高为单位
+                camera.SetWindowCenter(cx * m + 2 * tx + 1 - m, cy * m + 2 * ty + 1 - m)
+                render_window.Render()
+                band[:, tx * tile_w:(tx + 1) * tile_w] = _read_pixels(render_window)
+                if progress is not None:
+                    progress(row * m + tx + 1, total)
+            top = row * tile_h
+            rows = min(tile_h, height - top)
+            if rows > 0:
+                on_rows(band[:rows, :width])
+    finally:
+        camera.DeepCopy(saved)
+        render_window.SetSize(*saved_size)
+        renderer.ResetCameraClippingRange()
+
+
+def transfer_points(volume_property) -> Tuple[List[Tuple[float, ...]], List[Tuple[float, float]]]:
+    """当前生效的传输函数节点：([(value, r, g, b)], [(value, opacity)])"""
+    color = volume_property.GetRGBTransferFunction()
+    opacity = volume_property.GetScalarOpacity()
+    colormap = []
+    for i in range(color.GetSize()):
+        node = [0.0] * 6
+        color.GetNodeValue(i, node)
+        colormap.append(tuple(node[:4]))
+    opacity_map = []
+    for i in range(opacity.GetSize()):
+        node = [0.0] * 4
+        opacity.GetNodeValue(i, node)
+        opacity_map.append(tuple(node[:2]))
+    return colormap, opacity_map
+
+
+def capture_view_state(vr_render) -> Dict[str, Any]:
+    """
+    从交互会话的 VRRender 取出导出进程重建同一画面所需的状态
+
+    体数据按当前显示的序列目录重新读取（4D 回放时为当前期相）；只在内存中存在的输入
+    （分割图层、mask 模式的主体数据）无法重建，由调用方在导出前拒绝。
+    """
+    camera = vr_render.renderer.GetActiveCamera()
+    colormap, opacity_map = transfer_points(vr_render.volume.GetProperty())
+    return {
+        "study": vr_render.source_dir,
+        "spacing": vr_render.source_spacing,
+        "window": vr_render.window,
+        "level": vr_render.level,
+        "colormap": colormap,
+        "opacity_map": opacity_map,
+        "background": tuple(vr_render.renderer.GetBackground()),
+        "camera": {
+            "position": camera.GetPosition(),
+            "focal_point": camera.GetFocalPoint(),
+            "view_up": camera.GetViewUp(),
+            "view_angle": camera.GetViewAngle(),
+            "parallel_scale": camera.GetParallelScale() if camera.GetParallelProjection() else None,
+        },
+    }
+
+
+# 导出进程内的进度队列，由进程池 initializer 设置
+_progress_queue = None
+
+
+def _init_export_worker(queue, niceness: int) -> None:
+    global _progress_queue
+    _progress_queue = queue
+    Config.PREFETCH_ENABLED = False
+    # 降低优先级，CPU 紧张时让出给交互渲染
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+
+
+def export_view(job_id: str, view_state: Dict[str, Any], path: str, width: int, height: int,
+                max_tile: int = Config.EXPORT_TILE_SIZE) -> Dict[str, Any]:
+    """
+    在当前进程中重建画面并分块导出 PNG（导出进程的任务，也可直接调用）
+
+    Returns:
+        {"path", "width", "height", "tiles", "bytes", "seconds"}
+    """
+    from core.batch_render import create_offscreen_view
+    from core.server import VRRender
+
+    started = time.perf_counter()
+    render_window, renderer, interactor = create_offscreen_view(*tile_layout(width, height, max_tile)[1:])
+    renderer.SetBackground(*view_state.get("background", Config.VTK_BACKGROUND_COLOR))
+    vr = VRRender(view_state["study"], render_window, renderer, interactor,
+                  window=view_state["window"], level=view_state["level"], spacing=view_state.get("spacing"))
+
+    def progress(done, total):
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, done, total))
+
+    m = tile_layout(width, height, max_tile)[0]
+    tmp_path = path + ".part"
+    writer = None
+    try:
+        vr.setup()
+        camera = dict(view_state["camera"])
+        parallel_scale = camera.pop("parallel_scale", None)
+        if parallel_scale is not None:
+            renderer.GetActiveCamera().ParallelProjectionOn()
+            renderer.GetActiveCamera().SetParallelScale(parallel_scale)
+        vr.apply_view_state(view_state["window"], view_state["level"],
+                            view_state.get("colormap"), view_state.get("opacity_map"), camera)
+        progress(0, m * m)
+        writer = PNGStreamWriter(tmp_path, width, height)
+        render_tiles(render_window, renderer, width, height, writer.write_rows, max_tile, progress)
+        writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        vr.release()
+        render_window.Finalize()
+    return {"path": path, "width": width, "height": height, "tiles": m * m,
+            "bytes": os.path.getsize(path), "seconds": round(time.perf_counter() - started, 3)}
+
+
+class TiledExporter:
+    """
+    后台导出任务管理：spawn 进程池执行 export_view，进度经队列回传
+
+    Args:
+        output_dir: 导出文件目录
+        workers: 同时运行的导出进程数，其余任务排队
+        niceness: 导出进程的 nice 增量
+    """
+
+    def __init__(self, output_dir: str = Config.EXPORT_DIR, workers: int = Config.EXPORT_WORKERS,
+                 niceness: int = Config.EXPORT_NICENESS, max_tile: int = Config.EXPORT_TILE_SIZE):
+        self.output_dir = output_dir
+        self.max_tile = max_tile
+        context = multiprocessing.get_context("spawn")
+        self._queue = context.Queue()
+        self._pool = ProcessPoolExecutor(max(1, workers), mp_context=context,
+                                         initializer=_init_export_worker, initargs=(self._queue, niceness))
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        EXPORT_JOBS.set_function(self.active_count)
+
+    def submit(self, view_state: Dict[str, Any], width: int, height: int) -> Dict[str, Any]:
+        width, height = int(width), int(height)
+        if max(width, height) > Config.EXPORT_MAX_SIZE:
+            raise ValueError(f"导出尺寸超过上限 {Config.EXPORT_MAX_SIZE}")
+        m = tile_layout(width, height, self.max_tile)[0]
+        os.makedirs(self.output_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex[:12]
+        path = os.path.abspath(os.path.join(self.output_dir, f"export-{time.strftime('%Y%m%d-%H%M%S')}-{job_id}.png"))
+        job = {"id": job_id, "status": "queued", "width": width, "height": height, "path": path,
+               "tiles": m * m, "tiles_done": 0, "progress": 0.0, "bytes": None, "seconds": None, "error": None}
+        with self._lock:
+            self._jobs[job_id] = job
+        future = self._pool.submit(export_view, job_id, view_state, path, width, height, self.max_tile)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        logger.info("导出任务 %s: %dx%d，%d 块", job_id, width, height, m * m)
+        return dict(job)
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            self._futures.pop(job_id, None)
+            if future.cancelled():
+                job["status"] = "cancelled"
+                return
+            error = future.exception()
+            if error is not None:
+                job["status"] = "failed"
+                job["error"] = str(error)
+                logger.error("导出任务 %s 失败: %s", job_id, error)
+                return
+            result = future.result()
+            job.update(status="done", tiles_done=job["tiles"], progress=1.0,
+                       bytes=result["bytes"], seconds=result["seconds"])
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                job_id, done, total = self._queue.get_nowait()
+            except Exception:
+                return
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] in ("queued", "running"):
+                job.update(status="running", tiles_done=done, progress=round(done / total, 4))
+
+    def status(self, job_id: Optional[str] = None):
+        """单个任务的状态；job_id 为 None 时返回全部任务"""
+        with self._lock:
+            self._drain()
+            if job_id is None:
+                return [dict(job) for job in self._jobs.values()]
+            if job_id not in self._jobs:
+                raise ValueError(f"未知的导出任务: {job_id}")
+            return dict(self._jobs[job_id])
+
+    def cancel(self, job_id: str) -> bool:
+        """取消尚未开始的任务；已在渲染的任务无法中断"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        return future is not None and future.cancel()
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._futures)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,209 @@
+"""
+轻量级调用链追踪
+
+在 RPC / state 回调以及渲染管线的关键阶段（传输函数重建、Render、读回与编码、推送）
+打点，记录到内存环形缓冲区，按需导出为 Chrome trace-event JSON
+（chrome://tracing 或 https://ui.perfetto.dev 可直接打开）。
+
+采样在根 span 上决定，子 span 跟随父 span，未采样的调用只有一次随机数开销。
+"""
+
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+
+
+class _Frame:
+    __slots__ = ("name", "cat", "start_ns", "sampled")
+
+    def __init__(self, name: str, cat: str, start_ns: int, sampled: bool):
+        self.name = name
+        self.cat = cat
+        self.start_ns = start_ns
+        self.sampled = sampled
+
+
+class Tracer:
+    """
+    span 记录器
+
+    Args:
+        capacity: 环形缓冲区容量（事件数），写满后丢弃最旧的事件
+        sample_rate: 根 span 的采样率，0 ~ 1
+    """
+
+    def __init__(self, capacity: int = 20000, sample_rate: float = 1.0):
+        self._events: deque = deque(maxlen=capacity)
+        self.sample_rate = sample_rate
+        self._epoch_ns = time.perf_counter_ns()
+        # 线程 id -> 当前打开的 span 栈（各线程只修改自己的栈）
+        self._stacks: Dict[int, List[_Frame]] = {}
+        self._pid = os.getpid()
+        # span 结束时的回调（不论是否采样），供采样 profiler 统计 VTK 调用耗时
+        self._listeners: List[Callable[[str, str, int, int], None]] = []
+
+    def set_sample_rate(self, sample_rate: float) -> None:
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+
+    @staticmethod
+    def now() -> float:
+        """与 span 同一时钟的当前时间（秒）"""
+        return time.perf_counter()
+
+    def _stack(self) -> List[_Frame]:
+        tid = threading.get_ident()
+        stack = self._stacks.get(tid)
+        if stack is None:
+            stack = self._stacks[tid] = []
+        return stack
+
+    def active_spans(self, thread_id: int, include_unsampled: bool = False) -> List[str]:
+        """指定线程当前打开的 span 名称（由外向内）"""
+        return [f.name for f in self._stacks.get(thread_id, ()) if f.sampled or include_unsampled]
+
+    def add_listener(self, listener: Callable[[str, str, int, int], None]) -> None:
+        """注册 span 结束回调 listener(name, cat, start_ns, end_ns)，在结束 span 的线程中调用"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, str, int, int], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @contextmanager
+    def span(self, name: str, cat: str = "app", queued_since: Optional[float] = None,
+             **args: Any):
+        """
+        记录一个 span
+
+        Args:
+            name: span 名称
+            cat: 分类（rpc / state / render / tf / ...）
+            queued_since: 请求到达时间（Tracer.now() 时钟），用于额外记录排队耗时
+            args: 附加到事件上的参数
+        """
+        stack = self._stack()
+        if stack:
+            sampled = stack[-1].sampled
+        else:
+            sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        frame = _Frame(name, cat, time.perf_counter_ns(), sampled)
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            if self._listeners:
+                end_ns = time.perf_counter_ns()
+                for listener in list(self._listeners):
+                    listener(name, cat, frame.start_ns, end_ns)
+            if sampled:
+                end_ns = time.perf_counter_ns()
+                if queued_since is not None:
+                    self.record(f"{name}:queued", "queue",
+                                int(queued_since * 1e9), frame.start_ns)
+                self.record(name, cat, frame.start_ns, end_ns, **args)
+
+    def record(self, name: str, cat: str, start_ns: int, end_ns: int, **args: Any) -> None:
+        """直接记录一个已完成的区间（perf_counter_ns 时钟）"""
+        if end_ns < start_ns:
+            return
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start_ns - self._epoch_ns) / 1000.0,
+            "dur": (end_ns - start_ns) / 1000.0,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        self._events.append(event)
+
+    def record_root(self, name: str, cat: str, start_ns: int, end_ns: int,
+                    queued_since: Optional[float] = None) -> None:
+        """
+        按采样率记录一个不经过 span 栈的根区间
+
+        协程在 await 期间会与同一线程上的其他回调交错执行，不能占用线程的 span 栈，结束时再记录。
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if queued_since is not None:
+            self.record(f"{name}:queued", "queue", int(queued_since * 1e9), start_ns)
+        self.record(name, cat, start_ns, end_ns)
+
+    def clear(self) -> None:
+        self._events.clear()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def export_chrome_trace(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        导出 Chrome trace-event JSON
+
+        Args:
+            path: 指定时同时写入该文件
+
+        Returns:
+            {"traceEvents": [...], "displayTimeUnit": "ms"}
+        """
+        trace = {"traceEvents": list(self._events), "displayTimeUnit": "ms"}
+        if path:
+            trace_dir = os.path.dirname(path)
+            if trace_dir and not os.path.exists(trace_dir):
+                os.makedirs(trace_dir)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(trace, f)
+        return trace
+
+
+# 进程内共享的 tracer
+tracer = Tracer(Config.TRACE_BUFFER_SIZE, Config.TRACE_SAMPLE_RATE)
+
+
+def traced(name: Optional[str] = None, cat: str = "rpc",
+           queued_since: Optional[Callable[[Any], Optional[float]]] = None):
+    """
+    为函数加上 span 的装饰器
+
+    Args:
+        name: span 名称，默认使用函数的 __qualname__
+        cat: 分类
+        queued_since: 以第一个位置参数（通常是 self）为参数、返回请求到达时间的函数
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                since = queued_since(args[0]) if queued_since is not None and args else None
+                start_ns = time.perf_counter_ns()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    tracer.record_root(span_name, cat, start_ns, time.perf_counter_ns(), since)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            since = queued_since(args[0]) if queued_since is not None and args else None
+            with tracer.span(span_name, cat, queued_since=since):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -2,14 +2,155 @@ from trame.decorators import TrameApp
 from trame.app import get_server
 from trame_server import Server
 from trame_server.state import State
-from render.dicom_render import VTKVolumeVisualizer
+from render.dicom_render import VTKVolumeVisualizer, get_series_prefetcher
+from render.isosurface import payload_summary
+from render.phase_playback import PhasePlayer, find_phase_series
+from core.metrics import metered, start_metrics_server, watch_sessions
+from core.leak_tracker import LeakTracker
+from core.profiler import start_profile
+from core.render_thread import (
+    camera_update_key,
+    get_render_executor,
+    in_event_loop,
+    mouse_move_key,
+    on_render_thread,
+    render_thread_protocol,
+    run_compute,
+)
+from core.session import SessionManager
+from core.tracing import tracer, traced
+from config import Config
 from typing import Literal
+from trame_vtk.modules.vtk.protocols import (
+    vtkWebMouseHandler,
+    vtkWebPublishImageDelivery,
+    vtkWebViewPort,
+)
+from wslink import register as export_rpc, schedule_callback
+import asyncio
+import base64
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _ImageDelivery(vtkWebPublishImageDelivery):
+    """
+    渲染与编码在渲染线程上执行，推送与 stale 重试的调度留在事件循环，
+    同一视图尚未开始的推送只保留一个（与 core.server 中 wslink 版本的做法相同）
+    """
+
+    def __init__(self, decode=True):
+        super().__init__(decode)
+        # 视图 id -> 尚未完成的推送（渲染线程上的 Future）
+        self._pushing = {}
+        # 下一次推送前需要使图像缓存失效的视图
+        self._invalidated = set()
+        self._stale_counts = {}
+
+    @in_event_loop
+    def push_render(self, v_id, ignore_animation=False, stale_count=0):
+        if v_id not in self.tracking_views or not self.tracking_views[v_id]["enabled"]:
+            return
+        if not ignore_animation and len(self.views_in_animations) > 0:
+            return
+        executor = get_render_executor()
+        self._stale_counts[v_id] = stale_count
+        future = executor.submit(self._render_view, v_id, key=("image.push", id(self), v_id))
+        if self._pushing.get(v_id) is not future:
+            self._pushing[v_id] = future
+            future.add_done_callback(
+                lambda f: executor.call_in_loop(self._publish_view, v_id, f)
+            )
+
+    def _render_view(self, v_id):
+        """渲染线程：渲染并编码一帧"""
+        with tracer.span("image.push", "image", view=v_id):
+            view = self.get_view(v_id)
+            if v_id in self._invalidated:
+                self._invalidated.discard(v_id)
+                self.app.InvalidateCache(view)
+            tracking = self.tracking_views[v_id]
+            if "originalSize" not in tracking:
+                tracking["originalSize"] = list(view.GetSize())
+            ratio = tracking.get("ratio", 1)
+            size = [int((s * ratio) + 0.5) for s in tracking["originalSize"]]
+            with tracer.span("image.still_render", "encode"):
+                return self.still_render(
+                    {"view": v_id, "mtime": tracking["mtime"], "quality": tracking["quality"], "size": size}
+                )
+
+    def _publish_view(self, v_id, future):
+        """事件循环：发布渲染结果，图像仍在编码时稍后重试（同 push_render 的原有逻辑）"""
+        if self._pushing.get(v_id) is future:
+            del self._pushing[v_id]
+        if future.exception() is not None:
+            logger.error("推送画面失败: %s", future.exception(), exc_info=future.exception())
+            return
+        reply = future.result()
+        if reply["image"]:
+            if self.decode:
+                reply["image"] = base64.standard_b64decode(reply["image"])
+            reply["image"] = self.addAttachment(reply["image"])
+            reply["format"] = "jpeg"
+            if v_id in self.tracking_views:
+                self.tracking_views[v_id]["mtime"] = reply["mtime"]
+            reply["id"] = v_id
+            self.publish("viewport.image.push.subscription", reply)
+        if reply["stale"]:
+            stale_count = self._stale_counts.get(v_id, 0)
+            self.last_stale_time[v_id] = time.time()
+            if self.stale_handler_count[v_id] == 0:
+                self.stale_handler_count[v_id] += 1
+                schedule_callback(
+                    self.delta_stale_time_before_render,
+                    lambda: self.render_stale_image(v_id, stale_count),
+                )
+        else:
+            self.last_stale_time[v_id] = 0
+
+    # 交互开始 / 结束由渲染线程上的鼠标事件触发，动画调度须回到事件循环
+    @export_rpc("viewport.image.animation.start")
+    @in_event_loop
+    def start_view_animation(self, view_id="-1"):
+        return super().start_view_animation(view_id)
+
+    @export_rpc("viewport.image.animation.stop")
+    @in_event_loop
+    def stop_view_animation(self, view_id="-1"):
+        return super().stop_view_animation(view_id)
+
+    @export_rpc("viewport.image.push")
+    def image_push(self, options):
+        real_view_id = str(self.get_global_id(self.get_view(options["view"])))
+        # 图像缓存在渲染线程上、下一帧渲染前失效，保证推送一帧新画面
+        self._invalidated.add(real_view_id)
+        self.push_render(real_view_id)
+
+    # 会调整窗口尺寸或触碰图像缓存的 RPC 放到渲染线程
+    set_view_quality = on_render_thread()(vtkWebPublishImageDelivery.set_view_quality)
+    invalidate_cache = on_render_thread()(vtkWebPublishImageDelivery.invalidate_cache)
+
+
+# 鼠标交互与视口操作会调用交互器 / 渲染窗口，整体在渲染线程上执行
+_MouseHandler = render_thread_protocol(vtkWebMouseHandler, keys={"mouse_interaction": mouse_move_key})
+_ViewPort = render_thread_protocol(vtkWebViewPort, keys={"update_camera": camera_update_key})
+
+
 @TrameApp("trame-server-app")
 class TrameServerApp:
     # trame server 实例
     server: Server | None = None
     # trame state 实例
     state: State | None = None
+    # trame 所有客户端共享同一份 state，视为同一个会话
+    session_id = "trame"
+    # 已连接的客户端数，有客户端连接时不做空闲回收
+    connected_clients = 0
+    # 空闲回收检查间隔（秒）
+    eviction_interval = 30
 
     def __init__(self, client_type: Literal["vue2", "vue3"] = "vue2"):
         # 获取 trame 服务器实例，名称与装饰器一致
@@ -22,9 +163,32 @@ class TrameServerApp:
         print("self.state", self.state)
         self.dicom_dir = None  # 初始不设置路径，由客户端传递
         self.visualizer = None
+        self.playback = None  # 4D 回放
+        self.sessions = SessionManager(
+            Config.SESSION_IDLE_TIMEOUT, on_evict=self.on_session_evicted
+        )
+        watch_sessions("trame", self.sessions)
+        self.leak_tracker = LeakTracker(self.sessions)
+        # 所有 VTK / GL 调用都提交到渲染线程，state 回调只在事件循环上等待结果
+        self.render_executor = get_render_executor()
+        # 先启用 trame 的 vtk 模块，下面的协议在其之后注册，同名 RPC 以后注册者为准
+        from trame.widgets import vtk as vtk_widgets
+
+        vtk_widgets.initialize(self.server)
+        self.server.add_protocol_to_configure(self.configure_protocol)
         self.setup_state()
         self.setup_callbacks()
 
+    def configure_protocol(self, protocol):
+        """用在渲染线程上执行的版本替换 trame 的远程渲染协议"""
+        protocol.registerLinkProtocol(_MouseHandler())
+        protocol.registerLinkProtocol(_ViewPort())
+        protocol.registerLinkProtocol(_ImageDelivery(decode=False))
+        # 鼠标交互、相机操作与 state 同步都是客户端消息，每条处理完成后刷新会话活跃时间（同 wslink 版本）
+        protocol.network_monitor.add_listener(
+            lambda: None, lambda: self.sessions.touch(self.session_id)
+        )
+
     def setup_state(self):
         assert self.state is not None, "Trame server/state 未初始化"
         # 初始化共享状态
@@ -32,48 +196,91 @@ class TrameServerApp:
             state.render_data = None  # 用于存储渲染结果
             state.render_status = "idle"  # 渲染状态：idle, processing, done
             state.dicom_dir = ""  # 新增：由客户端传递 DICOM 路径
+            state.prefetch_stats = None  # 同检查序列预取统计
+            state.volume_stats = None  # 当前体数据统计（直方图 / 百分位 / 自动窗宽窗位）
+            state.trace_sample_rate = tracer.sample_rate  # 追踪采样率
+            state.trace_file = None  # 最近一次导出的 trace 文件
+            state.profile_status = "idle"  # 采样 profiler 状态：idle, running
+            state.profile_file = None  # 最近一次采样的 collapsed-stack 文件
+            state.leak_report = None  # 与基线相比的 VTK 对象增量
+            state.resample_spacing = Config.RESAMPLE_SPACING  # 重采样间距：空 / iso / "x,y,z"
+            state.roi = None  # 当前 ROI（盒形 / 球形 / 手绘层块，世界坐标）
+            state.roi_stats = None  # 当前 ROI 的统计结果
+            state.segmentation = None  # 分割参数（阈值 / 预设、保留连通域、显示方式）
+            state.segmentation_result = None  # 分割结果摘要
+            state.isosurface = None  # 等值面参数（iso / preset、decimation），显示时切换到本地渲染
+            state.isosurface_info = None  # 等值面网格摘要（顶点 / 三角形数、下发字节数）
+            state.playback = None  # 4D 回放：{"phases": [...]} 或 {"phase_root": 目录}，可选 capacity
+            state.playback_playing = False  # 播放 / 暂停
+            state.playback_fps = Config.PLAYBACK_FPS  # 目标帧率
+            state.playback_status = None  # 回放状态（当前期相、缓冲区、实际帧率、卡顿次数）
 
     def setup_callbacks(self):
         assert self.server is not None and self.state is not None, "Trame server/state 未初始化"
         @self.state.change("dicom_dir")
-        def on_dicom_dir_change(dicom_dir, **kwargs):
+        @traced("trame.dicom_dir", cat="state")
+        @metered("trame.dicom_dir")
+        async def on_dicom_dir_change(dicom_dir, **kwargs):
             if not dicom_dir:
                 print("未提供 DICOM 路径")
                 return
             print(f"收到客户端 DICOM 路径: {dicom_dir}")
+            if self.playback is not None and dicom_dir not in self.playback.phases:
+                self.clear_playback()
             self.dicom_dir = dicom_dir
-            # 重新初始化可视化器
-            self.visualizer = VTKVolumeVisualizer(self.server, self.dicom_dir)
-            self.visualizer.bind_ui()
-            print("已根据新路径初始化 VTKVolumeVisualizer")
+            # 可视化器与 UI 只创建一次，切换检查时只替换数据
+            if self.visualizer is None:
+                # 渲染窗口在渲染线程上创建，GL 上下文只在该线程上使用
+                self.visualizer = await self.render_executor.run(VTKVolumeVisualizer, self.server)
+                self.sessions.attach(self.session_id, self.visualizer)
+                self.visualizer.bind_ui()
+            await self.render_executor.run(self.visualizer.set_data_source, self.dicom_dir)
+            prefetcher = get_series_prefetcher()
+            if prefetcher is not None:
+                prefetcher.prefetch_siblings(self.dicom_dir)
+                self.state.prefetch_stats = prefetcher.stats()
+            print("已切换 VTKVolumeVisualizer 数据源")
 
         @self.state.change("reset_camera")
-        def reset_camera(**kwargs):
+        @traced("trame.reset_camera", cat="state")
+        @metered("trame.reset_camera")
+        async def reset_camera(**kwargs):
             if self.visualizer:
-                self.visualizer.reset_camera()
+                await self.render_executor.run(self.visualizer.reset_camera)
 
         @self.state.change("update_opacity")
-        def update_opacity(opacity_scale, **kwargs):
+        @traced("trame.update_opacity", cat="state")
+        @metered("trame.update_opacity")
+        async def update_opacity(opacity_scale, **kwargs):
             if not self.visualizer:
                 return
-            volumes = self.visualizer.renderer.GetVolumes()
-            if volumes.GetNumberOfItems() > 0:
-                volume = volumes.GetItemAsObject(0)
-                from vtkmodules.vtkRenderingCore import vtkVolume
-                if isinstance(volume, vtkVolume):
-                    opacity_func = volume.GetProperty().GetScalarOpacity()
-                    for i in range(opacity_func.GetSize()):
-                        current_value = opacity_func.GetNodeValue(i)
-                        opacity_func.RemovePoint(current_value)
-                        opacity_func.AddPoint(current_value, min(1.0, current_value * opacity_scale))
-                    if self.visualizer.vtk_view:
-                        self.visualizer.vtk_view.update()
-                        self.visualizer.render_window.Render()
+            visualizer = self.visualizer
+
+            def scale_opacity():
+                volumes = visualizer.renderer.GetVolumes()
+                if volumes.GetNumberOfItems() > 0:
+                    volume = volumes.GetItemAsObject(0)
+                    from vtkmodules.vtkRenderingCore import vtkVolume
+                    if isinstance(volume, vtkVolume):
+                        opacity_func = volume.GetProperty().GetScalarOpacity()
+                        for i in range(opacity_func.GetSize()):
+                            current_value = opacity_func.GetNodeValue(i)
+                            opacity_func.RemovePoint(current_value)
+                            opacity_func.AddPoint(current_value, min(1.0, current_value * opacity_scale))
+                        visualizer.refresh()
+
+            await self.render_executor.run(scale_opacity)
 
+        @traced("trame.update_interaction", cat="state")
+        @metered("trame.update_interaction")
         def update_interaction():
+            self.sessions.touch(self.session_id)
+            prefetcher = get_series_prefetcher()
+            if prefetcher is not None:
+                prefetcher.notify_interactive()
             if self.visualizer and self.visualizer.vtk_view:
-                self.visualizer.vtk_view.update()
-                self.visualizer.render_window.Render()
+                # 连续的 state 变化只保留最后一次尚未执行的刷新
+                self.render_executor.post(self.visualizer.refresh, key=("trame.refresh", id(self)))
                 print("交互更新，强制刷新")
 
         if hasattr(self.state, "on_change") and callable(self.state.on_change):
@@ -81,6 +288,259 @@ class TrameServerApp:
         else:
             print("警告: server.state.on_change 不可用，交互事件未绑定")
 
+        @self.state.change("resample_spacing")
+        @traced("trame.resample_spacing", cat="state")
+        @metered("trame.resample_spacing")
+        async def on_resample_spacing_change(resample_spacing, **kwargs):
+            if self.visualizer:
+                await self.render_executor.run(self.visualizer.set_resample_spacing, resample_spacing)
+
+        @self.state.change("roi")
+        @traced("trame.roi", cat="state")
+        @metered("trame.roi")
+        async def on_roi_change(roi, **kwargs):
+            stats = None
+            if roi and self.visualizer:
+                volume = await self.render_executor.run(self.visualizer.displayed_volume)
+                if volume is not None:
+                    stats = await run_compute(VTKVolumeVisualizer.measure_roi, volume, roi)
+            assert self.state is not None
+            self.state.roi_stats = stats.to_dict() if stats is not None else None
+
+        @self.state.change("segmentation")
+        @traced("trame.segmentation", cat="state")
+        @metered("trame.segmentation")
+        async def on_segmentation_change(segmentation, **kwargs):
+            if not self.visualizer:
+                return
+            visualizer = self.visualizer
+
+            def clear():
+                visualizer.clear_segmentation()
+                visualizer.refresh()
+
+            if segmentation and self.playback is not None:
+                # 回放换帧会替换分割所依据的体数据
+                assert self.state is not None
+                self.state.segmentation_result = {
+                    "status": "unsupported", "reason": "回放期相序列时不支持分割，请先清除回放"
+                }
+                return
+            if segmentation:
+                # 分割在分析线程池中计算，渲染线程只挂载图层
+                result = None
+                volume = await self.render_executor.run(visualizer.displayed_volume)
+                if volume is not None:
+                    result = await run_compute(visualizer.compute_segmentation, volume, segmentation)
+                    # 计算期间加载了回放时不再挂载
+                    if self.playback is not None or not await self.render_executor.run(
+                        visualizer.show_segmentation, volume, result, segmentation
+                    ):
+                        result = None
+            else:
+                await self.render_executor.run(clear)
+                result = None
+            assert self.state is not None
+            self.state.segmentation_result = result.to_dict() if result is not None else None
+
+        @self.state.change("isosurface")
+        @traced("trame.isosurface", cat="state")
+        @metered("trame.isosurface")
+        async def on_isosurface_change(isosurface, **kwargs):
+            if not self.visualizer:
+                return
+            visualizer = self.visualizer
+
+            def clear():
+                visualizer.clear_isosurface()
+                visualizer.refresh()
+
+            assert self.state is not None
+            if isosurface:
+                payload = None
+                volume = await self.render_executor.run(visualizer.displayed_volume)
+                if volume is not None:
+                    payload = await run_compute(visualizer.compute_isosurface, volume, isosurface)
+                    if not await self.render_executor.run(visualizer.show_isosurface, volume, payload):
+                        payload = None
+                self.state.isosurface_info = payload_summary(payload) if payload is not None else None
+                self.state.render_mode = visualizer.render_mode
+            else:
+                await self.render_executor.run(clear)
+                self.state.isosurface_info = None
+
+        @self.state.change("playback")
+        @traced("trame.playback", cat="state")
+        @metered("trame.playback")
+        async def on_playback_change(playback, **kwargs):
+            assert self.state is not None
+            self.clear_playback()
+            if not playback:
+                self.state.playback_status = None
+                return
+            if self.visualizer is not None:
+                # 换帧替换 mapper 输入：mask 模式的分割图层会被覆盖、release 后也无法恢复，叠加层则停留在原期相
+                previous = self.visualizer
+
+                def clear_segmentation():
+                    previous.clear_segmentation()
+                    previous.refresh()
+
+                await self.render_executor.run(clear_segmentation)
+                with self.state as state:
+                    state.segmentation = None
+                    state.segmentation_result = None
+            phases = playback.get("phases") or find_phase_series(playback["phase_root"])
+            phases = [os.path.abspath(p) for p in phases]
+            if self.visualizer is None:
+                await on_dicom_dir_change(phases[0])
+            visualizer = self.visualizer
+            def show_phase(index, image_data, frame):
+                # 渲染线程：remote 模式下 refresh 同步渲染，返回后计为已渲染的一帧
+                if player is self.playback:
+                    visualizer.show_phase(phases[index], image_data)
+                    player.frame_rendered(frame)
+
+            player = PhasePlayer(
+                phases,
+                # 换帧渲染慢于帧率时，尚未渲染的旧帧被新帧取代
+                show=lambda index, image_data, frame: self.render_executor.post(
+                    show_phase, index, image_data, frame, key=("trame.playback.show", id(self))
+                ),
+                schedule=asyncio.get_event_loop().call_later,
+                capacity=int(playback.get("capacity", Config.PLAYBACK_BUFFER_SIZE)),
+                fps=float(self.state.playback_fps),
+            )
+            self.playback = player
+            self.sessions.attach(self.session_id, self.playback)
+            with self.state as state:
+                state.playback_playing = False
+                state.playback_status = self.playback.stats()
+
+        @self.state.change("playback_playing", "playback_fps")
+        @traced("trame.playback_control", cat="state")
+        @metered("trame.playback_control")
+        def on_playback_control(playback_playing, playback_fps, **kwargs):
+            if not self.playback:
+                return
+            if playback_playing:
+                self.playback.play(float(playback_fps))
+            else:
+                self.playback.pause()
+            assert self.state is not None
+            self.state.playback_status = self.playback.stats()
+
+        @self.server.trigger("playback_seek")
+        def playback_seek(index):
+            if self.playback:
+                self.playback.seek(int(index))
+                assert self.state is not None
+                self.state.playback_status = self.playback.stats()
+
+        @self.server.trigger("playback_status")
+        def playback_status():
+            # 换帧时不写 state（避免每帧触发一次同步），由客户端按需拉取
+            assert self.state is not None
+            self.state.playback_status = self.playback.stats() if self.playback else None
+
+        @self.state.change("render_mode")
+        @traced("trame.render_mode", cat="state")
+        @metered("trame.render_mode")
+        async def on_render_mode_change(render_mode, **kwargs):
+            # local 模式下旋转 / 调窗 / 不透明度都在浏览器完成，服务端只在数据变化时下发
+            if self.visualizer:
+                await self.render_executor.run(self.visualizer.set_render_mode, render_mode)
+
+        @self.server.trigger("export_trace")
+        def export_trace():
+            # 导出 Chrome trace-event JSON 到 TRACE_DIR，文件路径写回 state
+            path = os.path.join(Config.TRACE_DIR, f"trame-{os.getpid()}-{int(time.time())}.json")
+            tracer.export_chrome_trace(path)
+            assert self.state is not None
+            self.state.trace_file = path
+
+        @self.server.trigger("start_profile")
+        def start_profiler(duration=None):
+            # 采样在后台线程结束，结果切回事件循环再写 state
+            loop = asyncio.get_event_loop()
+
+            def on_done(result):
+                loop.call_soon_threadsafe(self.on_profile_done, result)
+
+            result = start_profile("trame", duration, on_done)
+            if result["started"]:
+                assert self.state is not None
+                self.state.profile_status = "running"
+
+        # 快照要遍历渲染器 / mapper / 体数据，须与渲染在同一线程上进行
+        @self.server.trigger("leak_mark")
+        async def leak_mark():
+            await self.render_executor.run(self.leak_tracker.mark)
+
+        @self.server.trigger("leak_report")
+        async def leak_report():
+            report = await self.render_executor.run(self.leak_tracker.report)
+            assert self.state is not None
+            self.state.leak_report = report
+
+        @self.state.change("trace_sample_rate")
+        def set_trace_sample_rate(trace_sample_rate, **kwargs):
+            tracer.set_sample_rate(trace_sample_rate)
+
+        ctrl = self.server.controller
+        ctrl.on_client_connected.add(self.on_client_connected)
+        ctrl.on_client_exited.add(self.on_client_exited)
+        ctrl.on_server_ready.add(lambda *args, **kwargs: self.schedule_eviction())
+        ctrl.on_server_ready.add(
+            lambda *args, **kwargs: start_metrics_server(Config.METRICS_PORT, Config.METRICS_HOST)
+        )
+
+    def schedule_eviction(self):
+        asyncio.get_event_loop().call_later(self.eviction_interval, self.evict_idle_sessions)
+
+    def evict_idle_sessions(self):
+        try:
+            # 所有客户端共享同一个会话，仍有客户端连接时不回收；释放 GL 资源须在渲染线程上进行
+            if self.connected_clients == 0:
+                self.render_executor.post(self.sessions.evict_idle)
+        finally:
+            self.schedule_eviction()
+
+    def on_client_connected(self, *args, **kwargs):
+        self.connected_clients += 1
+        self.sessions.open(self.session_id)
+
+    def on_client_exited(self, *args, **kwargs):
+        self.connected_clients = max(0, self.connected_clients - 1)
+        # 最后一个客户端离开后开始计算空闲时间
+        session = self.sessions.get(self.session_id)
+        if session is not None and self.connected_clients == 0:
+            session.connected = False
+        self.sessions.touch(self.session_id)
+
+    def clear_playback(self):
+        if self.playback is not None:
+            self.sessions.detach(self.session_id, self.playback)
+            self.playback = None
+
+    def on_session_evicted(self, session_id):
+        # visualizer 与回放已由 SessionManager 释放，客户端下次设置 dicom_dir 时重建
+        self.visualizer = None
+        self.playback = None
+        self.render_executor.call_in_loop(self.reset_render_state)
+
+    def reset_render_state(self):
+        assert self.state is not None
+        with self.state as state:
+            state.render_status = "idle"
+            state.dicom_dir = ""
+
+    def on_profile_done(self, result):
+        assert self.state is not None
+        with self.state as state:
+            state.profile_status = "idle"
+            state.profile_file = result["path"]
+
     def start(self, port=8080, host="0.0.0.0"):
         if self.server is None:
             raise Exception("Failed to get trame server instance")
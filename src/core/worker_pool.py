@@ -0,0 +1,338 @@
+"""
+多进程渲染 worker 池与会话路由
+
+单个 Python 进程受 GIL 与单一离屏 GL 上下文限制，这里由前置路由进程
+接收客户端 websocket 连接，按会话粘滞 / 最少负载 / 同检查亲和的策略
+转发到 N 个运行 `_WebVR` 协议的 worker 进程。
+
+客户端连接示例: ws://host:port/ws?sessionId=<会话ID>&study=<检查目录>
+
+路由只在建立连接时决定一次，之后原样转发消息、不解析 RPC：同检查亲和只对在 URL 中
+带上 study 参数的客户端生效。之后才通过 app.action.start_render 选择检查的客户端
+按会话粘滞 / 最少负载路由，同一检查可能在多个 worker 上各加载一份。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# src 目录，worker 以 `python -m core.server` 方式在此目录下启动
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class WorkerInfo:
+    """单个渲染 worker 的运行信息"""
+
+    index: int
+    port: int
+    process: Optional[subprocess.Popen] = None
+    connections: int = 0
+    studies: set = field(default_factory=set)
+    # 每次（重新）启动进程时递增；重启前建立的连接在断开时不再减少新进程的连接数
+    generation: int = 0
+    # 进程启动后端口可连接前为 False，此时不接收新连接
+    ready: bool = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def placeable(self) -> bool:
+        """可分配新连接：进程在运行且端口已就绪（未由本池启动进程时不做检查）"""
+        return self.process is None or (self.alive and self.ready)
+
+    def connect(self) -> int:
+        """记录一个转发连接，返回当前进程代数，断开时传给 disconnect"""
+        self.connections += 1
+        return self.generation
+
+    def disconnect(self, generation: int) -> None:
+        if generation == self.generation:
+            self.connections -= 1
+
+
+class SessionRouter:
+    """
+    会话路由策略（纯逻辑，不涉及网络）
+
+    - 同一会话始终落在同一 worker（粘滞）
+    - 新会话优先放到已加载同一检查的 worker，除非其负载明显高于最空闲的 worker
+    - 其余情况选择连接数最少的 worker
+    - 重启后端口尚未就绪的 worker 不接收新连接，原有粘滞会话改路由到其他 worker
+    """
+
+    def __init__(self, workers: List[WorkerInfo], affinity_slack: int = 2,
+                 sticky_ttl: float = 600.0):
+        if not workers:
+            raise ValueError("至少需要一个渲染 worker")
+        self.workers = workers
+        self.affinity_slack = affinity_slack
+        self.sticky_ttl = sticky_ttl
+        # session_id -> (worker index, 最近活跃时间)
+        self._sessions: Dict[str, List] = {}
+        # study -> worker index
+        self._studies: Dict[str, int] = {}
+
+    def _least_loaded(self) -> WorkerInfo:
+        candidates = (
+            [w for w in self.workers if w.placeable]
+            or [w for w in self.workers if w.alive]
+            or self.workers
+        )
+        return min(candidates, key=lambda w: (w.connections, w.index))
+
+    def route(self, session_id: Optional[str] = None,
+              study: Optional[str] = None) -> WorkerInfo:
+        """为一次连接选择 worker，并记录粘滞关系"""
+        self._prune()
+        now = time.monotonic()
+
+        if session_id and session_id in self._sessions:
+            entry = self._sessions[session_id]
+            worker = self.workers[entry[0]]
+            if worker.placeable:
+                entry[1] = now
+                return worker
+
+        worker = self._least_loaded()
+        if study and study in self._studies:
+            affine = self.workers[self._studies[study]]
+            if affine.placeable:
+                if affine.connections - worker.connections <= self.affinity_slack:
+                    worker = affine
+
+        if study:
+            self._studies[study] = worker.index
+            worker.studies.add(study)
+        if session_id:
+            self._sessions[session_id] = [worker.index, now]
+        return worker
+
+    def touch(self, session_id: Optional[str]) -> None:
+        if session_id and session_id in self._sessions:
+            self._sessions[session_id][1] = time.monotonic()
+
+    def forget_worker(self, index: int) -> None:
+        """worker 重启后其上的检查缓存已失效，清除亲和记录"""
+        self.workers[index].studies.clear()
+        self._studies = {s: i for s, i in self._studies.items() if i != index}
+
+    def _prune(self) -> None:
+        deadline = time.monotonic() - self.sticky_ttl
+        expired = [
+            sid for sid, (idx, last) in self._sessions.items()
+            if last < deadline and self.workers[idx].connections == 0
+        ]
+        for sid in expired:
+            del self._sessions[sid]
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "workers": [
+                {
+                    "index": w.index,
+                    "port": w.port,
+                    "alive": w.alive,
+                    "ready": w.ready,
+                    "connections": w.connections,
+                    "studies": sorted(w.studies),
+                }
+                for w in self.workers
+            ],
+            "sessions": len(self._sessions),
+        }
+
+
+def _wait_for_port(host: str, port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class RenderWorkerPool:
+    """启动并看护 N 个 `_WebVR` worker 子进程，进程异常退出时按原端口重启"""
+
+    def __init__(self, num_workers: int, base_port: int, auth_key: str,
+                 host: str = "127.0.0.1", extra_args: Optional[List[str]] = None,
+                 metrics_base_port: int = 0):
+        self.host = host
+        self.auth_key = auth_key
+        self.extra_args = extra_args or []
+        # 各 worker 的 /metrics 端口为 metrics_base_port + index，0 表示不启动
+        self.metrics_base_port = metrics_base_port
+        self.workers = [
+            WorkerInfo(index=i, port=base_port + i) for i in range(num_workers)
+        ]
+
+    def _spawn(self, worker: WorkerInfo) -> None:
+        cmd = [
+            sys.executable, "-m", "core.server",
+            "--host", self.host,
+            "--port", str(worker.port),
+            "--authKey", self.auth_key,
+            # worker 由路由进程管理生命周期，不做空闲自动退出
+            "--timeout", "0",
+            "--workers", "1",
+            "--metrics-port",
+            str(self.metrics_base_port + worker.index if self.metrics_base_port else 0),
+            *self.extra_args,
+        ]
+        worker.ready = False
+        worker.process = subprocess.Popen(cmd, cwd=SRC_DIR)
+        logger.info("render worker %d 启动, pid=%d, port=%d",
+                    worker.index, worker.process.pid, worker.port)
+
+    def start(self, ready_timeout: float = 30.0) -> None:
+        for worker in self.workers:
+            self._spawn(worker)
+        for worker in self.workers:
+            worker.ready = _wait_for_port(self.host, worker.port, ready_timeout)
+            if not worker.ready:
+                logger.warning("render worker %d 未在 %.0fs 内就绪", worker.index, ready_timeout)
+
+    async def wait_ready(self, worker: WorkerInfo, timeout: float = 30.0) -> bool:
+        """在线程池中等待 worker 端口可连接（不阻塞事件循环），成功后标记为可分配"""
+        generation = worker.generation
+        loop = asyncio.get_event_loop()
+        ready = await loop.run_in_executor(None, _wait_for_port, self.host, worker.port, timeout)
+        # 等待期间进程再次重启时由新一轮检查负责
+        if ready and generation == worker.generation and worker.alive:
+            worker.ready = True
+            logger.info("render worker %d 已就绪", worker.index)
+        return worker.ready
+
+    def respawn_dead(self) -> List[int]:
+        """重启已退出的 worker，返回被重启的 worker 序号"""
+        restarted = []
+        for worker in self.workers:
+            if worker.process is not None and not worker.alive:
+                logger.warning("render worker %d 已退出 (code=%s)，重新启动",
+                               worker.index, worker.process.returncode)
+                worker.connections = 0
+                worker.generation += 1
+                self._spawn(worker)
+                restarted.append(worker.index)
+        return restarted
+
+    def stop(self) -> None:
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+
+
+class RouterServer:
+    """前置路由：接收客户端 websocket，并与选中的 worker 建立一一对应的转发通道"""
+
+    def __init__(self, pool: RenderWorkerPool, ws_endpoint: str = "ws",
+                 affinity_slack: int = 2, monitor_interval: float = 2.0):
+        self.pool = pool
+        self.ws_endpoint = ws_endpoint.strip("/")
+        self.router = SessionRouter(pool.workers, affinity_slack=affinity_slack)
+        self.monitor_interval = monitor_interval
+        # 正在等待端口就绪的 worker 序号
+        self._readying: set = set()
+
+    async def _pipe(self, source, target) -> None:
+        async for msg in source:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                await target.send_bytes(msg.data)
+            elif msg.type == aiohttp.WSMsgType.TEXT:
+                await target.send_str(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.ERROR):
+                break
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        session_id = request.query.get("sessionId")
+        study = request.query.get("study")
+        worker = self.router.route(session_id, study)
+
+        client_ws = web.WebSocketResponse(max_msg_size=0)
+        await client_ws.prepare(request)
+
+        generation = worker.connect()
+        url = f"ws://{self.pool.host}:{worker.port}/{self.ws_endpoint}"
+        try:
+            async with aiohttp.ClientSession() as http:
+                async with http.ws_connect(url, max_msg_size=0) as worker_ws:
+                    tasks = [
+                        asyncio.ensure_future(self._pipe(client_ws, worker_ws)),
+                        asyncio.ensure_future(self._pipe(worker_ws, client_ws)),
+                    ]
+                    _, pending = await asyncio.wait(
+                        tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in pending:
+                        task.cancel()
+        except aiohttp.ClientError as e:
+            logger.error("连接 render worker %d 失败: %s", worker.index, e)
+        finally:
+            worker.disconnect(generation)
+            self.router.touch(session_id)
+            await client_ws.close()
+        return client_ws
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(self.router.snapshot())
+
+    async def _monitor(self, app: web.Application) -> None:
+        while True:
+            await asyncio.sleep(self.monitor_interval)
+            for index in self.pool.respawn_dead():
+                self.router.forget_worker(index)
+            # 重启或启动超时的 worker 在端口可连接后才接收新连接
+            for worker in self.pool.workers:
+                if worker.alive and not worker.ready and worker.index not in self._readying:
+                    self._readying.add(worker.index)
+                    task = asyncio.ensure_future(self.pool.wait_ready(worker))
+                    task.add_done_callback(lambda _, i=worker.index: self._readying.discard(i))
+
+    async def _on_startup(self, app: web.Application) -> None:
+        app["monitor"] = asyncio.ensure_future(self._monitor(app))
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        app["monitor"].cancel()
+        self.pool.stop()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(f"/{self.ws_endpoint}", self.handle_ws)
+        app.router.add_get("/status", self.handle_status)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def start_worker_pool(options, num_workers: int, base_port: int) -> None:
+    """启动 worker 池并在 options.host:options.port 上运行前置路由（阻塞）"""
+    pool = RenderWorkerPool(
+        num_workers, base_port, options.authKey,
+        metrics_base_port=getattr(options, "metrics_port", 0),
+    )
+    pool.start()
+    router = RouterServer(pool, ws_endpoint=options.ws)
+    print(f"路由已启动: {num_workers} 个 render worker, 端口 {base_port}-{base_port + num_workers - 1}")
+    web.run_app(router.make_app(), host=options.host, port=options.port)
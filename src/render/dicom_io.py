@@ -0,0 +1,101 @@
+"""
+DICOM 序列读取
+
+只依赖 VTK 的 IO 模块与进程内体数据缓存，不引入 trame 与界面组件，
+wslink 渲染服务与 trame 应用共用；pydicom 与 vtkIOImage 在首次使用时才导入。
+"""
+
+import os
+
+from config import Config
+from core.metrics import VOLUME_LOAD_SECONDS
+from core.tracing import tracer
+from render.volume_cache import volume_cache
+from render.prefetch import SeriesPrefetcher
+from render.resample import resample_volume, resolve_spacing, spacing_key
+
+_series_prefetcher = None
+
+# 缓存 DICOM 数据
+def read_dicom_series(dicom_dir):
+    """读取并缓存 DICOM 序列"""
+    return volume_cache.get_or_load(os.path.abspath(dicom_dir), load_dicom_series)
+
+def read_volume(dicom_dir, spacing=None):
+    """
+    读取 DICOM 序列，可选重采样
+
+    重采样结果与原体数据放在同一个缓存中，按 (序列, 间距) 由所有会话共享。
+
+    Args:
+        dicom_dir: 序列目录
+        spacing: 目标间距，取值见 render.resample.resolve_spacing；None 为不重采样
+
+    Returns:
+        (体数据标识, vtkImageData)，标识用于统计 / ROI / 传输负载等按体数据缓存的结果
+    """
+    key = os.path.abspath(dicom_dir)
+    source = volume_cache.get_or_load(key, load_dicom_series)
+    target = resolve_spacing(spacing, source.GetSpacing())
+    if target is None:
+        return key, source
+    resampled_key = spacing_key(key, target)
+    return resampled_key, volume_cache.get_or_load(
+        resampled_key, lambda _: resample_volume(source, target)
+    )
+
+def get_series_prefetcher():
+    """进程内共享的同检查序列预取器，未启用时返回 None"""
+    global _series_prefetcher
+    if _series_prefetcher is None and Config.PREFETCH_ENABLED:
+        _series_prefetcher = SeriesPrefetcher(
+            volume_cache,
+            load_dicom_series,
+            workers=Config.PREFETCH_WORKERS,
+            max_series=Config.PREFETCH_MAX_SERIES,
+        )
+    return _series_prefetcher
+
+def load_dicom_series(dicom_dir):
+    """从磁盘读取 DICOM 序列（不经过缓存）"""
+    from vtkmodules.vtkIOImage import vtkDICOMImageReader
+
+    if not os.path.exists(dicom_dir):
+        raise FileNotFoundError(f"DICOM 目录 {dicom_dir} 不存在")
+    files = [f for f in os.listdir(dicom_dir) if f.endswith(".dcm")]
+    if not files:
+        raise ValueError(f"DICOM 目录 {dicom_dir} 不包含 .dcm 文件")
+
+    with VOLUME_LOAD_SECONDS.time():
+        reader = vtkDICOMImageReader()
+        reader.SetDirectoryName(dicom_dir)
+        with tracer.span("vtk.Update", "io"):
+            reader.Update()
+    image_data = reader.GetOutput()
+
+    if image_data.GetNumberOfPoints() == 0:
+        raise ValueError("DICOM 数据为空，请检查文件格式或路径")
+
+    dims = image_data.GetDimensions()
+    print(f"DICOM 数据维度: {dims}")
+    return image_data
+
+# 解析 DICOM 元数据
+def parse_dicom_metadata(dicom_dir):
+    """解析 DICOM 文件的元数据"""
+    import pydicom
+
+    metadata = []
+    for file_name in os.listdir(dicom_dir):
+        if file_name.endswith(".dcm"):
+            file_path = os.path.join(dicom_dir, file_name)
+            ds = pydicom.dcmread(file_path)
+            metadata.append({
+                "PatientID": ds.get("PatientID", "N/A"),
+                "PixelSpacing": ds.get("PixelSpacing", "N/A"),
+                "SliceThickness": ds.get("SliceThickness", "N/A"),
+                "Rows": ds.Rows,
+                "Columns": ds.Columns
+            })
+    print(f"解析到 {len(metadata)} 个 DICOM 文件的元数据")
+    return metadata
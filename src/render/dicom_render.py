@@ -1,90 +1,130 @@
-import vtk
-import pydicom
-import os
-import numpy as np
-from functools import lru_cache
-from trame.widgets import vuetify3 as vuetify, vtk as vtk_widgets
-from trame.ui.vuetify3 import SinglePageLayout
-from trame_server import Server
-
-# 缓存 DICOM 数据
-@lru_cache(maxsize=1)
-def read_dicom_series(dicom_dir):
-    """读取并缓存 DICOM 序列"""
-    if not os.path.exists(dicom_dir):
-        raise FileNotFoundError(f"DICOM 目录 {dicom_dir} 不存在")
-    files = [f for f in os.listdir(dicom_dir) if f.endswith(".dcm")]
-    if not files:
-        raise ValueError(f"DICOM 目录 {dicom_dir} 不包含 .dcm 文件")
-    
-    reader = vtk.vtkDICOMImageReader()
-    reader.SetDirectoryName(dicom_dir)
-    reader.Update()
-    image_data = reader.GetOutput()
-    
-    if image_data.GetNumberOfPoints() == 0:
-        raise ValueError("DICOM 数据为空，请检查文件格式或路径")
-    
-    dims = image_data.GetDimensions()
-    print(f"DICOM 数据维度: {dims}")
-    return image_data
-
-# 解析 DICOM 元数据
-def parse_dicom_metadata(dicom_dir):
-    """解析 DICOM 文件的元数据"""
-    metadata = []
-    for file_name in os.listdir(dicom_dir):
-        if file_name.endswith(".dcm"):
-            file_path = os.path.join(dicom_dir, file_name)
-            ds = pydicom.dcmread(file_path)
-            metadata.append({
-                "PatientID": ds.get("PatientID", "N/A"),
-                "PixelSpacing": ds.get("PixelSpacing", "N/A"),
-                "SliceThickness": ds.get("SliceThickness", "N/A"),
-                "Rows": ds.Rows,
-                "Columns": ds.Columns
-            })
-    print(f"解析到 {len(metadata)} 个 DICOM 文件的元数据")
-    return metadata
+from typing import TYPE_CHECKING
+
+from vtkmodules.vtkCommonDataModel import vtkPiecewiseFunction
+from vtkmodules.vtkIOImage import vtkDICOMImageReader
+from vtkmodules.vtkInteractionStyle import vtkInteractorStyleTrackballCamera
+from vtkmodules.vtkRenderingCore import (
+    vtkActor,
+    vtkColorTransferFunction,
+    vtkLight,
+    vtkPolyDataMapper,
+    vtkRenderer,
+    vtkRenderWindow,
+    vtkRenderWindowInteractor,
+    vtkVolume,
+    vtkVolumeProperty,
+)
+from vtkmodules.vtkRenderingVolume import vtkGPUVolumeRayCastMapper
+import vtkmodules.vtkRenderingOpenGL2  # noqa: F401  渲染窗口的 OpenGL 实现
+import vtkmodules.vtkRenderingVolumeOpenGL2  # noqa: F401  GPU 体渲染 mapper 的 OpenGL 实现
+from core.metrics import RENDER_SECONDS
+from core.render_thread import get_render_executor
+from core.tracing import tracer
+from render.dicom_io import (  # noqa: F401  保持原有导入路径
+    get_series_prefetcher,
+    load_dicom_series,
+    parse_dicom_metadata,
+    read_dicom_series,
+    read_volume,
+)
+from config import Config
+from render.volume_transfer import make_local_image_data
+from render.volume_stats import get_volume_statistics
+from render.roi_stats import get_roi_statistics
+from render.segmentation import SegmentationLayer, get_segmentation
+from render.isosurface import get_isosurface_payload, payload_to_polydata, resolve_iso_value
+
+if TYPE_CHECKING:
+    from trame_server import Server
 
 class VTKVolumeVisualizer:
-    def __init__(self, server, data_source):
+    """
+    长生命周期的体渲染可视化器
+
+    渲染器、渲染窗口、交互器、光源、mapper 与 UI 只创建一次，
+    切换检查时通过 set_data_source 只替换 mapper 输入并重算传输函数范围。
+
+    除 bind_ui 外的方法都应在渲染线程（core.render_thread）上调用，
+    state 写入与视图推送经 call_in_loop 切回事件循环。
+    """
+
+    def __init__(self, server, data_source=None):
         if server is None:
             raise ValueError("Server 对象为 None")
         self.server = server
-        self.data_source = data_source
-        self.renderer = vtk.vtkRenderer()
-        self.render_window = vtk.vtkRenderWindow()
+        self.data_source = None
+        # 体数据标识（含重采样间距），统计 / ROI 结果按它缓存；直接传入 vtkImageData 时为 None
+        self.volume_key = None
+        # 重采样间距，取值见 render.resample.resolve_spacing
+        self.resample_spacing = Config.RESAMPLE_SPACING or None
+        self.image_data = None
+        self.statistics = None
+        # 当前分割结果图层（切换数据时清除）
+        self.segmentation = None
+        # 本地视图中的等值面 actor（显示时隐藏本地体渲染）
+        self.iso_actor = None
+        self.vtk_view = None
+        # 渲染模式: remote 服务端渲染推流 / local 浏览器本地渲染
+        self.render_mode = "remote"
+        self.local_view = None
+        self.local_render_window = None
+        self.renderer = vtkRenderer()
+        self.render_window = vtkRenderWindow()
         self.render_window.AddRenderer(self.renderer)
         
-        self.interactor = vtk.vtkRenderWindowInteractor()
+        self.interactor = vtkRenderWindowInteractor()
         self.interactor.SetRenderWindow(self.render_window)
         self.interactor.Initialize()
         self.render_window.SetOffScreenRendering(1)
+        get_render_executor().own_window(self.render_window)
         
         # 启用交互样式
-        self.interactor_style = vtk.vtkInteractorStyleTrackballCamera()
+        self.interactor_style = vtkInteractorStyleTrackballCamera()
         self.interactor.SetInteractorStyle(self.interactor_style)
         
         self.renderer.SetBackground(0.0, 0.0, 0.1)  # 更暗背景，提升对比度
-        self.image_data = read_dicom_series(self.data_source) if isinstance(self.data_source, str) else self.data_source
         self.setup_pipeline()
+        if data_source is not None:
+            self.set_data_source(data_source)
 
     def setup_pipeline(self):
-        # 配置体渲染管道
-        volume_mapper = vtk.vtkGPUVolumeRayCastMapper()
-        volume_mapper.SetInputData(self.image_data)
+        # 配置体渲染管道（不含数据，数据由 set_data_source 设置）
+        self.volume_mapper = vtkGPUVolumeRayCastMapper()
 
-        volume_property = vtk.vtkVolumeProperty()
+        volume_property = vtkVolumeProperty()
         volume_property.ShadeOn()
         volume_property.SetInterpolationTypeToLinear()
+        self.color_func = vtkColorTransferFunction()
+        self.opacity_func = vtkPiecewiseFunction()
+        volume_property.SetColor(self.color_func)
+        volume_property.SetScalarOpacity(self.opacity_func)
 
-        # 获取数据范围
-        scalar_range = self.image_data.GetScalarRange()
-        print(f"数据标量范围: {scalar_range}")
+        # 创建体对象
+        self.volume = vtkVolume()
+        self.volume.SetMapper(self.volume_mapper)
+        self.volume.SetProperty(volume_property)
+
+        # 优化光源
+        light = vtkLight()
+        light.SetPosition(1, 1, 1)  # 更自然的光源位置
+        light.SetIntensity(1.5)     # 增加光强
+        self.renderer.AddLight(light)
 
+        # 设置渲染窗口
+        self.render_window.SetSize(1024, 1024)
+        print(f"体渲染管道初始化完成，窗口尺寸: 1024x1024")
+
+        # 初始化状态
+        get_render_executor().call_in_loop(self.server.state.update, {
+            "slice_max": 0  # 禁用滑动条，体渲染无需切片
+        })
+        print("状态初始化: 体渲染模式")
+
+    def update_transfer_functions(self, scalar_range):
+        """按数据标量范围重建传输函数（复用同一组 VTK 对象）"""
         # 优化转移函数（增强粉红和自然肤色）
-        color_func = vtk.vtkColorTransferFunction()
+        color_func = self.color_func
+        color_func.RemoveAllPoints()
         color_func.AddRGBPoint(scalar_range[0], 0.0, 0.0, 0.0)     # 最低值（黑色）
         color_func.AddRGBPoint(-500, 0.1, 0.1, 0.1)               # 空气/肺部（极暗灰）
         color_func.AddRGBPoint(0, 0.9, 0.8, 0.8)                  # 软组织（浅粉）
@@ -92,9 +132,9 @@ class VTKVolumeVisualizer:
         color_func.AddRGBPoint(300, 1.0, 0.7, 0.7)                # 肌肉（深粉）
         color_func.AddRGBPoint(1000, 1.0, 1.0, 1.0)               # 骨骼（白色）
         color_func.AddRGBPoint(scalar_range[1], 0.9, 0.6, 0.6)    # 最高值（淡粉）
-        volume_property.SetColor(color_func)
 
-        opacity_func = vtk.vtkPiecewiseFunction()
+        opacity_func = self.opacity_func
+        opacity_func.RemoveAllPoints()
         opacity_func.AddPoint(scalar_range[0], 0.0)               # 最低值透明
         opacity_func.AddPoint(-500, 0.15)                        # 空气适中不透明
         opacity_func.AddPoint(0, 0.6)                            # 软组织高不透明
@@ -102,47 +142,228 @@ class VTKVolumeVisualizer:
         opacity_func.AddPoint(300, 0.8)                          # 肌肉高不透明
         opacity_func.AddPoint(1000, 0.9)                         # 骨骼高不透明
         opacity_func.AddPoint(scalar_range[1], 0.8)           # 最高值高不透明
-        volume_property.SetScalarOpacity(opacity_func)
 
-        # 创建体对象
-        volume = vtk.vtkVolume()
-        volume.SetMapper(volume_mapper)
-        volume.SetProperty(volume_property)
+    def set_data_source(self, data_source):
+        """切换数据：只替换 mapper 输入并重算传输函数范围，不重建 GL 上下文与 UI"""
+        with tracer.span("io.read_dicom_series", "io"):
+            if isinstance(data_source, str):
+                key, image_data = read_volume(data_source, self.resample_spacing)
+            else:
+                key, image_data = None, data_source
+        self.clear_segmentation()
+        self.clear_isosurface()
+        self.data_source = data_source
+        self.volume_key = key
+        self.image_data = image_data
+        self.volume_mapper.SetInputData(image_data)
 
-        # 优化光源
-        light = vtk.vtkLight()
-        light.SetPosition(1, 1, 1)  # 更自然的光源位置
-        light.SetIntensity(1.5)     # 增加光强
-        self.renderer.AddLight(light)
+        # 获取数据范围（统计结果随体数据缓存，切回同一序列时不再扫描体素）
+        with tracer.span("stats.volume", "stats"):
+            self.statistics = get_volume_statistics(key, image_data)
+        scalar_range = self.statistics.scalar_range
+        print(f"数据标量范围: {scalar_range}")
+        self.update_transfer_functions(scalar_range)
+        get_render_executor().call_in_loop(
+            self.server.state.update, {"volume_stats": self.statistics.to_dict()}
+        )
 
-        # 添加到渲染器
-        self.renderer.AddVolume(volume)
+        if not self.renderer.GetVolumes().IsItemPresent(self.volume):
+            self.renderer.AddVolume(self.volume)
         self.renderer.ResetCamera()
+        if self.local_render_window is not None:
+            self.update_local_data()
+        self.refresh()
 
-        # 设置渲染窗口
-        self.render_window.SetSize(1024, 1024)
-        self.render_window.Render()
-        print(f"体渲染初始化完成，窗口尺寸: 1024x1024")
+    def setup_local_pipeline(self):
+        """
+        本地渲染管道：降采样后的体数据 + 与服务端共用的 vtkVolumeProperty
 
-        # 初始化状态
-        self.server.state.update({
-            "slice_max": 0  # 禁用滑动条，体渲染无需切片
-        })
-        print("状态初始化: 体渲染模式")
+        该渲染窗口只用于场景序列化下发给浏览器，服务端从不对其调用 Render()，
+        因此不占用 GL 资源；传输函数对象共享，调整后只需下发传输函数本身。
+        """
+        self.local_renderer = vtkRenderer()
+        self.local_renderer.SetBackground(0.0, 0.0, 0.1)
+        self.local_render_window = vtkRenderWindow()
+        self.local_render_window.SetOffScreenRendering(1)
+        self.local_render_window.AddRenderer(self.local_renderer)
+        self.local_mapper = vtkGPUVolumeRayCastMapper()
+        self.local_volume = vtkVolume()
+        self.local_volume.SetMapper(self.local_mapper)
+        self.local_volume.SetProperty(self.volume.GetProperty())
+        self.local_renderer.AddVolume(self.local_volume)
+        if self.image_data is not None:
+            self.update_local_data()
+
+    def update_local_data(self):
+        """数据变化时重建降采样体数据（仅此时才会向浏览器重新传输体素）"""
+        with tracer.span("local.prepare_volume", "encode"):
+            self.local_mapper.SetInputData(make_local_image_data(self.image_data))
+        self.local_renderer.ResetCamera()
+
+    def set_render_mode(self, mode):
+        """切换 remote / local 渲染模式"""
+        if mode not in ("remote", "local"):
+            raise ValueError(f"未知渲染模式: {mode}")
+        self.render_mode = mode
+        self.refresh()
+
+    def refresh(self):
+        """按当前模式推送画面：remote 服务端渲染一帧，local 只同步变化的场景对象"""
+        executor = get_render_executor()
+        if self.render_mode == "local":
+            if self.local_view:
+                executor.call_in_loop(self.local_view.update)
+            return
+        with tracer.span("vtk.Render", "render"), RENDER_SECONDS.time(app="trame"):
+            self.render_window.Render()
+        if self.vtk_view:
+            executor.call_in_loop(self.vtk_view.update)
+
+    def show_phase(self, volume_key, image_data):
+        """4D 回放换帧：只替换 mapper 输入，传输函数与相机保持不变"""
+        self.volume_mapper.SetInputData(image_data)
+        self.volume_key = volume_key
+        self.image_data = image_data
+        if self.render_mode == "local" and self.local_render_window is not None:
+            self.update_local_data()
+        self.refresh()
+
+    def set_resample_spacing(self, spacing):
+        """切换重采样间距并重新加载当前序列（结果由缓存共享）"""
+        self.resample_spacing = spacing or None
+        if isinstance(self.data_source, str):
+            self.set_data_source(self.data_source)
+
+    def displayed_volume(self):
+        """
+        当前显示的 (volume_key, image_data)，没有数据时返回 None
+
+        统计、分割与等值面提取只读取这里取得的引用，可在分析线程池（core.render_thread.run_compute）中进行，
+        渲染线程只负责挂载结果（show_segmentation / show_isosurface）。
+        """
+        if self.image_data is None:
+            return None
+        return self.volume_key, self.image_data
+
+    @staticmethod
+    def measure_roi(volume, roi):
+        """displayed_volume 取得的体数据上的 ROI 统计（见 render.roi_stats）"""
+        with tracer.span("stats.roi", "stats"):
+            return get_roi_statistics(*volume, roi)
+
+    @staticmethod
+    def compute_segmentation(volume, params):
+        """阈值 + 连通域分割，参数见 render.segmentation.get_segmentation"""
+        with tracer.span("segment.volume", "segment"):
+            return get_segmentation(*volume, params)
+
+    @staticmethod
+    def compute_isosurface(volume, params):
+        """等值面负载（见 render.isosurface），params 为 {"iso"} 或 {"preset"}，可选 decimation"""
+        iso = resolve_iso_value(params.get("iso"), params.get("preset"))
+        with tracer.span("isosurface.volume", "isosurface"):
+            return get_isosurface_payload(*volume, iso, float(params.get("decimation", 0.0)))
+
+    def show_segmentation(self, volume, result, params):
+        """
+        显示分割结果，另可在 params 中指定 mode（overlay / mask）、color、opacity
+
+        Returns:
+            是否已显示；计算期间体数据已切换时返回 False
+        """
+        if self.image_data is None or self.image_data is not volume[1]:
+            return False
+        self.clear_segmentation()
+        self.segmentation = SegmentationLayer(
+            result, self.renderer, self.volume,
+            mode=params.get("mode", "overlay"),
+            color=params.get("color", (1.0, 0.3, 0.2)),
+            opacity=float(params.get("opacity", 0.5)),
+        )
+        self.refresh()
+        return True
+
+    def show_isosurface(self, volume, payload):
+        """
+        在本地视图中显示等值面：网格只下发一次，之后旋转在浏览器完成
+
+        Returns:
+            是否已显示；计算期间体数据已切换时返回 False
+        """
+        if self.image_data is None or self.image_data is not volume[1]:
+            return False
+        self.clear_isosurface()
+        if self.local_render_window is None:
+            self.setup_local_pipeline()
+        mapper = vtkPolyDataMapper()
+        mapper.SetInputData(payload_to_polydata(payload))
+        mapper.ScalarVisibilityOff()
+        self.iso_actor = vtkActor()
+        self.iso_actor.SetMapper(mapper)
+        self.iso_actor.GetProperty().SetColor(0.9, 0.85, 0.75)
+        self.local_renderer.AddActor(self.iso_actor)
+        self.local_volume.VisibilityOff()
+        self.set_render_mode("local")
+        return True
+
+    def clear_isosurface(self):
+        if self.iso_actor is None:
+            return
+        self.local_renderer.RemoveActor(self.iso_actor)
+        self.iso_actor.GetMapper().RemoveAllInputConnections(0)
+        self.iso_actor = None
+        self.local_volume.VisibilityOn()
+
+    def clear_segmentation(self):
+        if self.segmentation is not None:
+            self.segmentation.release()
+            self.segmentation = None
+
+    def memory_bytes(self):
+        """当前持有的体数据内存（字节），含分割掩膜"""
+        if self.image_data is None:
+            return 0
+        segmentation_bytes = self.segmentation.memory_bytes() if self.segmentation is not None else 0
+        return self.image_data.GetActualMemorySize() * 1024 + segmentation_bytes
+
+    def release(self):
+        """释放 volume 的 GL 资源、体数据引用以及离屏渲染窗口"""
+        self.clear_segmentation()
+        self.clear_isosurface()
+        if self.volume is not None:
+            self.renderer.RemoveVolume(self.volume)
+            self.volume_mapper.ReleaseGraphicsResources(self.render_window)
+            self.volume_mapper.RemoveAllInputs()
+            self.volume = None
+            self.volume_mapper = None
+        self.renderer.RemoveAllLights()
+        self.image_data = None
         self.vtk_view = None
+        self.local_view = None
+        if self.local_render_window is not None:
+            self.local_mapper.RemoveAllInputs()
+            self.local_render_window = None
+        self.render_window.Finalize()
 
     def reset_camera(self):
         self.renderer.ResetCamera()
+        executor = get_render_executor()
+        if self.local_view:
+            executor.call_in_loop(self.local_view.reset_camera)
         if self.vtk_view:
-            self.vtk_view.update()
-            print("相机已重置，强制更新")
             self.render_window.Render()
+            executor.call_in_loop(self.vtk_view.update)
+            print("相机已重置，强制更新")
 
     def update_slice(self, slice_idx):
         # 体渲染无需更新切片，保持空实现
         pass
 
     def bind_ui(self):
+        # 界面组件只在 trame 应用中用到，按需导入
+        from trame.ui.vuetify3 import SinglePageLayout
+        from trame.widgets import vuetify3 as vuetify, vtk as vtk_widgets
+
         with SinglePageLayout(self.server) as layout:
             layout.title.set_text("DICOM 体渲染查看器")
             with layout.toolbar:
@@ -159,18 +380,36 @@ class VTKVolumeVisualizer:
                     style="max-width: 300px;",
                     change="trigger('update_opacity', $event)",
                 )
+                vuetify.VBtnToggle(
+                    v_model=("render_mode", self.render_mode),
+                    mandatory=True,
+                    density="compact",
+                    children=[
+                        vuetify.VBtn("服务端渲染", value="remote"),
+                        vuetify.VBtn("本地渲染", value="local"),
+                    ],
+                )
             with layout.content:
                 with vuetify.VContainer(fluid=True, classes="pa-0 fill-height", style="width: 100vw; height: 100vh;"):
                     self.vtk_view = vtk_widgets.VtkRemoteView(
                         self.render_window,
                         interactive_ratio=1.0,
                         style="width: 100%; height: 100%;",
+                        v_if="render_mode == 'remote'",
                     )
                     self.vtk_view.update()
                     print("VtkRemoteView 初始化完成 (体渲染)")
+                    if self.local_render_window is None:
+                        self.setup_local_pipeline()
+                    self.local_view = vtk_widgets.VtkLocalView(
+                        self.local_render_window,
+                        style="width: 100%; height: 100%;",
+                        v_else=True,
+                    )
+                    print("VtkLocalView 初始化完成 (本地体渲染)")
 
 class DicomRenderer:
-    def __init__(self, server: Server):
+    def __init__(self, server: "Server"):
         self.server = server
         self.reader = None
         self.volume = None
@@ -178,32 +417,32 @@ class DicomRenderer:
 
     def setup_renderer(self):
         # 示例：读取 DICOM 文件并设置体渲染
-        self.reader = vtk.vtkDICOMImageReader()
+        self.reader = vtkDICOMImageReader()
         # 假设 DICOM 文件路径由前端传入，实际路径需动态设置
         # self.reader.SetDirectoryName("path/to/dicom/folder")
         self.reader.Update()
 
         # 创建体渲染管道
         # 智能创建渲染管道
-        volume_mapper = vtk.vtkGPUVolumeRayCastMapper()
-        # volume_mapper = vtk.vtkSmartVolumeMapper()
+        volume_mapper = vtkGPUVolumeRayCastMapper()
+        # volume_mapper = vtkSmartVolumeMapper()
         volume_mapper.SetInputConnection(self.reader.GetOutputPort())
 
-        self.volume = vtk.vtkVolume()
+        self.volume = vtkVolume()
         self.volume.SetMapper(volume_mapper)
 
         # 设置体渲染属性（透明度、颜色等）
-        volume_property = vtk.vtkVolumeProperty()
+        volume_property = vtkVolumeProperty()
         volume_property.ShadeOn()
         volume_property.SetInterpolationTypeToLinear()
 
         # 示例：简单灰度映射
-        opacity_transfer = vtk.vtkPiecewiseFunction()
+        opacity_transfer = vtkPiecewiseFunction()
         opacity_transfer.AddPoint(0, 0.0)
         opacity_transfer.AddPoint(255, 1.0)
         volume_property.SetScalarOpacity(opacity_transfer)
 
-        color_transfer = vtk.vtkColorTransferFunction()
+        color_transfer = vtkColorTransferFunction()
         color_transfer.AddRGBPoint(0, 0.0, 0.0, 0.0)
         color_transfer.AddRGBPoint(255, 1.0, 1.0, 1.0)
         volume_property.SetColor(color_transfer)
@@ -0,0 +1,219 @@
+"""
+等值面提取与几何下发
+
+骨骼 / 皮肤等值面用 vtkFlyingEdges3D（vtkSMPTools 多线程）从缓存体数据提取，
+可选 vtkQuadricClustering 减面（线性时间，比逐边收缩的 vtkQuadricDecimation 快一个数量级）后重新计算法向，再量化（坐标 uint16、法向 int8、
+索引 uint16 / uint32）并用 zlib 压缩成一次性下发的负载，按 (体数据, 等值, 减面比例) 缓存。
+
+客户端收到网格后在本地渲染，之后旋转不再占用服务端 CPU。
+"""
+
+import logging
+import threading
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from core.metrics import watch_cache
+from core.tracing import tracer
+from render.numpy_bridge import array_to_vtk, array_to_vtk_points, vtk_to_array
+from render.volume_cache import VolumeCache
+
+logger = logging.getLogger(__name__)
+
+# 常用等值（HU）
+ISO_PRESETS = {
+    "bone": 300.0,
+    "skin": -500.0,
+}
+
+_smp_lock = threading.Lock()
+_smp_ready = False
+
+
+def _enable_smp(threads: int = Config.ISOSURFACE_THREADS) -> None:
+    """切换到 STDThread 后端（VTK 默认为单线程 Sequential），只在首次提取时设置一次"""
+    global _smp_ready
+    with _smp_lock:
+        if _smp_ready:
+            return
+        from vtkmodules.vtkCommonCore import vtkSMPTools
+
+        if vtkSMPTools.SetBackend("STDThread"):
+            vtkSMPTools.Initialize(threads)
+        logger.info("vtkSMPTools 后端 %s，线程数 %d",
+                    vtkSMPTools.GetBackend(), vtkSMPTools.GetEstimatedNumberOfThreads())
+        _smp_ready = True
+
+
+def resolve_iso_value(iso: Optional[float] = None, preset: Optional[str] = None) -> float:
+    """等值：preset 取 ISO_PRESETS 中的名称（bone / skin），否则使用 iso"""
+    if preset is not None:
+        if preset not in ISO_PRESETS:
+            raise ValueError(f"未知的等值面预设: {preset}，可选 {list(ISO_PRESETS)}")
+        return ISO_PRESETS[preset]
+    if iso is None:
+        raise ValueError("需要提供 iso 或 preset")
+    return float(iso)
+
+
+def extract_isosurface(image_data, iso: float, decimation: float = 0.0):
+    """
+    提取等值面
+
+    Args:
+        image_data: vtkImageData
+        iso: 等值
+        decimation: 减面比例（0 ~ 1，0.9 表示约去掉 90% 的三角形；按聚类网格估算，为近似值）
+
+    Returns:
+        带点法向的三角形 vtkPolyData
+    """
+    from vtkmodules.vtkCommonDataModel import vtkPolyData
+    from vtkmodules.vtkFiltersCore import vtkFlyingEdges3D, vtkPolyDataNormals, vtkQuadricClustering
+
+    if not 0.0 <= decimation < 1.0:
+        raise ValueError("decimation 需在 [0, 1) 内")
+    _enable_smp()
+    contour = vtkFlyingEdges3D()
+    contour.SetInputData(image_data)
+    contour.SetValue(0, iso)
+    contour.ComputeScalarsOff()
+    # 不减面时直接使用梯度法向，减面后重新计算
+    contour.SetComputeNormals(decimation == 0.0)
+    with tracer.span("vtk.Update", "isosurface", step="contour"):
+        contour.Update()
+    surface = contour.GetOutput()
+
+    if decimation > 0.0 and surface.GetNumberOfPolys() > 0:
+        # 表面三角形数约与分辨率的平方成正比，聚类网格按 sqrt(保留比例) 缩小
+        keep = np.sqrt(1.0 - decimation)
+        decimate = vtkQuadricClustering()
+        decimate.SetInputData(surface)
+        decimate.AutoAdjustNumberOfDivisionsOff()
+        decimate.SetNumberOfDivisions(*[max(2, int(d * keep)) for d in image_data.GetDimensions()])
+        normals = vtkPolyDataNormals()
+        normals.SetInputConnection(decimate.GetOutputPort())
+        normals.SplittingOff()
+        normals.ConsistencyOff()
+        normals.ComputePointNormalsOn()
+        with tracer.span("vtk.Update", "isosurface", step="decimate"):
+            normals.Update()
+        surface = normals.GetOutput()
+
+    # 浅拷贝断开与管线的连接，缓存中不保留中间结果
+    output = vtkPolyData()
+    output.ShallowCopy(surface)
+    return output
+
+
+def encode_mesh_payload(polydata, level: int = 6) -> Dict[str, Any]:
+    """
+    把三角网格量化并压缩为一次性下发的负载
+
+    Args:
+        polydata: 三角形 vtkPolyData（带点法向时一并下发）
+        level: zlib 压缩级别
+
+    Returns:
+        负载字典：positions 为 uint16 量化坐标（原值 ≈ q * scale + offset，逐轴），
+        normals 为 int8 法向（× 127），indices 为三角形顶点下标，均经 zlib 压缩
+    """
+    points = polydata.GetPoints()
+    positions = vtk_to_array(points.GetData()) if points is not None else np.empty((0, 3), np.float32)
+    indices = vtk_to_array(polydata.GetPolys().GetConnectivityArray())
+    low = positions.min(axis=0) if len(positions) else np.zeros(3)
+    high = positions.max(axis=0) if len(positions) else np.zeros(3)
+    scale = np.where(high > low, (high - low) / 65535.0, 1.0)
+    quantized = np.rint((positions - low) / scale).astype(np.uint16)
+    index_dtype = np.uint16 if len(positions) <= 65536 else np.uint32
+
+    payload = {
+        "codec": "zlib",
+        "vertices": int(len(positions)),
+        "triangles": int(len(indices) // 3),
+        "bounds": [float(v) for pair in zip(low, high) for v in pair],
+        "scale": [float(s) for s in scale],
+        "offset": [float(o) for o in low],
+        "index_dtype": np.dtype(index_dtype).name,
+        "positions": zlib.compress(quantized.tobytes(), level),
+        "indices": zlib.compress(indices.astype(index_dtype).tobytes(), level),
+        "normals": None,
+    }
+    normals = polydata.GetPointData().GetNormals()
+    if normals is not None:
+        packed = np.clip(np.rint(vtk_to_array(normals) * 127), -127, 127).astype(np.int8)
+        payload["normals"] = zlib.compress(packed.tobytes(), level)
+    return payload
+
+
+def payload_nbytes(payload: Dict[str, Any]) -> int:
+    return sum(len(payload[k] or b"") for k in ("positions", "indices", "normals"))
+
+
+def payload_summary(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """负载中除二进制数据以外的字段，附带压缩后的字节数"""
+    summary = {k: v for k, v in payload.items() if k not in ("positions", "indices", "normals")}
+    summary["bytes"] = payload_nbytes(payload)
+    return summary
+
+
+def decode_mesh_payload(payload: Dict[str, Any]) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """解码负载，返回 (N×3 float32 坐标, N×3 float32 法向或 None, M×3 三角形下标)（客户端参考实现）"""
+    if payload["codec"] != "zlib":
+        raise ValueError(f"不支持的编码: {payload['codec']}")
+    quantized = np.frombuffer(zlib.decompress(payload["positions"]), dtype=np.uint16).reshape(-1, 3)
+    positions = (quantized * np.asarray(payload["scale"]) + np.asarray(payload["offset"])).astype(np.float32)
+    indices = np.frombuffer(zlib.decompress(payload["indices"]), dtype=payload["index_dtype"]).reshape(-1, 3)
+    normals = None
+    if payload["normals"] is not None:
+        packed = np.frombuffer(zlib.decompress(payload["normals"]), dtype=np.int8).reshape(-1, 3)
+        normals = packed.astype(np.float32) / 127.0
+    return positions, normals, indices
+
+
+def payload_to_polydata(payload: Dict[str, Any]):
+    """由负载重建 vtkPolyData（与客户端看到的量化结果一致），供 trame 本地视图下发"""
+    from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+
+    positions, normals, indices = decode_mesh_payload(payload)
+    polydata = vtkPolyData()
+    polydata.SetPoints(array_to_vtk_points(positions))
+    offsets = np.arange(0, indices.size + 1, 3, dtype=np.int64)
+    polys = vtkCellArray()
+    polys.SetData(array_to_vtk(offsets), array_to_vtk(indices.astype(np.int64).reshape(-1)))
+    polydata.SetPolys(polys)
+    if normals is not None:
+        polydata.GetPointData().SetNormals(array_to_vtk(normals, "Normals"))
+    return polydata
+
+
+# 网格负载缓存，按压缩后的字节数计
+mesh_cache = VolumeCache(Config.MESH_CACHE_MAX_BYTES, sizeof=lambda payload: payload_nbytes(payload) + 1024)
+watch_cache("mesh", mesh_cache)
+
+
+def get_isosurface_payload(key: Optional[str], image_data, iso: float,
+                           decimation: float = 0.0) -> Dict[str, Any]:
+    """
+    带缓存的等值面负载
+
+    Args:
+        key: 体数据标识；为 None 时不缓存
+        image_data: vtkImageData
+        iso: 等值
+        decimation: 减面比例
+    """
+    def compute(_=None):
+        surface = extract_isosurface(image_data, iso, decimation)
+        with tracer.span("isosurface.encode", "encode"):
+            payload = encode_mesh_payload(surface)
+        logger.info("等值面 iso=%g decimation=%g: %d 顶点 %d 三角形 %d bytes", iso, decimation,
+                    payload["vertices"], payload["triangles"], payload_nbytes(payload))
+        return payload
+
+    if key is None:
+        return compute()
+    return mesh_cache.get_or_load(f"{key}|iso={iso:g}|decimation={decimation:g}", compute)
@@ -0,0 +1,112 @@
+"""
+NumPy 与 VTK 之间的零拷贝桥接
+
+体数据、统计、重采样与点云都在 NumPy 中计算、在 VTK 中渲染，两侧共用同一块内存：
+
+- VTK → NumPy：返回的数组是 VTK 缓冲区上的视图，视图本身持有 VTK 数组的引用，
+  即使 vtkImageData 先被释放，视图仍然有效；
+- NumPy → VTK：VTK 数组直接指向 NumPy 内存，NumPy 数组的引用挂在 VTK 缓冲区上，
+  调用方不必自行保活。非 C 连续的数组默认报错而不是静默复制，避免大体积数据占用翻倍。
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+from vtkmodules.util import numpy_support
+from vtkmodules.vtkCommonCore import vtkPoints
+from vtkmodules.vtkCommonDataModel import vtkImageData
+
+
+def vtk_to_array(vtk_array) -> np.ndarray:
+    """VTK 数组转为 NumPy 视图（零拷贝），多分量数组形状为 (N, 分量数)"""
+    if vtk_array is None:
+        raise ValueError("VTK 数组为空")
+    return numpy_support.vtk_to_numpy(vtk_array)
+
+
+def array_to_vtk(array: np.ndarray, name: Optional[str] = None, copy: bool = False):
+    """
+    NumPy 数组包装为 VTK 数组
+
+    Args:
+        array: 一维数组，或 (N, 分量数) 的二维数组
+        name: 数组名称
+        copy: 为 False 时要求 C 连续并零拷贝共享内存；为 True 时复制一份由 VTK 持有
+
+    Returns:
+        vtkDataArray
+    """
+    if array.ndim not in (1, 2):
+        raise ValueError(f"只支持一维或二维数组，实际为 {array.ndim} 维")
+    if not copy and not array.flags.c_contiguous:
+        raise ValueError("数组不是 C 连续的，零拷贝包装需要先 np.ascontiguousarray 或传 copy=True")
+    if array.dtype.byteorder not in ("=", "|"):
+        raise ValueError("VTK 只支持本机字节序的数组")
+    vtk_array = numpy_support.numpy_to_vtk(array, deep=1 if copy else 0)
+    if name:
+        vtk_array.SetName(name)
+    return vtk_array
+
+
+def image_data_to_array(image_data, name: Optional[str] = None) -> np.ndarray:
+    """
+    vtkImageData 的点数据转为 (z, y, x) 或 (z, y, x, 分量数) 视图（零拷贝）
+
+    Args:
+        image_data: vtkImageData
+        name: 数组名称，默认取当前标量
+    """
+    point_data = image_data.GetPointData()
+    vtk_array = point_data.GetArray(name) if name else point_data.GetScalars()
+    if vtk_array is None:
+        raise ValueError(f"vtkImageData 中没有数组 {name or 'scalars'}")
+    nx, ny, nz = image_data.GetDimensions()
+    array = vtk_to_array(vtk_array)
+    if array.ndim == 2:
+        return array.reshape(nz, ny, nx, array.shape[1])
+    return array.reshape(nz, ny, nx)
+
+
+def array_to_image_data(array: np.ndarray, spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                        origin: Sequence[float] = (0.0, 0.0, 0.0), name: str = "scalars",
+                        copy: bool = False) -> vtkImageData:
+    """
+    (z, y, x) 或 (z, y, x, 分量数) 数组包装为 vtkImageData（x 变化最快）
+
+    Args:
+        array: 体数据
+        spacing: 体素间距 (x, y, z)
+        origin: 原点 (x, y, z)
+        name: 标量数组名称
+        copy: 见 array_to_vtk
+    """
+    if array.ndim not in (3, 4):
+        raise ValueError(f"体数据需为三维或四维数组，实际为 {array.ndim} 维")
+    if not copy and not array.flags.c_contiguous:
+        raise ValueError("体数据不是 C 连续的，零拷贝包装需要先 np.ascontiguousarray 或传 copy=True")
+    nz, ny, nx = array.shape[:3]
+    flat = array.reshape(nx * ny * nz, -1) if array.ndim == 4 else array.reshape(-1)
+    image_data = vtkImageData()
+    image_data.SetDimensions(nx, ny, nz)
+    image_data.SetSpacing(*spacing)
+    image_data.SetOrigin(*origin)
+    image_data.GetPointData().SetScalars(array_to_vtk(flat, name, copy=copy))
+    return image_data
+
+
+def array_to_vtk_points(points: np.ndarray, copy: bool = False) -> vtkPoints:
+    """N×3 的 float32 / float64 数组包装为 vtkPoints（默认零拷贝）"""
+    if points.ndim != 2 or points.shape[1] != 3:
+        raise ValueError(f"点坐标需为 N×3 数组，实际形状为 {points.shape}")
+    if points.dtype not in (np.float32, np.float64):
+        if not copy:
+            raise ValueError(f"vtkPoints 只支持 float32 / float64，实际为 {points.dtype}")
+        points = points.astype(np.float32)
+    vtk_points = vtkPoints()
+    vtk_points.SetData(array_to_vtk(points, copy=copy))
+    return vtk_points
+
+
+def vtk_points_to_array(vtk_points: vtkPoints) -> np.ndarray:
+    """vtkPoints 转为 N×3 视图（零拷贝）"""
+    return vtk_to_array(vtk_points.GetData())
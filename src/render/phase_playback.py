@@ -0,0 +1,265 @@
+"""
+4D / 多期相序列回放
+
+心脏、灌注等检查是一组按时间排列的体数据（每个期相一个序列目录）。回放时只替换体渲染
+mapper 的输入，vtkVolume、传输函数与相机保持不变；期相由后台线程池并行解码到
+以播放头为中心的有界环形缓冲区（前方多、后方少），循环播放时提前解码下一圈的开头。
+
+帧率由客户端设定，每帧按目标间隔减去本帧耗时调度下一帧；下一期相尚未解码完成时
+保持当前画面并计入 stalls，不阻塞事件循环。换帧只是提交给渲染线程，渲染完成后由调用方
+回报 frame_rendered，frames / achieved_fps 按实际渲染的帧统计，被新帧取代的计入 dropped。
+解码失败的期相不再重试，回放时跳过。
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from config import Config
+from render.dicom_io import load_dicom_series
+from render.volume_cache import image_data_bytes, volume_cache
+
+logger = logging.getLogger(__name__)
+
+
+def find_phase_series(root: str) -> List[str]:
+    """root 下按目录名排序的期相序列目录（包含 .dcm 文件的子目录）"""
+    phases = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and any(f.endswith(".dcm") for f in os.listdir(path)):
+            phases.append(os.path.abspath(path))
+    if not phases:
+        raise ValueError(f"{root} 下没有期相序列目录")
+    return phases
+
+
+def load_phase(phase_dir: str):
+    """读取单个期相；已在体数据缓存中时直接复用，否则从磁盘读取且不放入缓存（由环形缓冲区管理）"""
+    cached = volume_cache.peek(os.path.abspath(phase_dir))
+    return cached if cached is not None else load_dicom_series(phase_dir)
+
+
+class PhasePlayer:
+    """
+    期相回放：环形缓冲区 + 后台解码 + 定时换帧，作为会话资源管理（实现 release / memory_bytes）
+
+    Args:
+        phases: 期相序列目录，按时间顺序
+        show: 换帧回调 show(index, image_data, frame)，在调度线程（事件循环）中调用；
+            该帧渲染完成后应调用 frame_rendered(frame)
+        schedule: 定时回调 schedule(delay, callback)，如 wslink 的 schedule_callback 或 loop.call_later
+        loader: 读取单个期相的函数
+        capacity: 缓冲区最多保留的期相数
+        workers: 解码线程数
+        fps: 默认目标帧率
+    """
+
+    def __init__(self, phases: List[str], show: Callable[[int, Any, int], None],
+                 schedule: Callable[[float, Callable[[], None]], Any],
+                 loader: Callable[[str], Any] = load_phase,
+                 capacity: int = Config.PLAYBACK_BUFFER_SIZE,
+                 workers: int = Config.PLAYBACK_WORKERS,
+                 fps: float = Config.PLAYBACK_FPS):
+        if not phases:
+            raise ValueError("期相列表为空")
+        self.phases = list(phases)
+        self.show = show
+        self.schedule = schedule
+        self.loader = loader
+        self.capacity = max(2, min(int(capacity), len(self.phases)))
+        # 播放头之后预解码的期相数，其余留给刚播过的期相（反向拖动时可用）
+        self.ahead = max(1, self.capacity - 1 - self.capacity // 4)
+        self.fps = float(fps)
+        self.current = 0
+        self.playing = False
+        # posted: 提交渲染的帧数；frames: 实际渲染完成的帧数；dropped: 渲染前被新帧取代的帧数
+        self.posted = 0
+        self.frames = 0
+        self.dropped = 0
+        self.stalls = 0
+        self.achieved_fps = 0.0
+        self._buffer: Dict[int, Any] = {}
+        self._loading: Dict[int, Future] = {}
+        # 解码失败的期相，不再重新提交
+        self._failed: Set[int] = set()
+        # 解码很快完成时 done 回调会在提交线程中立即执行，需可重入
+        self._lock = threading.RLock()
+        self._loaded = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="phase-loader")
+        # 每次 play / pause 递增，作废已调度的旧定时回调
+        self._generation = 0
+        self._last_rendered: Optional[float] = None
+        self._last_frame = 0
+        self._released = False
+        self._prefetch(0)
+
+    def __len__(self) -> int:
+        return len(self.phases)
+
+    def _window(self, center: int) -> List[int]:
+        """以 center 为播放头、按循环顺序应保留的期相下标"""
+        n = len(self.phases)
+        behind = self.capacity - 1 - self.ahead
+        return [(center + offset) % n for offset in range(-behind, self.ahead + 1)]
+
+    def _prefetch(self, center: int) -> None:
+        window = self._window(center)
+        keep = set(window)
+        with self._lock:
+            if self._released:
+                return
+            for index in list(self._buffer):
+                if index not in keep:
+                    del self._buffer[index]
+            for index, future in list(self._loading.items()):
+                if index not in keep and future.cancel():
+                    del self._loading[index]
+                    self._loaded.notify_all()
+            # 离播放头近的先提交
+            order = sorted(window, key=lambda i: (i - center) % len(self.phases))
+            for index in order:
+                if index not in self._buffer and index not in self._loading and index not in self._failed:
+                    future = self._executor.submit(self.loader, self.phases[index])
+                    self._loading[index] = future
+                    future.add_done_callback(lambda f, i=index: self._on_loaded(i, f))
+
+    def _on_loaded(self, index: int, future: Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        with self._lock:
+            self._loading.pop(index, None)
+            if error is not None:
+                logger.error("期相 %s 解码失败: %s", self.phases[index], error)
+                self._failed.add(index)
+            elif not self._released and index in self._window(self.current):
+                self._buffer[index] = future.result()
+            self._loaded.notify_all()
+
+    def get(self, index: int) -> Optional[Any]:
+        """已解码的期相，未就绪时返回 None"""
+        with self._lock:
+            return self._buffer.get(index % len(self.phases))
+
+    def wait(self, index: int, timeout: Optional[float] = None) -> Optional[Any]:
+        """等待期相解码完成（用于开始播放前预热首帧）"""
+        index %= len(self.phases)
+        with self._loaded:
+            self._loaded.wait_for(lambda: index not in self._loading, timeout)
+            return self._buffer.get(index)
+
+    def play(self, fps: Optional[float] = None) -> None:
+        if fps is not None:
+            if fps <= 0:
+                raise ValueError("fps 必须大于 0")
+            self.fps = float(fps)
+        self._generation += 1
+        self.playing = True
+        self._last_rendered = None
+        generation = self._generation
+        self.schedule(0.0, lambda: self._tick(generation))
+
+    def pause(self) -> None:
+        self._generation += 1
+        self.playing = False
+
+    def seek(self, index: int) -> bool:
+        """跳到指定期相并显示；未就绪时返回 False（画面保持不变，解码完成后可再次 seek）"""
+        index %= len(self.phases)
+        self._prefetch(index)
+        image_data = self.get(index)
+        if image_data is None:
+            return False
+        self.current = index
+        self._post(index, image_data)
+        return True
+
+    def _post(self, index: int, image_data) -> None:
+        self.posted += 1
+        self.show(index, image_data, self.posted)
+
+    def _next_index(self) -> int:
+        """播放头之后第一个未解码失败的期相"""
+        n = len(self.phases)
+        for offset in range(1, n + 1):
+            index = (self.current + offset) % n
+            if index not in self._failed:
+                return index
+        return (self.current + 1) % n
+
+    def frame_rendered(self, frame: int) -> None:
+        """
+        换帧渲染完成（由 show 的调用方在渲染线程上回报）
+
+        Args:
+            frame: show 回调收到的帧序号；与上一次渲染的序号之间的帧均已被取代
+        """
+        now = time.monotonic()
+        with self._lock:
+            if frame <= self._last_frame:
+                return
+            self.dropped += frame - self._last_frame - 1
+            self._last_frame = frame
+            self.frames += 1
+            if self.playing and self._last_rendered is not None:
+                interval = now - self._last_rendered
+                if interval > 0:
+                    rate = 1.0 / interval
+                    self.achieved_fps = rate if not self.achieved_fps else 0.8 * self.achieved_fps + 0.2 * rate
+            self._last_rendered = now
+
+    def _tick(self, generation: int) -> None:
+        if generation != self._generation or not self.playing or self._released:
+            return
+        started = time.monotonic()
+        index = self._next_index()
+        image_data = self.get(index)
+        if image_data is None:
+            self.stalls += 1
+        else:
+            self.current = index
+            self._post(index, image_data)
+        self._prefetch(self.current)
+        elapsed = time.monotonic() - started
+        self.schedule(max(0.0, 1.0 / self.fps - elapsed), lambda: self._tick(generation))
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(image_data_bytes(image_data) for image_data in self._buffer.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = sorted(self._buffer)
+            loading = sorted(self._loading)
+            failed = sorted(self._failed)
+        return {
+            "phases": len(self.phases),
+            "current": self.current,
+            "playing": self.playing,
+            "fps": self.fps,
+            "achieved_fps": round(self.achieved_fps, 2),
+            "posted": self.posted,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "stalls": self.stalls,
+            "capacity": self.capacity,
+            "buffered": buffered,
+            "loading": loading,
+            "failed": failed,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+    def release(self) -> None:
+        self.pause()
+        with self._lock:
+            self._released = True
+            self._buffer.clear()
+            for future in self._loading.values():
+                future.cancel()
+            self._loading.clear()
+            self._loaded.notify_all()
+        self._executor.shutdown(wait=False)
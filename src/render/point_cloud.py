@@ -0,0 +1,287 @@
+"""
+大规模点云渲染
+
+N×3 的 NumPy 点坐标经零拷贝桥接直接作为 vtkPoints，顶点单元只用一个 poly-vertex 与 int32 连接数组
+（每点额外 4 字节），.npy 文件以内存映射方式打开，整体内存接近原始数组大小。
+
+包围盒只计算一次并缓存；体素网格降采样生成若干细节层次（LOD），交互时按渲染时间预算
+切换到较粗的层次，静止时渲染全部点。
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from vtkmodules.vtkCommonCore import vtkCommand
+from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+from vtkmodules.vtkRenderingCore import vtkActor, vtkPolyDataMapper
+
+from config import Config
+from render.numpy_bridge import array_to_vtk, array_to_vtk_points
+from render.spatial_index import UniformGridIndex
+from utils import calculate_bounding_box, normalize_points
+
+# 体素降采样时分块计算体素编号，限制临时数组大小
+_CHUNK_POINTS = 1 << 20
+
+
+def make_vertex_cells(num_points: int) -> vtkCellArray:
+    """覆盖全部点的单个 poly-vertex 单元（int32 存储）"""
+    if num_points >= 2 ** 31:
+        raise ValueError("点数超过 int32 连接数组上限")
+    cells = vtkCellArray()
+    offsets = np.array([0, num_points], dtype=np.int32)
+    connectivity = np.arange(num_points, dtype=np.int32)
+    cells.SetData(array_to_vtk(offsets), array_to_vtk(connectivity))
+    return cells
+
+
+def points_to_polydata(points: np.ndarray, scalars: Optional[np.ndarray] = None) -> vtkPolyData:
+    """
+    点坐标（与可选的逐点标量）零拷贝包装为 vtkPolyData
+
+    Args:
+        points: N×3 float32 / float64，C 连续
+        scalars: 长度为 N 的标量或 N×3 / N×4 的 uint8 颜色
+    """
+    polydata = vtkPolyData()
+    polydata.SetPoints(array_to_vtk_points(points))
+    polydata.SetVerts(make_vertex_cells(len(points)))
+    if scalars is not None:
+        if len(scalars) != len(points):
+            raise ValueError("标量数量与点数不一致")
+        polydata.GetPointData().SetScalars(array_to_vtk(scalars, "scalars"))
+    return polydata
+
+
+def voxel_downsample(points: np.ndarray, voxel_size: float,
+                     bounds: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    体素网格降采样，每个被占据的体素保留第一个点
+
+    Args:
+        points: N×3 点坐标
+        voxel_size: 体素边长
+        bounds: 已知的包围盒，省去一次扫描
+
+    Returns:
+        保留点的下标（升序）
+    """
+    if voxel_size <= 0:
+        raise ValueError("voxel_size 必须大于 0")
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64)
+    if bounds is None:
+        bounds = calculate_bounding_box(points)
+    origin = np.array(bounds[0::2], dtype=np.float64)
+    extent = np.array(bounds[1::2], dtype=np.float64) - origin
+    grid = np.floor(extent / voxel_size).astype(np.int64) + 1
+    keys = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), _CHUNK_POINTS):
+        block = ((points[start:start + _CHUNK_POINTS] - origin) / voxel_size).astype(np.int64)
+        np.clip(block, 0, grid - 1, out=block)
+        keys[start:start + len(block)] = block[:, 0] + grid[0] * (block[:, 1] + grid[1] * block[:, 2])
+    _, indices = np.unique(keys, return_index=True)
+    indices.sort()
+    return indices
+
+
+class PointCloud:
+    """
+    点云数据，缓存包围盒与各层次的降采样结果
+
+    Args:
+        points: N×3 点坐标；非 float32 / float64 或非 C 连续时转换为 float32
+        scalars: 可选的逐点标量或颜色
+    """
+
+    def __init__(self, points: np.ndarray, scalars: Optional[np.ndarray] = None):
+        if not isinstance(points, np.ndarray):
+            points = np.asarray(points)
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError(f"点坐标需为 N×3 数组，实际形状为 {points.shape}")
+        if points.dtype not in (np.float32, np.float64) or not points.flags.c_contiguous:
+            points = np.ascontiguousarray(points, dtype=np.float32)
+        self.points = points
+        self.scalars = None if scalars is None else np.ascontiguousarray(scalars)
+        self._bounds: Optional[List[float]] = None
+        # 点数上限 -> 保留点下标
+        self._lods: Dict[int, np.ndarray] = {}
+        self._index: Optional[UniformGridIndex] = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "PointCloud":
+        """读取 .npy（内存映射，不复制到内存）"""
+        if not path.endswith(".npy"):
+            raise ValueError(f"不支持的点云文件格式: {path}")
+        return cls(np.load(path, mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    @property
+    def bounds(self) -> List[float]:
+        """[x_min, x_max, y_min, y_max, z_min, z_max]，首次访问时计算"""
+        if self._bounds is None:
+            self._bounds = [float(v) for v in calculate_bounding_box(self.points)]
+        return self._bounds
+
+    @property
+    def index(self) -> UniformGridIndex:
+        """空间索引（拾取 / 近邻 / 范围查询），首次访问时构建"""
+        if self._index is None:
+            self._index = UniformGridIndex(self.points, self.bounds)
+        return self._index
+
+    @property
+    def nbytes(self) -> int:
+        lod_bytes = sum(indices.nbytes for indices in self._lods.values())
+        scalar_bytes = self.scalars.nbytes if self.scalars is not None else 0
+        index_bytes = self._index.nbytes if self._index is not None else 0
+        return self.points.nbytes + scalar_bytes + lod_bytes + index_bytes
+
+    def normalized(self) -> np.ndarray:
+        """标准化到单位立方体（复用缓存的包围盒）"""
+        return normalize_points(self.points, bbox=self.bounds)
+
+    def lod_indices(self, max_points: int) -> np.ndarray:
+        """
+        点数不超过 max_points 的体素降采样下标
+
+        体素边长先按包围盒体积估计，被占据的体素过多时逐步放大。
+        """
+        if max_points >= len(self):
+            return np.arange(len(self))
+        cached = self._lods.get(max_points)
+        if cached is not None:
+            return cached
+        extent = [max(hi - lo, 1e-9) for lo, hi in zip(self.bounds[0::2], self.bounds[1::2])]
+        voxel_size = (extent[0] * extent[1] * extent[2] / max_points) ** (1.0 / 3.0)
+        indices = voxel_downsample(self.points, voxel_size, self.bounds)
+        while len(indices) > max_points:
+            voxel_size *= max(1.05, (len(indices) / max_points) ** 0.5)
+            indices = voxel_downsample(self.points, voxel_size, self.bounds)
+        self._lods[max_points] = indices
+        return indices
+
+    def to_polydata(self, max_points: Optional[int] = None) -> vtkPolyData:
+        """全部点（零拷贝）或降采样后的 vtkPolyData"""
+        if max_points is None or max_points >= len(self):
+            return points_to_polydata(self.points, self.scalars)
+        indices = self.lod_indices(max_points)
+        scalars = self.scalars[indices] if self.scalars is not None else None
+        return points_to_polydata(self.points[indices], scalars)
+
+
+class PointCloudLayer:
+    """
+    挂到 renderer 上的点云图层，作为会话资源管理（实现 release / memory_bytes）
+
+    每个层次一个 actor，渲染前按渲染窗口的期望帧率切换可见层次：静止渲染（交互样式把
+    DesiredUpdateRate 设为 StillUpdateRate）显示全部点；交互时按实测的每点耗时选择
+    能在 1 / DesiredUpdateRate 内完成的最细层次。各层次的 VBO 都保留在显存中，切换时无需重新上传。
+
+    Args:
+        cloud: 点云
+        renderer: 目标 renderer
+        lod_budgets: 交互时可用的降采样层次（点数上限）
+        point_size: 点大小（像素）
+    """
+
+    # 期望帧率不低于该值视为交互渲染
+    INTERACTIVE_RATE = 1.0
+
+    def __init__(self, cloud: PointCloud, renderer,
+                 lod_budgets: Sequence[int] = Config.POINT_CLOUD_LOD_BUDGETS,
+                 point_size: float = Config.POINT_CLOUD_POINT_SIZE):
+        self.cloud = cloud
+        self.renderer = renderer
+        self.levels: List[vtkPolyData] = [cloud.to_polydata()]
+        for budget in sorted(set(lod_budgets), reverse=True):
+            if budget < len(cloud):
+                self.levels.append(cloud.to_polydata(budget))
+
+        scalar_range = None
+        if cloud.scalars is not None and cloud.scalars.ndim == 1:
+            scalar_range = (float(cloud.scalars.min()), float(cloud.scalars.max()))
+        self.actors: List[vtkActor] = []
+        for polydata in self.levels:
+            mapper = vtkPolyDataMapper()
+            mapper.SetInputData(polydata)
+            if cloud.scalars is None:
+                mapper.ScalarVisibilityOff()
+            elif scalar_range is not None:
+                mapper.SetScalarRange(*scalar_range)
+            else:
+                # N×3 / N×4 的 uint8 颜色直接使用
+                mapper.SetColorModeToDirectScalars()
+            actor = vtkActor()
+            actor.SetMapper(mapper)
+            actor.GetProperty().SetPointSize(point_size)
+            actor.GetProperty().SetRepresentationToPoints()
+            renderer.AddActor(actor)
+            self.actors.append(actor)
+
+        self.active_level = 0
+        # 实测的每点渲染耗时（秒），用于交互时选择层次
+        self.seconds_per_point: Optional[float] = None
+        self._render_started = 0.0
+        # 观察渲染窗口而不是 renderer：GL 命令在窗口 Frame() 时才真正完成
+        self._observed = renderer.GetRenderWindow() or renderer
+        self._observers = [
+            self._observed.AddObserver(vtkCommand.StartEvent, self._on_render_start),
+            self._observed.AddObserver(vtkCommand.EndEvent, self._on_render_end),
+        ]
+        self._show(0)
+
+    def level_sizes(self) -> List[int]:
+        return [polydata.GetNumberOfPoints() for polydata in self.levels]
+
+    def select_level(self, desired_update_rate: float) -> int:
+        """按期望帧率选择层次下标（0 为全部点）"""
+        if desired_update_rate < self.INTERACTIVE_RATE or len(self.levels) == 1:
+            return 0
+        if self.seconds_per_point is None:
+            return len(self.levels) - 1
+        budget = 1.0 / desired_update_rate
+        for index, size in enumerate(self.level_sizes()):
+            if size * self.seconds_per_point <= budget:
+                return index
+        return len(self.levels) - 1
+
+    def _show(self, level: int) -> None:
+        for index, actor in enumerate(self.actors):
+            actor.SetVisibility(index == level)
+        self.active_level = level
+
+    def _on_render_start(self, caller, event) -> None:
+        render_window = self.renderer.GetRenderWindow()
+        if render_window is not None:
+            self._show(self.select_level(render_window.GetDesiredUpdateRate()))
+        self._render_started = time.perf_counter()
+
+    def _on_render_end(self, caller, event) -> None:
+        points = self.levels[self.active_level].GetNumberOfPoints()
+        if points:
+            self.seconds_per_point = (time.perf_counter() - self._render_started) / points
+
+    def memory_bytes(self) -> int:
+        """点云数组与各层次 vtkPolyData 占用的内存（全分辨率层与 NumPy 共享内存，不重复计）"""
+        lod_bytes = sum(p.GetActualMemorySize() * 1024 for p in self.levels[1:])
+        return self.cloud.nbytes + lod_bytes
+
+    def vtk_objects(self):
+        return [*self.actors, *self.levels]
+
+    def release(self) -> None:
+        for tag in self._observers:
+            self._observed.RemoveObserver(tag)
+        self._observers = []
+        render_window = self.renderer.GetRenderWindow()
+        for actor in self.actors:
+            self.renderer.RemoveActor(actor)
+            if render_window is not None:
+                actor.ReleaseGraphicsResources(render_window)
+            actor.GetMapper().RemoveAllInputConnections(0)
+        self.actors = []
+        self.levels = []
@@ -0,0 +1,236 @@
+"""
+同检查相邻序列的后台预取
+
+用户打开某个序列后，通常会接着打开同一检查下的其他重建或增强期相。
+预取器利用空闲的 I/O 与 CPU，以低优先级线程把这些兄弟序列提前加载进体数据缓存，
+交互渲染进行时自动让出 CPU。
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional, Tuple
+
+from render.volume_cache import VolumeCache
+
+logger = logging.getLogger(__name__)
+
+# 预取线程的 nice 增量（仅 Linux 下对单个线程生效）
+PREFETCH_NICE = 10
+
+
+def _has_dicom_files(path: str) -> bool:
+    try:
+        return any(f.endswith(".dcm") for f in os.listdir(path))
+    except OSError:
+        return False
+
+
+def _study_uid(series_dir: str) -> Optional[str]:
+    """读取序列中任一文件头部的 StudyInstanceUID，失败时返回 None"""
+    try:
+        import pydicom
+    except ImportError:
+        return None
+    for file_name in sorted(os.listdir(series_dir)):
+        if file_name.endswith(".dcm"):
+            try:
+                ds = pydicom.dcmread(
+                    os.path.join(series_dir, file_name),
+                    stop_before_pixels=True,
+                    specific_tags=["StudyInstanceUID"],
+                )
+                return ds.get("StudyInstanceUID")
+            except Exception:
+                return None
+    return None
+
+
+def find_sibling_series(dicom_dir: str, limit: Optional[int] = None) -> List[str]:
+    """
+    查找同一检查下的兄弟序列目录
+
+    约定序列目录位于检查目录之下（<study>/<series>/*.dcm），兄弟序列按目录名顺序
+    距离当前序列由近到远排列；能读到 StudyInstanceUID 时剔除不属于同一检查的目录。
+    目录按距离逐个检查，找够 limit 个即停止，不再读取更远目录的文件头。
+
+    Args:
+        dicom_dir: 当前序列目录
+        limit: 最多返回的序列数
+
+    Returns:
+        兄弟序列目录列表（绝对路径）
+    """
+    series_dir = os.path.abspath(dicom_dir)
+    study_dir, series_name = os.path.split(series_dir)
+    try:
+        with os.scandir(study_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_dir())
+    except OSError:
+        return []
+    if series_name not in names:
+        return []
+
+    index = names.index(series_name)
+    nearest = sorted(
+        (i for i in range(len(names)) if i != index),
+        key=lambda i: abs(i - index),
+    )
+
+    siblings: List[str] = []
+    study_uid, uid_read = None, False
+    for i in nearest:
+        if limit is not None and len(siblings) >= limit:
+            break
+        path = os.path.join(study_dir, names[i])
+        if not _has_dicom_files(path):
+            continue
+        if not uid_read:
+            study_uid, uid_read = _study_uid(series_dir), True
+        if study_uid is not None and _study_uid(path) not in (study_uid, None):
+            continue
+        siblings.append(path)
+    return siblings
+
+
+class SeriesPrefetcher:
+    """
+    兄弟序列预取器
+
+    Args:
+        cache: 预取结果写入的体数据缓存
+        loader: 加载单个序列的函数，参数为序列目录
+        workers: 预取线程数
+        max_series: 每次打开序列时最多预取的兄弟序列数
+        idle_grace: 交互结束后需要空闲多久（秒）才恢复预取
+    """
+
+    def __init__(self, cache: VolumeCache, loader: Callable[[str], Any],
+                 workers: int = 1, max_series: int = 4, idle_grace: float = 0.5):
+        self.cache = cache
+        self.loader = loader
+        self.max_series = max_series
+        self.idle_grace = idle_grace
+        # (序列目录, Future)：Future 为 None 时加载该序列，否则查找其兄弟序列并把结果写入 Future
+        self._queue: "queue.Queue[Tuple[str, Optional[Future]]]" = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._interactive = 0
+        self._last_interactive = 0.0
+        self._idle = threading.Condition(self._lock)
+        self.loaded = 0
+        self.failed = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"series-prefetch-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def prefetch_siblings(self, dicom_dir: str) -> Future:
+        """
+        在预取线程上查找当前序列的兄弟序列并加入预取队列，调用方不等待目录扫描与文件头读取
+
+        Returns:
+            Future，结果为实际入队的目录列表
+        """
+        future: Future = Future()
+        self._queue.put((dicom_dir, future))
+        return future
+
+    def _queue_siblings(self, dicom_dir: str) -> List[str]:
+        queued = []
+        for path in find_sibling_series(dicom_dir, limit=self.max_series):
+            with self._lock:
+                if path in self._pending or path in self.cache:
+                    continue
+                self._pending.add(path)
+            self._queue.put((path, None))
+            queued.append(path)
+        if queued:
+            logger.info("预取 %d 个同检查序列: %s", len(queued), queued)
+        return queued
+
+    def begin_interactive(self) -> None:
+        with self._lock:
+            self._interactive += 1
+
+    def end_interactive(self) -> None:
+        with self._lock:
+            self._interactive = max(0, self._interactive - 1)
+            self._last_interactive = time.monotonic()
+            self._idle.notify_all()
+
+    def notify_interactive(self) -> None:
+        """记录一次瞬时的交互渲染，预取在 idle_grace 之后才继续"""
+        with self._lock:
+            self._last_interactive = time.monotonic()
+
+    @contextmanager
+    def interactive(self):
+        """交互渲染期间暂停预取"""
+        self.begin_interactive()
+        try:
+            yield
+        finally:
+            self.end_interactive()
+
+    def _wait_for_idle(self) -> None:
+        with self._lock:
+            while True:
+                remaining = self._last_interactive + self.idle_grace - time.monotonic()
+                if self._interactive == 0 and remaining <= 0:
+                    return
+                self._idle.wait(timeout=max(remaining, self.idle_grace))
+
+    def _lower_priority(self) -> None:
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICE)
+        except (AttributeError, OSError):
+            pass
+
+    def _run(self) -> None:
+        self._lower_priority()
+        while True:
+            path, discovered = self._queue.get()
+            if discovered is not None:
+                try:
+                    self._wait_for_idle()
+                    discovered.set_result(self._queue_siblings(path))
+                except Exception as e:
+                    logger.warning("查找 %s 的同检查序列失败: %s", path, e)
+                    discovered.set_exception(e)
+                finally:
+                    self._queue.task_done()
+                continue
+            try:
+                self._wait_for_idle()
+                self.cache.get_or_load(path, self.loader, prefetched=True)
+                self.loaded += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("预取序列 %s 失败: %s", path, e)
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+                self._queue.task_done()
+
+    def join(self) -> None:
+        """等待当前队列中的预取全部完成"""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        cache_stats = self.cache.stats()
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "loaded": self.loaded,
+            "failed": self.failed,
+            "prefetched": cache_stats["prefetched"],
+            "prefetch_used": cache_stats["prefetch_used"],
+        }
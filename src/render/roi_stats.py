@@ -0,0 +1,246 @@
+"""
+ROI 测量
+
+在缓存体数据的 (z, y, x) 视图上统计盒形、球形与手绘层块（平面多边形沿法向拉伸）ROI 内的
+HU 均值、标准差、最小 / 最大值与体积。先按 ROI 包围盒切出视图（不复制），
+再沿 z 分块生成掩膜并归约，临时数组大小与 ROI 大小无关。
+
+ROI 以世界坐标描述，体素中心落在 ROI 内即计入；结果按 (体数据, ROI) 缓存，重复查询直接返回。
+"""
+
+import json
+import math
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.metrics import watch_cache
+from render.numpy_bridge import image_data_to_array
+from render.volume_cache import VolumeCache
+from render.volume_stats import CHUNK_VOXELS
+
+ROI_TYPES = ("box", "sphere", "slab")
+
+# 层块 ROI 的法向轴名 -> 世界坐标轴下标
+_AXES = {"x": 0, "y": 1, "z": 2}
+
+
+@dataclass
+class ROIStatistics:
+    """单个 ROI 的统计结果，ROI 内没有体素时数值字段为 None"""
+
+    voxels: int
+    volume_mm3: float
+    mean: Optional[float]
+    std: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    # ROI 包围盒的体素下标范围 [i0, i1, j0, j1, k0, k1]（含两端）
+    extent: Optional[Tuple[int, int, int, int, int, int]]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _voxel_range(low: float, high: float, origin: float, spacing: float, size: int) -> Tuple[int, int]:
+    """世界坐标区间 [low, high] 内体素中心的下标范围 [first, last)"""
+    a, b = (low - origin) / spacing, (high - origin) / spacing
+    if a > b:
+        a, b = b, a
+    first = max(0, math.ceil(a - 1e-9))
+    last = min(size, math.floor(b + 1e-9) + 1)
+    return first, max(first, last)
+
+
+def _polygon_mask(polygon: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    偶奇规则判断网格点 (u[j], v[i]) 是否在多边形内
+
+    Returns:
+        (len(v), len(u)) 的布尔掩膜
+    """
+    inside = np.zeros((len(v), len(u)), dtype=bool)
+    uu = u[None, :]
+    vv = v[:, None]
+    for (u0, v0), (u1, v1) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if v0 == v1:
+            continue
+        crosses = (v0 > vv) != (v1 > vv)
+        u_cross = u0 + (vv - v0) * (u1 - u0) / (v1 - v0)
+        inside ^= crosses & (uu < u_cross)
+    return inside
+
+
+class _ROI:
+    """解析后的 ROI：包围盒（世界坐标）与按体素中心坐标生成掩膜的函数"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        kind = spec.get("type")
+        if kind not in ROI_TYPES:
+            raise ValueError(f"不支持的 ROI 类型: {kind}，可选 {ROI_TYPES}")
+        self.kind = kind
+        if kind == "box":
+            lower = np.asarray(spec["lower"], dtype=np.float64)
+            upper = np.asarray(spec["upper"], dtype=np.float64)
+            self.lower, self.upper = np.minimum(lower, upper), np.maximum(lower, upper)
+        elif kind == "sphere":
+            self.center = np.asarray(spec["center"], dtype=np.float64)
+            self.radius = float(spec["radius"])
+            if self.radius <= 0:
+                raise ValueError("球形 ROI 的半径必须大于 0")
+            self.lower, self.upper = self.center - self.radius, self.center + self.radius
+        else:
+            self.axis = _AXES[spec.get("axis", "z")]
+            # 多边形所在平面的两个坐标轴（按 x, y, z 顺序）
+            self.plane_axes = [a for a in range(3) if a != self.axis]
+            self.polygon = np.asarray(spec["polygon"], dtype=np.float64)
+            if self.polygon.ndim != 2 or self.polygon.shape[1] != 2 or len(self.polygon) < 3:
+                raise ValueError("层块 ROI 的 polygon 需为至少 3 个 (u, v) 顶点")
+            slab = sorted(float(v) for v in spec["range"])
+            self.lower = np.empty(3)
+            self.upper = np.empty(3)
+            self.lower[self.plane_axes] = self.polygon.min(axis=0)
+            self.upper[self.plane_axes] = self.polygon.max(axis=0)
+            self.lower[self.axis], self.upper[self.axis] = slab
+
+    def mask(self, xs: np.ndarray, ys: np.ndarray, zs: np.ndarray) -> Optional[np.ndarray]:
+        """
+        体素中心世界坐标网格上的掩膜，可广播到 (len(zs), len(ys), len(xs))
+
+        盒形 ROI 的包围盒即 ROI 本身，返回 None 表示全部计入
+        """
+        if self.kind == "box":
+            return None
+        if self.kind == "sphere":
+            cx, cy, cz = self.center
+            return (((zs - cz) ** 2)[:, None, None]
+                    + ((ys - cy) ** 2)[None, :, None]
+                    + ((xs - cx) ** 2)[None, None, :]) <= self.radius ** 2
+        coords = (xs, ys, zs)
+        u, v = (coords[a] for a in self.plane_axes)
+        plane = _polygon_mask(self.polygon, u, v)
+        # plane 形状为 (len(v), len(u))，插入法向轴后与 (z, y, x) 对齐
+        if self.axis == 2:
+            return plane[None, :, :]
+        if self.axis == 1:
+            return plane[:, None, :]
+        return plane[:, :, None]
+
+
+def compute_roi_statistics(array: np.ndarray, roi: Dict[str, Any],
+                           spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                           origin: Sequence[float] = (0.0, 0.0, 0.0),
+                           chunk_voxels: int = CHUNK_VOXELS) -> ROIStatistics:
+    """
+    计算 ROI 统计
+
+    Args:
+        array: (z, y, x) 体素数组
+        roi: ROI 描述（世界坐标）：
+            {"type": "box", "lower": [x, y, z], "upper": [x, y, z]}，
+            {"type": "sphere", "center": [x, y, z], "radius": r}，
+            {"type": "slab", "polygon": [[u, v], ...], "axis": "z", "range": [low, high]}
+            （层块：axis 为法向，polygon 为另两轴按 x, y, z 顺序的坐标，range 为沿法向的厚度范围）
+        spacing: 体素间距 (x, y, z)
+        origin: 原点 (x, y, z)
+        chunk_voxels: 每块处理的体素数上限
+
+    Returns:
+        ROIStatistics
+    """
+    if array.ndim != 3:
+        raise ValueError(f"体数据需为三维数组，实际为 {array.ndim} 维")
+    region = _ROI(roi)
+    nz, ny, nx = array.shape
+    ranges = [
+        _voxel_range(region.lower[a], region.upper[a], origin[a], spacing[a], size)
+        for a, size in enumerate((nx, ny, nz))
+    ]
+    voxel_volume = float(abs(spacing[0] * spacing[1] * spacing[2]))
+    if any(first >= last for first, last in ranges):
+        return ROIStatistics(0, 0.0, None, None, None, None, None)
+    (i0, i1), (j0, j1), (k0, k1) = ranges
+    view = array[k0:k1, j0:j1, i0:i1]
+    xs = origin[0] + np.arange(i0, i1) * spacing[0]
+    ys = origin[1] + np.arange(j0, j1) * spacing[1]
+    zs = origin[2] + np.arange(k0, k1) * spacing[2]
+
+    count = 0
+    total = 0.0
+    total_sq = 0.0
+    low, high = float("inf"), -float("inf")
+    plane_voxels = view.shape[1] * view.shape[2]
+    step = max(1, chunk_voxels // max(plane_voxels, 1))
+    mask = region.mask(xs, ys, zs) if region.kind == "slab" else None
+    for start in range(0, view.shape[0], step):
+        chunk = view[start:start + step]
+        if region.kind == "sphere":
+            chunk_mask = region.mask(xs, ys, zs[start:start + step])
+        elif mask is not None and mask.shape[0] > 1:
+            chunk_mask = mask[start:start + step]
+        else:
+            chunk_mask = mask
+        if chunk_mask is None:
+            values = chunk
+        else:
+            values = chunk[np.broadcast_to(chunk_mask, chunk.shape)]
+        if values.size == 0:
+            continue
+        count += values.size
+        low = min(low, float(values.min()))
+        high = max(high, float(values.max()))
+        values = values.astype(np.float64).reshape(-1)
+        total += float(values.sum())
+        total_sq += float(np.dot(values, values))
+
+    if count == 0:
+        return ROIStatistics(0, 0.0, None, None, None, None, None)
+    mean = total / count
+    return ROIStatistics(
+        voxels=count,
+        volume_mm3=count * voxel_volume,
+        mean=mean,
+        std=float(np.sqrt(max(total_sq / count - mean * mean, 0.0))),
+        min=low,
+        max=high,
+        extent=(i0, i1 - 1, j0, j1 - 1, k0, k1 - 1),
+    )
+
+
+def roi_key(roi: Dict[str, Any]) -> str:
+    """ROI 描述的规范化字符串（键排序、数值统一为浮点），作为缓存键"""
+    def normalize(value):
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return [normalize(v) for v in value]
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    return json.dumps(normalize(roi), sort_keys=True, separators=(",", ":"))
+
+
+# ROI 统计结果缓存，每条只有几个数值，按固定大小近似计字节
+roi_cache = VolumeCache(4 * 1024 ** 2, sizeof=lambda stats: 256)
+watch_cache("roi", roi_cache)
+
+
+def get_roi_statistics(key: Optional[str], image_data, roi: Dict[str, Any]) -> ROIStatistics:
+    """
+    带缓存的 ROI 统计
+
+    Args:
+        key: 体数据标识（通常为序列目录）；为 None 时不缓存
+        image_data: vtkImageData
+        roi: ROI 描述，见 compute_roi_statistics
+    """
+    def compute(_=None):
+        return compute_roi_statistics(
+            image_data_to_array(image_data), roi, image_data.GetSpacing(), image_data.GetOrigin()
+        )
+
+    if key is None:
+        return compute()
+    return roi_cache.get_or_load(f"{key}|{roi_key(roi)}", compute)
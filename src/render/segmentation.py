@@ -0,0 +1,303 @@
+"""
+阈值 + 连通域分割
+
+在缓存体数据上分块向量化阈值化得到 uint8 掩膜，零拷贝交给 vtkImageConnectivityFilter
+（C++ 单遍标记，按体积排序标号）求三维连通域，保留最大的若干个 / 不小于给定体素数 / 包含种子点的连通域。
+结果掩膜按位压缩（np.packbits，每体素 1 bit）后按 (体数据, 参数) 缓存。
+
+显示方式二选一：
+- overlay：掩膜作为第二个 uint8 体数据叠加显示（单色半透明）；
+- mask：主体数据替换为掩膜外置为背景值的副本，沿用原有传输函数，只显示被选中的结构。
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from core.metrics import watch_cache
+from core.tracing import tracer
+from render.numpy_bridge import array_to_image_data, array_to_vtk_points, image_data_to_array, vtk_to_array
+from render.volume_cache import VolumeCache
+from render.volume_stats import CHUNK_VOXELS, TISSUE_BANDS
+
+SEGMENTATION_MODES = ("overlay", "mask")
+
+
+@dataclass
+class Segmentation:
+    """分割结果：按位压缩的掩膜与各保留连通域的体素数"""
+
+    shape: Tuple[int, int, int]
+    spacing: Tuple[float, float, float]
+    origin: Tuple[float, float, float]
+    threshold: Tuple[Optional[float], Optional[float]]
+    packed: np.ndarray = field(repr=False)
+    voxels: int
+    # 阈值化后的连通域总数（不小于 min_voxels 的）
+    components: int
+    # 保留的连通域体素数，从大到小
+    kept_sizes: List[int] = field(default_factory=list)
+
+    @property
+    def nbytes(self) -> int:
+        return self.packed.nbytes
+
+    def mask(self) -> np.ndarray:
+        """解压为 (z, y, x) 的 uint8 掩膜（0 / 1）"""
+        count = self.shape[0] * self.shape[1] * self.shape[2]
+        return np.unpackbits(self.packed, count=count).reshape(self.shape)
+
+    def to_dict(self) -> Dict[str, Any]:
+        voxel_volume = abs(self.spacing[0] * self.spacing[1] * self.spacing[2])
+        return {
+            "threshold": list(self.threshold),
+            "voxels": self.voxels,
+            "volume_mm3": self.voxels * voxel_volume,
+            "components": self.components,
+            "kept_sizes": self.kept_sizes,
+            "mask_bytes": self.nbytes,
+        }
+
+
+def resolve_threshold(low: Optional[float] = None, high: Optional[float] = None,
+                      preset: Optional[str] = None) -> Tuple[Optional[float], Optional[float]]:
+    """阈值区间 [low, high)；preset 取 TISSUE_BANDS 中的组织名（如 bone / contrast），None 表示不设该侧边界"""
+    if preset is not None:
+        if preset not in TISSUE_BANDS:
+            raise ValueError(f"未知的阈值预设: {preset}，可选 {list(TISSUE_BANDS)}")
+        low, high = TISSUE_BANDS[preset]
+    low = None if low is None or low == -float("inf") else float(low)
+    high = None if high is None or high == float("inf") else float(high)
+    if low is None and high is None:
+        raise ValueError("需要提供阈值 low / high 或 preset")
+    if low is not None and high is not None and low >= high:
+        raise ValueError(f"阈值下限 {low} 不小于上限 {high}")
+    return low, high
+
+
+def threshold_mask(array: np.ndarray, low: Optional[float], high: Optional[float],
+                   chunk_voxels: int = CHUNK_VOXELS) -> np.ndarray:
+    """分块阈值化，low <= v < high 为 1，返回与 array 同形状的 uint8 掩膜"""
+    mask = np.empty(array.shape, dtype=np.uint8)
+    flat_in = array.reshape(-1)
+    flat_out = mask.reshape(-1)
+    for start in range(0, flat_in.size, chunk_voxels):
+        chunk = flat_in[start:start + chunk_voxels]
+        selected = np.ones(chunk.shape, dtype=bool)
+        if low is not None:
+            selected &= chunk >= low
+        if high is not None:
+            selected &= chunk < high
+        flat_out[start:start + chunk_voxels] = selected
+    return mask
+
+
+def _seed_polydata(seeds: Sequence[Sequence[float]]):
+    from vtkmodules.vtkCommonDataModel import vtkPolyData
+
+    polydata = vtkPolyData()
+    polydata.SetPoints(array_to_vtk_points(np.ascontiguousarray(seeds, dtype=np.float64).reshape(-1, 3)))
+    return polydata
+
+
+def segment_volume(array: np.ndarray, low: Optional[float] = None, high: Optional[float] = None,
+                   spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                   origin: Sequence[float] = (0.0, 0.0, 0.0),
+                   keep_largest: Optional[int] = None, min_voxels: int = 1,
+                   seeds: Optional[Sequence[Sequence[float]]] = None) -> Segmentation:
+    """
+    阈值化并按连通域筛选
+
+    Args:
+        array: (z, y, x) 体素数组
+        low, high: 阈值区间 [low, high)，None 表示不设该侧边界
+        spacing: 体素间距 (x, y, z)
+        origin: 原点 (x, y, z)
+        keep_largest: 只保留体素数最多的若干个连通域，None 为全部保留
+        min_voxels: 小于该体素数的连通域直接丢弃（去噪）
+        seeds: 种子点（世界坐标），指定时只保留包含种子点的连通域
+
+    Returns:
+        Segmentation
+    """
+    from vtkmodules.vtkImagingMorphological import vtkImageConnectivityFilter
+
+    if array.ndim != 3:
+        raise ValueError(f"体数据需为三维数组，实际为 {array.ndim} 维")
+    with tracer.span("segment.threshold", "segment"):
+        mask = threshold_mask(array, low, high)
+
+    image = array_to_image_data(mask, spacing, origin, name="mask")
+    connectivity = vtkImageConnectivityFilter()
+    connectivity.SetInputData(image)
+    connectivity.SetScalarRange(1, 1)
+    # 标号按连通域体积排序：1 为最大
+    connectivity.SetLabelModeToSizeRank()
+    connectivity.SetLabelScalarTypeToInt()
+    connectivity.SetSizeRange(max(1, int(min_voxels)), np.iinfo(np.int64).max)
+    if seeds:
+        connectivity.SetSeedData(_seed_polydata(seeds))
+        connectivity.SetExtractionModeToSeededRegions()
+    else:
+        connectivity.SetExtractionModeToAllRegions()
+    with tracer.span("vtk.Update", "segment"):
+        connectivity.Update()
+
+    sizes = vtk_to_array(connectivity.GetExtractedRegionSizes()).astype(np.int64)
+    sizes = np.sort(sizes)[::-1]
+    labels = image_data_to_array(connectivity.GetOutput())
+    if keep_largest is not None and keep_largest < len(sizes):
+        # 种子模式下标号仍按体积排序，保留前 keep_largest 个
+        kept = sizes[:keep_largest]
+        for z in range(labels.shape[0]):
+            mask[z] = (labels[z] > 0) & (labels[z] <= keep_largest)
+    else:
+        kept = sizes
+        np.greater(labels, 0, out=mask, casting="unsafe")
+    del labels
+    connectivity.RemoveAllInputs()
+
+    return Segmentation(
+        shape=tuple(array.shape),
+        spacing=tuple(float(s) for s in spacing),
+        origin=tuple(float(o) for o in origin),
+        threshold=(low, high),
+        packed=np.packbits(mask.reshape(-1)),
+        voxels=int(kept.sum()),
+        components=int(connectivity.GetNumberOfExtractedRegions()),
+        kept_sizes=[int(s) for s in kept],
+    )
+
+
+# 分割结果缓存，按压缩后的掩膜字节数计
+segmentation_cache = VolumeCache(Config.SEGMENTATION_CACHE_MAX_BYTES, sizeof=lambda seg: seg.nbytes + 1024)
+watch_cache("segmentation", segmentation_cache)
+
+
+def get_segmentation(key: Optional[str], image_data, params: Dict[str, Any]) -> Segmentation:
+    """
+    带缓存的分割
+
+    Args:
+        key: 体数据标识；为 None 时不缓存
+        image_data: vtkImageData
+        params: {"low", "high"} 或 {"preset"}，以及可选的 keep_largest、min_voxels、seeds
+    """
+    low, high = resolve_threshold(params.get("low"), params.get("high"), params.get("preset"))
+    keep_largest = params.get("keep_largest")
+    options = {
+        "keep_largest": int(keep_largest) if keep_largest is not None else None,
+        "min_voxels": int(params.get("min_voxels", 1)),
+        "seeds": [[float(v) for v in seed] for seed in params.get("seeds") or []],
+    }
+
+    def compute(_=None):
+        return segment_volume(
+            image_data_to_array(image_data), low, high,
+            image_data.GetSpacing(), image_data.GetOrigin(), **options,
+        )
+
+    if key is None:
+        return compute()
+    cache_key = f"{key}|segment|" + json.dumps({"low": low, "high": high, **options}, sort_keys=True)
+    return segmentation_cache.get_or_load(cache_key, compute)
+
+
+class SegmentationLayer:
+    """
+    在 renderer 上显示分割结果，作为会话资源管理（实现 release / memory_bytes）
+
+    Args:
+        segmentation: 分割结果
+        renderer: 目标 renderer
+        volume: 主体渲染 vtkVolume，mask 模式下替换其 mapper 输入
+        mode: overlay / mask
+        color: overlay 模式的颜色
+        opacity: overlay 模式的不透明度
+    """
+
+    def __init__(self, segmentation: Segmentation, renderer, volume=None, mode: str = "overlay",
+                 color: Sequence[float] = (1.0, 0.3, 0.2), opacity: float = 0.5):
+        if mode not in SEGMENTATION_MODES:
+            raise ValueError(f"未知的分割显示方式: {mode}，可选 {SEGMENTATION_MODES}")
+        if mode == "mask" and volume is None:
+            raise ValueError("mask 模式需要提供主体渲染 volume")
+        self.segmentation = segmentation
+        self.renderer = renderer
+        self.mode = mode
+        self.image_data = None
+        self.overlay = None
+        self._target_volume = None
+        self._original_input = None
+        if mode == "overlay":
+            self._add_overlay(color, opacity)
+        else:
+            self._apply_mask(volume)
+
+    def _add_overlay(self, color, opacity) -> None:
+        from vtkmodules.vtkCommonDataModel import vtkPiecewiseFunction
+        from vtkmodules.vtkRenderingCore import vtkColorTransferFunction, vtkVolume, vtkVolumeProperty
+        from vtkmodules.vtkRenderingVolumeOpenGL2 import vtkSmartVolumeMapper
+
+        seg = self.segmentation
+        self.image_data = array_to_image_data(seg.mask(), seg.spacing, seg.origin, name="label")
+        mapper = vtkSmartVolumeMapper()
+        mapper.SetInputData(self.image_data)
+        color_func = vtkColorTransferFunction()
+        color_func.AddRGBPoint(0, 0.0, 0.0, 0.0)
+        color_func.AddRGBPoint(1, *color)
+        opacity_func = vtkPiecewiseFunction()
+        opacity_func.AddPoint(0, 0.0)
+        opacity_func.AddPoint(1, opacity)
+        volume_property = vtkVolumeProperty()
+        volume_property.SetColor(color_func)
+        volume_property.SetScalarOpacity(opacity_func)
+        volume_property.SetInterpolationTypeToNearest()
+        self.overlay = vtkVolume()
+        self.overlay.SetMapper(mapper)
+        self.overlay.SetProperty(volume_property)
+        self.renderer.AddVolume(self.overlay)
+
+    def _apply_mask(self, volume) -> None:
+        mapper = volume.GetMapper()
+        source = mapper.GetInput()
+        array = image_data_to_array(source)
+        if array.shape != self.segmentation.shape:
+            raise ValueError("分割结果与当前体数据尺寸不一致")
+        background = array.min()
+        mask = self.segmentation.mask()
+        masked = np.empty_like(array)
+        for z in range(array.shape[0]):
+            np.copyto(masked[z], np.where(mask[z], array[z], background))
+        self.image_data = array_to_image_data(masked, source.GetSpacing(), source.GetOrigin())
+        self._target_volume = volume
+        self._original_input = source
+        mapper.SetInputData(self.image_data)
+
+    def memory_bytes(self) -> int:
+        image_bytes = self.image_data.GetActualMemorySize() * 1024 if self.image_data is not None else 0
+        return self.segmentation.nbytes + image_bytes
+
+    def vtk_objects(self):
+        return [obj for obj in (self.overlay, self.image_data) if obj is not None]
+
+    def release(self) -> None:
+        render_window = self.renderer.GetRenderWindow()
+        if self.overlay is not None:
+            self.renderer.RemoveVolume(self.overlay)
+            mapper = self.overlay.GetMapper()
+            if render_window is not None:
+                mapper.ReleaseGraphicsResources(render_window)
+            mapper.RemoveAllInputConnections(0)
+            self.overlay = None
+        if self._target_volume is not None:
+            # 主体数据的 mapper 可能已随会话释放
+            mapper = self._target_volume.GetMapper()
+            if mapper is not None and mapper.GetInput() is self.image_data:
+                mapper.SetInputData(self._original_input)
+            self._target_volume = None
+            self._original_input = None
+        self.image_data = None
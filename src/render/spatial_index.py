@@ -0,0 +1,285 @@
+"""
+点云与体素的空间索引
+
+UniformGridIndex 把点按所在网格单元排序（单元大小按平均每格点数确定），每个单元的点在
+排序后的下标数组中连续存放，查询时只访问与查询区域相交的单元，全部用 NumPy 向量化完成：
+
+- 盒查询 / 半径查询：收集相交单元内的点后精确过滤；
+- k 近邻：从一个单元大小的半径开始逐步扩大，直到半径内至少有 k 个点；
+- 屏幕拾取：把像素坐标反投影为视线，沿视线收集单元，取距视线足够近且离相机最近的点。
+
+体数据不需要建索引，world_to_voxel / voxel_to_world 直接由原点与间距换算。
+"""
+
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils import calculate_bounding_box
+
+# 构建时分块计算单元编号，限制临时数组大小
+_CHUNK_POINTS = 1 << 20
+
+# 视线查询首段的采样点数（半个单元一个采样点），之后逐段翻倍
+_RAY_SEGMENT = 8
+
+
+class UniformGridIndex:
+    """
+    均匀网格空间索引
+
+    Args:
+        points: N×3 点坐标（只保存引用，不复制）
+        bounds: 已知的包围盒，省去一次扫描
+        points_per_cell: 平均每个单元的目标点数
+    """
+
+    def __init__(self, points: np.ndarray, bounds: Optional[Sequence[float]] = None,
+                 points_per_cell: float = 8.0):
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError(f"点坐标需为 N×3 数组，实际形状为 {points.shape}")
+        self.points = points
+        if bounds is None:
+            bounds = calculate_bounding_box(points)
+        self.origin = np.array(bounds[0::2], dtype=np.float64)
+        extent = np.maximum(np.array(bounds[1::2], dtype=np.float64) - self.origin, 1e-9)
+
+        num_cells = max(1, len(points) / points_per_cell)
+        # 扁平或线状点云只按有厚度的轴估计单元大小，避免单元尺寸趋近 0
+        spread = extent[extent > extent.max() * 1e-3]
+        self.cell_size = (float(np.prod(spread)) / num_cells) ** (1.0 / len(spread))
+        self.dims = np.ceil(extent / self.cell_size).astype(np.int64).clip(1)
+
+        index_dtype = np.int32 if len(points) < 2 ** 31 else np.int64
+        keys = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), _CHUNK_POINTS):
+            keys[start:start + _CHUNK_POINTS] = self._cell_keys(points[start:start + _CHUNK_POINTS])
+        # 排序后的点下标，以及每个单元在其中的起止位置
+        self.order = np.argsort(keys, kind="stable").astype(index_dtype)
+        counts = np.bincount(keys, minlength=int(np.prod(self.dims)))
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        # 视线查询的邻域偏移，按外扩格数缓存
+        self._offsets = {}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    @property
+    def nbytes(self) -> int:
+        return self.order.nbytes + self.offsets.nbytes
+
+    def _cell_coords(self, points: np.ndarray) -> np.ndarray:
+        coords = np.floor((np.asarray(points, dtype=np.float64) - self.origin) / self.cell_size)
+        return np.clip(coords, 0, self.dims - 1).astype(np.int64)
+
+    def _cell_keys(self, points: np.ndarray) -> np.ndarray:
+        ijk = self._cell_coords(points)
+        return ijk[:, 0] + self.dims[0] * (ijk[:, 1] + self.dims[1] * ijk[:, 2])
+
+    def _gather(self, cell_keys: np.ndarray) -> np.ndarray:
+        """若干单元内全部点的下标"""
+        starts = self.offsets[cell_keys]
+        lengths = self.offsets[cell_keys + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # 把多个 [start, end) 区间拼接成一个下标数组
+        shift = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return self.order[shift + np.arange(total)]
+
+    def _box_cells(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        lo = self._cell_coords(lower[None, :])[0]
+        hi = self._cell_coords(upper[None, :])[0]
+        i, j, k = np.meshgrid(*(np.arange(a, b + 1) for a, b in zip(lo, hi)), indexing="ij")
+        return (i + self.dims[0] * (j + self.dims[1] * k)).ravel()
+
+    def box_query(self, lower: Sequence[float], upper: Sequence[float]) -> np.ndarray:
+        """轴对齐盒 [lower, upper] 内的点下标"""
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        if np.any(upper < lower):
+            raise ValueError("upper 不能小于 lower")
+        candidates = self._gather(self._box_cells(lower, upper))
+        pts = self.points[candidates]
+        inside = np.all((pts >= lower) & (pts <= upper), axis=1)
+        return candidates[inside]
+
+    def radius_query(self, center: Sequence[float], radius: float,
+                     sort: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        半径内的点
+
+        Returns:
+            (点下标, 距离)，sort 为 True 时按距离升序
+        """
+        center = np.asarray(center, dtype=np.float64)
+        candidates = self._gather(self._box_cells(center - radius, center + radius))
+        distances = np.linalg.norm(self.points[candidates] - center, axis=1)
+        mask = distances <= radius
+        indices, distances = candidates[mask], distances[mask]
+        if sort:
+            order = np.argsort(distances, kind="stable")
+            indices, distances = indices[order], distances[order]
+        return indices, distances
+
+    def knn(self, point: Sequence[float], k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k 近邻
+
+        Returns:
+            (点下标, 距离)，按距离升序，点数不足 k 时返回全部
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        point = np.asarray(point, dtype=np.float64)
+        # 查询点可能在包围盒外，半径从点到包围盒的距离起步
+        outside = np.maximum(np.maximum(self.origin - point, point - (self.origin + self.dims * self.cell_size)), 0)
+        radius = float(np.linalg.norm(outside)) + self.cell_size
+        limit = float(np.linalg.norm(self.dims * self.cell_size)) + radius
+        while True:
+            indices, distances = self.radius_query(point, radius)
+            if len(indices) >= k or radius > limit:
+                break
+            radius *= 2
+        nearest = np.argsort(distances, kind="stable")[:k]
+        return indices[nearest], distances[nearest]
+
+    def _ray_cells(self, start: np.ndarray, direction: np.ndarray, t: np.ndarray,
+                   tolerance: float) -> np.ndarray:
+        """视线上参数 t 处采样点附近、且可能含有距视线 tolerance 以内点的单元"""
+        reach = max(1, int(math.ceil(tolerance / self.cell_size)))
+        offsets = self._offsets.get(reach)
+        if offsets is None:
+            span = np.arange(-reach, reach + 1)
+            offsets = np.stack(np.meshgrid(span, span, span, indexing="ij"), -1).reshape(-1, 3)
+            self._offsets[reach] = offsets
+        base = self._cell_coords(start + t[:, None] * direction)
+        cells = np.clip((base[:, None, :] + offsets).reshape(-1, 3), 0, self.dims - 1)
+        keys = np.unique(cells[:, 0] + self.dims[0] * (cells[:, 1] + self.dims[1] * cells[:, 2]))
+        # 单元中心到视线的距离超过 tolerance + 半对角线的单元不可能含有命中点
+        ijk = np.stack([keys % self.dims[0], keys // self.dims[0] % self.dims[1],
+                        keys // (self.dims[0] * self.dims[1])], axis=1)
+        rel = self.origin + (ijk + 0.5) * self.cell_size - start
+        along = np.clip(rel @ direction / (direction @ direction), 0.0, 1.0)
+        offset = rel - along[:, None] * direction
+        limit = tolerance + self.cell_size * 0.8661
+        return keys[np.einsum("ij,ij->i", offset, offset) <= limit * limit]
+
+    def _ray_hits(self, candidates: np.ndarray, start: np.ndarray, direction: np.ndarray,
+                  tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        rel = self.points[candidates] - start
+        t = np.clip(rel @ direction / (direction @ direction), 0.0, 1.0)
+        offset = rel - t[:, None] * direction
+        mask = np.einsum("ij,ij->i", offset, offset) <= tolerance * tolerance
+        return candidates[mask], t[mask]
+
+    def ray_query(self, start: Sequence[float], end: Sequence[float], tolerance: float,
+                  first_only: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        距线段 start → end 不超过 tolerance 的点
+
+        从起点开始分段收集单元；first_only 为 True 时找到命中后只再多看一段就停止，
+        拾取时通常在视线前段就能命中，不必遍历整条视线。
+
+        Returns:
+            (点下标, 沿线段的参数 t ∈ [0, 1])，按 t 升序（离起点近的在前）
+        """
+        start = np.asarray(start, dtype=np.float64)
+        direction = np.asarray(end, dtype=np.float64) - start
+        length = float(np.linalg.norm(direction))
+        if length == 0:
+            indices, _ = self.radius_query(start, tolerance)
+            return indices, np.zeros(len(indices))
+        # 视线先裁剪到（按 tolerance 外扩的）网格范围内，近 / 远裁剪面通常远在点云之外
+        clipped = self._clip_segment(start, direction, tolerance)
+        if clipped is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        t_enter, t_exit = clipped
+        length *= t_exit - t_enter
+        # 按半个单元步长采样视线
+        steps = max(2, int(math.ceil(length / (self.cell_size * 0.5))) + 1)
+        samples = np.linspace(t_enter, t_exit, steps)
+        hit_indices, hit_t = [], []
+        hit_segment = None
+        begin, size, segment = 0, _RAY_SEGMENT, 0
+        while begin < steps:
+            if hit_segment is not None and segment > hit_segment + 1:
+                break
+            keys = self._ray_cells(start, direction, samples[begin:begin + size], tolerance)
+            indices, t = self._ray_hits(self._gather(keys), start, direction, tolerance)
+            if len(indices):
+                hit_indices.append(indices)
+                hit_t.append(t)
+                if first_only and hit_segment is None:
+                    hit_segment = segment
+            # 段长逐段翻倍：近处的命中很快返回，长视线也只需要对数级的段数
+            begin, size, segment = begin + size, size * 2, segment + 1
+        if not hit_indices:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # 相邻段共享边界单元，去掉重复命中
+        indices, first = np.unique(np.concatenate(hit_indices), return_index=True)
+        t = np.concatenate(hit_t)[first]
+        order = np.argsort(t, kind="stable")
+        return indices[order], t[order]
+
+    def _clip_segment(self, start: np.ndarray, direction: np.ndarray,
+                      margin: float) -> Optional[Tuple[float, float]]:
+        """线段 start + t * direction（t ∈ [0, 1]）与外扩 margin 后网格范围相交的参数区间"""
+        lower = self.origin - margin
+        upper = self.origin + self.dims * self.cell_size + margin
+        t_enter, t_exit = 0.0, 1.0
+        for axis in range(3):
+            if direction[axis] == 0:
+                if not lower[axis] <= start[axis] <= upper[axis]:
+                    return None
+                continue
+            t0 = (lower[axis] - start[axis]) / direction[axis]
+            t1 = (upper[axis] - start[axis]) / direction[axis]
+            t_enter = max(t_enter, min(t0, t1))
+            t_exit = min(t_exit, max(t0, t1))
+        return (t_enter, t_exit) if t_enter <= t_exit else None
+
+    def pick(self, renderer, x: float, y: float, tolerance: Optional[float] = None) -> Optional[int]:
+        """
+        按屏幕坐标拾取离相机最近的点
+
+        Args:
+            renderer: vtkRenderer
+            x, y: 显示坐标（像素，原点在左下角）
+            tolerance: 距视线的容差（世界坐标），默认为单元大小的一半
+
+        Returns:
+            点下标，没有命中时返回 None
+        """
+        near, far = display_to_ray(renderer, x, y)
+        tolerance = tolerance if tolerance is not None else self.cell_size * 0.5
+        indices, _ = self.ray_query(near, far, tolerance, first_only=True)
+        return int(indices[0]) if len(indices) else None
+
+
+def display_to_ray(renderer, x: float, y: float) -> Tuple[np.ndarray, np.ndarray]:
+    """显示坐标对应视线在近、远裁剪面上的两个世界坐标点"""
+    ends = []
+    for z in (0.0, 1.0):
+        renderer.SetDisplayPoint(x, y, z)
+        renderer.DisplayToWorld()
+        wx, wy, wz, w = renderer.GetWorldPoint()
+        ends.append(np.array([wx, wy, wz]) / (w if w else 1.0))
+    return ends[0], ends[1]
+
+
+def world_to_voxel(image_data, points: np.ndarray) -> np.ndarray:
+    """世界坐标转为最近体素的 (i, j, k) 下标，超出范围的截断到边界"""
+    origin = np.array(image_data.GetOrigin())
+    spacing = np.array(image_data.GetSpacing())
+    dims = np.array(image_data.GetDimensions())
+    ijk = np.rint((np.atleast_2d(points) - origin) / spacing).astype(np.int64)
+    return np.clip(ijk, 0, dims - 1)
+
+
+def voxel_to_world(image_data, ijk: np.ndarray) -> np.ndarray:
+    """体素下标 (i, j, k) 转为世界坐标"""
+    return np.array(image_data.GetOrigin()) + np.atleast_2d(ijk) * np.array(image_data.GetSpacing())
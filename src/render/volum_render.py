@@ -1,4 +1,18 @@
-import vtk
+from vtkmodules.vtkCommonDataModel import vtkPiecewiseFunction
+from vtkmodules.vtkIOImage import vtkDICOMImageReader
+from vtkmodules.vtkInteractionStyle import vtkInteractorStyleTrackballCamera
+from vtkmodules.vtkRenderingCore import (
+    vtkColorTransferFunction,
+    vtkLight,
+    vtkRenderer,
+    vtkRenderWindow,
+    vtkRenderWindowInteractor,
+    vtkVolume,
+    vtkVolumeProperty,
+)
+from vtkmodules.vtkRenderingVolume import vtkGPUVolumeRayCastMapper
+import vtkmodules.vtkRenderingOpenGL2  # noqa: F401  渲染窗口的 OpenGL 实现
+import vtkmodules.vtkRenderingVolumeOpenGL2  # noqa: F401  GPU 体渲染 mapper 的 OpenGL 实现
 import os
 from functools import lru_cache
 
@@ -12,7 +26,7 @@ def read_dicom_series(dicom_dir):
     if not files:
         raise ValueError(f"DICOM 目录 {dicom_dir} 不包含 .dcm 文件")
     
-    reader = vtk.vtkDICOMImageReader()
+    reader = vtkDICOMImageReader()
     reader.SetDirectoryName(dicom_dir)
     reader.Update()
     image_data = reader.GetOutput()
@@ -30,17 +44,17 @@ class VolumRender:
             raise ValueError("Server 对象为 None")
         self.server = server
         self.data_source = data_source
-        self.renderer = vtk.vtkRenderer()
-        self.render_window = vtk.vtkRenderWindow()
+        self.renderer = vtkRenderer()
+        self.render_window = vtkRenderWindow()
         self.render_window.AddRenderer(self.renderer)
         
-        self.interactor = vtk.vtkRenderWindowInteractor()
+        self.interactor = vtkRenderWindowInteractor()
         self.interactor.SetRenderWindow(self.render_window)
         self.interactor.Initialize()
         self.render_window.SetOffScreenRendering(1)
         
         # 启用交互样式
-        self.interactor_style = vtk.vtkInteractorStyleTrackballCamera()
+        self.interactor_style = vtkInteractorStyleTrackballCamera()
         self.interactor.SetInteractorStyle(self.interactor_style)
         
         self.renderer.SetBackground(0.0, 0.0, 0.1)  # 更暗背景，提升对比度
@@ -49,10 +63,10 @@ class VolumRender:
 
     def setup_pipeline(self):
         # 配置体渲染管道
-        volume_mapper = vtk.vtkGPUVolumeRayCastMapper()
+        volume_mapper = vtkGPUVolumeRayCastMapper()
         volume_mapper.SetInputData(self.image_data)
 
-        volume_property = vtk.vtkVolumeProperty()
+        volume_property = vtkVolumeProperty()
         volume_property.ShadeOn()
         volume_property.SetInterpolationTypeToLinear()
 
@@ -61,7 +75,7 @@ class VolumRender:
         print(f"数据标量范围: {scalar_range}")
 
         # 优化转移函数（增强粉红和自然肤色）
-        color_func = vtk.vtkColorTransferFunction()
+        color_func = vtkColorTransferFunction()
         color_func.AddRGBPoint(scalar_range[0], 0.0, 0.0, 0.0)     # 最低值（黑色）
         color_func.AddRGBPoint(-500, 0.1, 0.1, 0.1)               # 空气/肺部（极暗灰）
         color_func.AddRGBPoint(0, 0.9, 0.8, 0.8)                  # 软组织（浅粉）
@@ -71,7 +85,7 @@ class VolumRender:
         color_func.AddRGBPoint(scalar_range[1], 0.9, 0.6, 0.6)    # 最高值（淡粉）
         volume_property.SetColor(color_func)
 
-        opacity_func = vtk.vtkPiecewiseFunction()
+        opacity_func = vtkPiecewiseFunction()
         opacity_func.AddPoint(scalar_range[0], 0.0)               # 最低值透明
         opacity_func.AddPoint(-500, 0.15)                        # 空气适中不透明
         opacity_func.AddPoint(0, 0.6)                            # 软组织高不透明
@@ -82,12 +96,12 @@ class VolumRender:
         volume_property.SetScalarOpacity(opacity_func)
 
         # 创建体对象
-        volume = vtk.vtkVolume()
+        volume = vtkVolume()
         volume.SetMapper(volume_mapper)
         volume.SetProperty(volume_property)
 
         # 优化光源
-        light = vtk.vtkLight()
+        light = vtkLight()
         light.SetPosition(1, 1, 1)  # 更自然的光源位置
         light.SetIntensity(1.5)     # 增加光强
         self.renderer.AddLight(light)
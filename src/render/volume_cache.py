@@ -0,0 +1,159 @@
+"""
+体数据缓存
+
+按字节数做 LRU 淘汰的进程内缓存，交互加载与后台预取共用，
+并统计命中 / 未命中以及预取条目的实际使用情况。
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from core.metrics import watch_cache
+
+logger = logging.getLogger(__name__)
+
+
+def image_data_bytes(image_data) -> int:
+    """vtkImageData 实际占用内存（字节）"""
+    return image_data.GetActualMemorySize() * 1024
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    nbytes: int
+    prefetched: bool = False
+    used: bool = False
+
+
+class VolumeCache:
+    """
+    体数据 LRU 缓存
+
+    Args:
+        max_bytes: 缓存容量上限（字节），超出后淘汰最久未使用的条目
+        sizeof: 计算条目字节数的函数
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = image_data_bytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        # 每个 key 一把加载锁，避免交互加载与预取重复读盘
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+        self.prefetch_used = 0
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            self._mark_used(key)
+            return entry.value
+
+    def put(self, key: str, value: Any, prefetched: bool = False) -> None:
+        nbytes = self.sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            entry = CacheEntry(value, nbytes, prefetched)
+            if old is not None:
+                entry.prefetched, entry.used = old.prefetched, old.used
+            elif prefetched:
+                self.prefetched += 1
+            self._entries[key] = entry
+            self._evict(keep=key)
+
+    def get_or_load(self, key: str, loader: Callable[[str], Any],
+                    prefetched: bool = False) -> Any:
+        """命中直接返回，否则调用 loader(key) 加载并放入缓存；预取调用不计入命中统计"""
+        value = self.peek(key) if prefetched else self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # 等锁期间可能已被其他线程加载完成
+            value = self.peek(key)
+            if value is None:
+                value = loader(key)
+                self.put(key, value, prefetched=prefetched)
+            elif not prefetched:
+                self._mark_used(key)
+        with self._lock:
+            self._load_locks.pop(key, None)
+        return value
+
+    def _mark_used(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.prefetched and not entry.used:
+                entry.used = True
+                self.prefetch_used += 1
+
+    def peek(self, key: str) -> Optional[Any]:
+        """查询但不计入命中统计、不改变 LRU 顺序"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else None
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, keep: str) -> None:
+        total = sum(e.nbytes for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, entry = next(iter(self._entries.items()))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            del self._entries[key]
+            total -= entry.nbytes
+            self.evictions += 1
+            logger.info("体数据缓存淘汰 %s (%d bytes)", key, entry.nbytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "prefetched": self.prefetched,
+                "prefetch_used": self.prefetch_used,
+            }
+
+
+# 进程内共享的体数据缓存
+volume_cache = VolumeCache(Config.VOLUME_CACHE_MAX_BYTES)
+watch_cache("volume", volume_cache)
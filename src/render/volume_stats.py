@@ -0,0 +1,168 @@
+"""
+体数据统计服务
+
+每个体数据只扫描一次：用向量化 NumPy 分块计算标量范围、均值 / 标准差、4096 bin 直方图、
+百分位数与各组织 HU 区间的体素数，并与体数据一起缓存。
+自动调窗与传输函数编辑器直接读取统计结果，不再重复扫描体素。
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.metrics import watch_cache
+from render.numpy_bridge import image_data_to_array
+from render.volume_cache import VolumeCache
+
+# 直方图 bin 数
+HISTOGRAM_BINS = 4096
+
+# 每块处理的体素数（约 16M 体素，int16 下 32MB）
+CHUNK_VOXELS = 16 * 1024 * 1024
+
+# 常用组织的 HU 区间 [low, high)
+TISSUE_BANDS: Dict[str, Tuple[float, float]] = {
+    "air": (-float("inf"), -900),
+    "lung": (-900, -500),
+    "fat": (-150, -30),
+    "soft_tissue": (-30, 100),
+    "contrast": (100, 300),
+    "bone": (300, float("inf")),
+}
+
+DEFAULT_PERCENTILES = (0.5, 1, 5, 25, 50, 75, 95, 99, 99.5)
+
+
+@dataclass
+class VolumeStatistics:
+    """单个体数据的统计结果"""
+
+    scalar_range: Tuple[float, float]
+    mean: float
+    std: float
+    voxels: int
+    histogram: List[int] = field(repr=False)
+    percentiles: Dict[str, float] = field(default_factory=dict)
+    tissue_bands: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def bin_width(self) -> float:
+        low, high = self.scalar_range
+        return (high - low) / len(self.histogram) if high > low else 1.0
+
+    def percentile(self, q: float) -> float:
+        """由直方图累计分布求百分位数（精度为一个 bin 宽度）"""
+        counts = np.asarray(self.histogram)
+        target = q / 100.0 * self.voxels
+        index = int(np.searchsorted(np.cumsum(counts), target, side="left"))
+        index = min(index, len(counts) - 1)
+        return float(self.scalar_range[0] + (index + 0.5) * self.bin_width)
+
+    def auto_window_level(self, lower: float = 1.0, upper: float = 99.0) -> Tuple[float, float]:
+        """按百分位数给出自动窗宽窗位 (window, level)"""
+        low = self.percentile(lower)
+        high = self.percentile(upper)
+        return max(high - low, 1.0), (high + low) / 2
+
+    def to_dict(self, include_histogram: bool = True) -> dict:
+        result = asdict(self)
+        if not include_histogram:
+            result.pop("histogram")
+        window, level = self.auto_window_level()
+        result["auto_window"] = {"window": window, "level": level}
+        result["bin_width"] = self.bin_width
+        return result
+
+
+def _chunks(flat: np.ndarray, chunk_voxels: int):
+    for start in range(0, flat.size, chunk_voxels):
+        yield flat[start:start + chunk_voxels]
+
+
+def compute_volume_statistics(array: np.ndarray, bins: int = HISTOGRAM_BINS,
+                              chunk_voxels: int = CHUNK_VOXELS,
+                              percentiles=DEFAULT_PERCENTILES) -> VolumeStatistics:
+    """
+    计算体数据统计
+
+    Args:
+        array: 体素数组（任意形状，内部按一维视图处理，不复制）
+        bins: 直方图 bin 数
+        chunk_voxels: 分块大小，限制临时数组内存
+        percentiles: 需要给出的百分位
+
+    Returns:
+        VolumeStatistics
+    """
+    flat = array.reshape(-1)
+    if flat.size == 0:
+        raise ValueError("体数据为空")
+
+    # 第一遍：范围、和、平方和
+    low, high = float("inf"), -float("inf")
+    total = 0.0
+    total_sq = 0.0
+    for chunk in _chunks(flat, chunk_voxels):
+        low = min(low, float(chunk.min()))
+        high = max(high, float(chunk.max()))
+        values = chunk.astype(np.float64)
+        total += float(values.sum())
+        total_sq += float(np.dot(values, values))
+    mean = total / flat.size
+    std = float(np.sqrt(max(total_sq / flat.size - mean * mean, 0.0)))
+
+    # 第二遍：直方图与组织区间计数
+    scale = bins / (high - low) if high > low else 0.0
+    histogram = np.zeros(bins, dtype=np.int64)
+    band_names = list(TISSUE_BANDS)
+    band_edges = np.array(sorted({e for band in TISSUE_BANDS.values() for e in band}))
+    band_edges = band_edges[np.isfinite(band_edges)]
+    edge_counts = np.zeros(len(band_edges) + 1, dtype=np.int64)
+    for chunk in _chunks(flat, chunk_voxels):
+        values = chunk.astype(np.float32)
+        index = ((values - low) * scale).astype(np.int64)
+        np.clip(index, 0, bins - 1, out=index)
+        histogram += np.bincount(index, minlength=bins)
+        edge_counts += np.bincount(
+            np.searchsorted(band_edges, values, side="right"), minlength=len(band_edges) + 1
+        )
+
+    # 由相邻边界之间的计数累加出每个组织区间（区间可不连续）
+    tissue_bands = {}
+    for name in band_names:
+        band_low, band_high = TISSUE_BANDS[name]
+        first = 0 if not np.isfinite(band_low) else int(np.searchsorted(band_edges, band_low)) + 1
+        last = len(band_edges) if not np.isfinite(band_high) else int(np.searchsorted(band_edges, band_high))
+        tissue_bands[name] = int(edge_counts[first:last + 1].sum())
+
+    stats = VolumeStatistics(
+        scalar_range=(low, high),
+        mean=mean,
+        std=std,
+        voxels=int(flat.size),
+        histogram=histogram.tolist(),
+        tissue_bands=tissue_bands,
+    )
+    stats.percentiles = {str(q): stats.percentile(q) for q in percentiles}
+    return stats
+
+
+# 统计结果缓存，体积很小，按条目数近似计字节
+stats_cache = VolumeCache(64 * 1024 ** 2, sizeof=lambda stats: HISTOGRAM_BINS * 8 + 1024)
+watch_cache("stats", stats_cache)
+
+
+def get_volume_statistics(key: Optional[str], image_data) -> VolumeStatistics:
+    """
+    带缓存的体数据统计
+
+    Args:
+        key: 体数据标识（通常为序列目录）；为 None 时不缓存
+        image_data: vtkImageData
+    """
+    if key is None:
+        return compute_volume_statistics(image_data_to_array(image_data))
+    return stats_cache.get_or_load(
+        key, lambda _: compute_volume_statistics(image_data_to_array(image_data))
+    )
@@ -0,0 +1,135 @@
+"""
+客户端体渲染的一次性体数据传输
+
+本地渲染模式下服务端只下发一次体数据：必要时降采样、量化，再用标准编解码器（zlib）压缩。
+之后旋转、调窗与不透明度调整都在浏览器中完成，服务端只在数据变化时参与。
+"""
+
+import math
+import zlib
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from core.metrics import watch_cache
+from render.numpy_bridge import array_to_image_data, image_data_to_array  # noqa: F401  保持原有导入路径
+from render.volume_cache import VolumeCache
+
+# 默认降采样后单轴最大体素数
+DEFAULT_MAX_DIM = 256
+
+# 编码结果缓存，按 (数据标识, 参数) 共享给同一数据的所有会话
+payload_cache = VolumeCache(512 * 1024 ** 2, sizeof=lambda payload: len(payload["data"]))
+watch_cache("payload", payload_cache)
+
+
+def downsample_factor(dims, max_dim: int) -> int:
+    """单轴最大尺寸不超过 max_dim 所需的整数步长"""
+    return max(1, math.ceil(max(dims) / max_dim))
+
+
+def downsample(array: np.ndarray, factor: int) -> np.ndarray:
+    """按整数步长抽样降采样"""
+    if factor <= 1:
+        return array
+    return np.ascontiguousarray(array[::factor, ::factor, ::factor])
+
+
+def quantize(array: np.ndarray, bits: int = 8) -> Tuple[np.ndarray, float, float]:
+    """
+    线性量化到 uint8 / uint16
+
+    Args:
+        array: 输入数组
+        bits: 8 或 16
+
+    Returns:
+        (量化数组, scale, offset)，原值 ≈ q * scale + offset
+    """
+    if bits not in (8, 16):
+        raise ValueError("bits 只支持 8 或 16")
+    dtype = np.uint8 if bits == 8 else np.uint16
+    levels = (1 << bits) - 1
+    low = float(array.min())
+    high = float(array.max())
+    scale = (high - low) / levels if high > low else 1.0
+    quantized = np.empty(array.shape, dtype=dtype)
+    # 分块量化，避免为整个体积分配 float64 临时数组
+    for z in range(0, array.shape[0], 16):
+        block = (array[z:z + 16].astype(np.float32) - low) / scale
+        np.rint(block, out=block)
+        np.clip(block, 0, levels, out=block)
+        quantized[z:z + 16] = block
+    return quantized, scale, low
+
+
+def encode_volume_payload(image_data, max_dim: int = DEFAULT_MAX_DIM, bits: int = 8,
+                          level: int = 6) -> Dict[str, Any]:
+    """
+    把体数据编码为一次性传输的负载
+
+    Args:
+        image_data: vtkImageData
+        max_dim: 降采样后单轴最大体素数
+        bits: 量化位数（8 / 16）
+        level: zlib 压缩级别
+
+    Returns:
+        负载字典，data 为 zlib 压缩后的量化体素（z, y, x 顺序，x 变化最快）
+    """
+    array = image_data_to_array(image_data)
+    factor = downsample_factor(array.shape, max_dim)
+    reduced = downsample(array, factor)
+    quantized, scale, offset = quantize(reduced, bits)
+    raw = quantized.tobytes()
+    spacing = [s * factor for s in image_data.GetSpacing()]
+    nz, ny, nx = quantized.shape
+    return {
+        "dimensions": [nx, ny, nz],
+        "spacing": spacing,
+        "origin": list(image_data.GetOrigin()),
+        "dtype": quantized.dtype.name,
+        "scale": scale,
+        "offset": offset,
+        "codec": "zlib",
+        "raw_bytes": len(raw),
+        "data": zlib.compress(raw, level),
+    }
+
+
+def decode_volume_payload(payload: Dict[str, Any]) -> np.ndarray:
+    """解码负载，返回 (z, y, x) 的 float32 数组（客户端参考实现）"""
+    if payload["codec"] != "zlib":
+        raise ValueError(f"不支持的编码: {payload['codec']}")
+    nx, ny, nz = payload["dimensions"]
+    quantized = np.frombuffer(zlib.decompress(payload["data"]), dtype=payload["dtype"])
+    return quantized.reshape(nz, ny, nx).astype(np.float32) * payload["scale"] + payload["offset"]
+
+
+def get_volume_payload(key: str, image_data, max_dim: int = DEFAULT_MAX_DIM,
+                       bits: int = 8) -> Dict[str, Any]:
+    """带缓存的 encode_volume_payload，key 通常为序列目录"""
+    cache_key = f"{key}|{max_dim}|{bits}"
+    return payload_cache.get_or_load(
+        cache_key, lambda _: encode_volume_payload(image_data, max_dim, bits)
+    )
+
+
+def make_local_image_data(image_data, max_dim: int = DEFAULT_MAX_DIM):
+    """
+    构造供浏览器本地渲染的精简 vtkImageData
+
+    降采样后保持原有数值域（CT 为 int16），这样可与服务端共用同一套传输函数；
+    非整型数据量化为 int16 以减小传输量。无需降采样与转换时直接共享原体数据的内存。
+    """
+    array = image_data_to_array(image_data)
+    factor = downsample_factor(array.shape, max_dim)
+    reduced = downsample(array, factor)
+    if reduced.dtype.kind == "f" or reduced.dtype.itemsize > 2:
+        reduced = np.clip(np.rint(reduced), -32768, 32767).astype(np.int16)
+
+    return array_to_image_data(
+        reduced,
+        spacing=[s * factor for s in image_data.GetSpacing()],
+        origin=image_data.GetOrigin(),
+    )
@@ -199,12 +199,13 @@ def calculate_bounding_box(points: np.ndarray) -> List[float]:
     return [x_min, x_max, y_min, y_max, z_min, z_max]
 
 
-def normalize_points(points: np.ndarray) -> np.ndarray:
+def normalize_points(points: np.ndarray, bbox: Optional[List[float]] = None) -> np.ndarray:
     """
     标准化点云数据到单位立方体
     
     Args:
         points: 点云数组
+        bbox: 已知的边界框，省去一次扫描
         
     Returns:
         标准化后的点云数组
@@ -213,7 +214,8 @@ def normalize_points(points: np.ndarray) -> np.ndarray:
         return points
     
     # 计算边界框
-    bbox = calculate_bounding_box(points)
+    if bbox is None:
+        bbox = calculate_bounding_box(points)
     
     # 计算缩放因子
     scale = max(bbox[1] - bbox[0], bbox[3] - bbox[2], bbox[5] - bbox[4])
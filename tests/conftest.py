@@ -0,0 +1,10 @@
+"""
+pytest 公共配置：模块以 src 为根目录导入（与 `core.trame_app` 的导入方式一致）
+"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,77 @@
+"""
+离线批量渲染测试
+"""
+
+import os
+
+import pytest
+
+from core.batch_render import (
+    BatchResult,
+    render_batch,
+    resolve_tf_preset,
+    split_chunks,
+    turntable_poses,
+    validate_pose,
+)
+
+
+def test_split_chunks_contiguous():
+    chunks = split_chunks(10, 3)
+    assert [list(c) for c in chunks] == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert len(split_chunks(2, 8)) == 2
+    assert [list(c) for c in split_chunks(3, 0)] == [[0, 1, 2]]
+
+
+def test_poses_and_presets():
+    poses = turntable_poses(4, elevation=15)
+    assert [p["azimuth"] for p in poses] == [0.0, 90.0, 180.0, 270.0]
+    assert all(p["elevation"] == 15 for p in poses)
+    with pytest.raises(ValueError):
+        turntable_poses(0)
+    with pytest.raises(ValueError):
+        validate_pose({"azimuth": 10, "pan": 3})
+    with pytest.raises(ValueError):
+        validate_pose({"zoom": 0})
+    assert "colormap" in resolve_tf_preset("ct-bone")
+    with pytest.raises(ValueError):
+        resolve_tf_preset("unknown")
+
+
+@pytest.fixture(scope="module")
+def series_dir(tmp_path_factory):
+    pytest.importorskip("vtkmodules")
+    pytest.importorskip("pydicom")
+    from benchmarks.synthetic_dicom import generate_ct_series
+
+    return generate_ct_series(str(tmp_path_factory.mktemp("batch")), (24, 24, 8))
+
+
+def test_render_batch_in_process(series_dir, tmp_path):
+    poses = turntable_poses(3) + [{"position": [0, -200, 0], "focal_point": [0, 0, 0], "view_up": [0, 0, 1]}]
+    result = render_batch(series_dir, poses, str(tmp_path), preset="ct-bone",
+                          size=(64, 64), workers=1)
+    assert isinstance(result, BatchResult)
+    assert result.frames == 4 and result.workers == 1
+    assert result.fps > 0 and result.render_fps > 0
+    assert [os.path.basename(p) for p in result.files] == [f"frame_{i:05d}.jpg" for i in range(4)]
+    contents = [open(p, "rb").read() for p in result.files]
+    assert all(c.startswith(b"\xff\xd8") for c in contents)
+    assert len(set(contents)) == 4
+    assert result.bytes == sum(len(c) for c in contents)
+
+
+def test_render_batch_process_pool(series_dir, tmp_path):
+    result = render_batch(series_dir, turntable_poses(4), str(tmp_path), image_format="png",
+                          size=(48, 48), workers=2)
+    assert result.workers == 2 and result.frames == 4
+    assert all(open(p, "rb").read(4) == b"\x89PNG" for p in result.files)
+
+
+def test_render_batch_validation(series_dir, tmp_path):
+    with pytest.raises(ValueError):
+        render_batch(str(tmp_path / "missing"), turntable_poses(1), str(tmp_path))
+    with pytest.raises(ValueError):
+        render_batch(series_dir, turntable_poses(1), str(tmp_path), image_format="bmp")
+    with pytest.raises(ValueError):
+        render_batch(series_dir, [], str(tmp_path))
@@ -0,0 +1,73 @@
+"""
+合成 DICOM 数据与基准脚本测试
+"""
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pydicom")
+pytest.importorskip("vtkmodules")
+
+from benchmarks.synthetic_dicom import generate_ct_series, parse_size
+from benchmarks import run_benchmarks
+
+
+def test_parse_size():
+    assert parse_size("small") == (128, 128, 128)
+    assert parse_size("64") == (64, 64, 64)
+    assert parse_size("512x256x10") == (512, 256, 10)
+    with pytest.raises(ValueError):
+        parse_size("1x2")
+
+
+def test_generated_series_is_readable(tmp_path):
+    from render.dicom_io import load_dicom_series, parse_dicom_metadata
+    from render.volume_transfer import image_data_to_array
+
+    series_dir = generate_ct_series(str(tmp_path), (32, 40, 12))
+    assert len([f for f in os.listdir(series_dir) if f.endswith(".dcm")]) == 12
+
+    image_data = load_dicom_series(series_dir)
+    assert image_data.GetDimensions() == (40, 32, 12)
+    array = image_data_to_array(image_data)
+    # 空气、软组织与骨都应出现
+    assert array.min() <= -900
+    assert ((array > -100) & (array < 150)).any()
+    assert array.max() >= 500
+
+    metadata = parse_dicom_metadata(series_dir)
+    assert metadata[0]["Rows"] == 32 and metadata[0]["Columns"] == 40
+
+
+def test_generated_series_is_reused(tmp_path):
+    series_dir = generate_ct_series(str(tmp_path), (16, 16, 4))
+    first = os.path.getmtime(os.path.join(series_dir, "IM00000.dcm"))
+    assert generate_ct_series(str(tmp_path), (16, 16, 4)) == series_dir
+    assert os.path.getmtime(os.path.join(series_dir, "IM00000.dcm")) == first
+
+
+def test_run_writes_json_with_all_stages(tmp_path):
+    output = tmp_path / "result.json"
+    code = run_benchmarks.main([
+        "--sizes", "24x24x8", "--data-dir", str(tmp_path / "data"),
+        "--frames", "2", "--repeat", "1", "--window-size", "64", "64",
+        "--output", str(output),
+    ])
+    assert code == 0
+    report = json.loads(output.read_text(encoding="utf-8"))
+    stages = report["results"][0]["stages"]
+    for stage in ("read_dicom_series.cold", "parse_dicom_metadata", "pipeline_setup",
+                  "first_frame", "interactive_frame", "encode.jpeg", "server_frame"):
+        assert stages[stage]["n"] >= 1
+    assert report["environment"]["vtk"]
+
+
+def test_compare_flags_regressions():
+    def report(ms):
+        return {"results": [{"size": "8x8x8", "stages": {"first_frame": {"p50_ms": ms}}}]}
+
+    rows = run_benchmarks.compare(report(130.0), report(100.0), threshold=0.1)
+    assert rows[0]["regression"] and rows[0]["ratio"] == 1.3
+    assert not run_benchmarks.compare(report(105.0), report(100.0))[0]["regression"]
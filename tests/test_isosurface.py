@@ -0,0 +1,71 @@
+"""
+等值面提取与网格负载测试
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("vtkmodules")
+
+from render.isosurface import (  # noqa: E402
+    decode_mesh_payload,
+    encode_mesh_payload,
+    extract_isosurface,
+    get_isosurface_payload,
+    mesh_cache,
+    payload_summary,
+    payload_to_polydata,
+    resolve_iso_value,
+)
+from render.numpy_bridge import array_to_image_data, vtk_to_array  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def sphere():
+    """半径 12mm 的“骨”球，体素间距 0.5mm"""
+    z, y, x = np.mgrid[0:64, 0:64, 0:64]
+    distance = np.sqrt((x - 32) ** 2 + (y - 32) ** 2 + (z - 32) ** 2) * 0.5
+    array = np.where(distance < 12, 1000, -1000).astype(np.int16)
+    return array_to_image_data(array, spacing=(0.5, 0.5, 0.5))
+
+
+def test_extract_and_decimate(sphere):
+    surface = extract_isosurface(sphere, resolve_iso_value(preset="bone"))
+    assert surface.GetNumberOfPolys() > 1000
+    assert surface.GetPointData().GetNormals() is not None
+    points = vtk_to_array(surface.GetPoints().GetData())
+    radius = np.linalg.norm(points - 16.0, axis=1)
+    assert abs(radius.mean() - 12) < 0.5
+
+    decimated = extract_isosurface(sphere, 300, decimation=0.8)
+    assert decimated.GetNumberOfPolys() < surface.GetNumberOfPolys() * 0.3
+    assert decimated.GetPointData().GetNormals() is not None
+    with pytest.raises(ValueError):
+        extract_isosurface(sphere, 300, decimation=1.0)
+
+
+def test_payload_round_trip(sphere):
+    surface = extract_isosurface(sphere, 300)
+    payload = encode_mesh_payload(surface)
+    positions, normals, indices = decode_mesh_payload(payload)
+    original = vtk_to_array(surface.GetPoints().GetData())
+    assert positions.shape == original.shape
+    assert np.abs(positions - original).max() <= max(payload["scale"])
+    assert np.array_equal(indices.reshape(-1), vtk_to_array(surface.GetPolys().GetConnectivityArray()))
+    assert np.abs(normals - vtk_to_array(surface.GetPointData().GetNormals())).max() < 0.01
+    # 量化 + 压缩后明显小于 float32 原始网格
+    raw = original.nbytes * 2 + indices.size * 8
+    summary = payload_summary(payload)
+    assert summary["bytes"] < raw / 3 and "positions" not in summary
+
+    polydata = payload_to_polydata(payload)
+    assert polydata.GetNumberOfPoints() == payload["vertices"]
+    assert polydata.GetNumberOfPolys() == payload["triangles"]
+
+
+def test_cached_per_iso_and_decimation(sphere):
+    first = get_isosurface_payload("test-iso-volume", sphere, 300, 0.5)
+    hits = mesh_cache.hits
+    assert get_isosurface_payload("test-iso-volume", sphere, 300.0, 0.5) is first
+    assert mesh_cache.hits == hits + 1
+    assert get_isosurface_payload("test-iso-volume", sphere, 300, 0.0) is not first
@@ -0,0 +1,90 @@
+"""
+VTK 对象泄漏诊断测试
+"""
+
+import pytest
+
+pytest.importorskip("vtkmodules")
+
+from vtkmodules.vtkCommonDataModel import vtkImageData
+from vtkmodules.vtkCommonCore import VTK_SHORT
+
+from core.leak_tracker import LeakTracker, diff_snapshots, take_snapshot
+from core.session import SessionManager
+
+
+class _Holder:
+    def __init__(self):
+        self.image = vtkImageData()
+        self.image.SetDimensions(16, 16, 16)
+        self.image.AllocateScalars(VTK_SHORT, 1)
+
+    def memory_bytes(self):
+        return 0
+
+    def release(self):
+        self.image = None
+
+
+def test_snapshot_tags_session_objects_and_reports_delta():
+    sessions = SessionManager(idle_timeout=0)
+    sessions.open("s1")
+    before = take_snapshot(sessions)
+    holder = _Holder()
+    sessions.attach("s1", holder)
+    after = take_snapshot(sessions)
+
+    owned = after.sessions["s1"]
+    assert owned["classes"]["vtkImageData"] == 1
+    # 标量数组只在 C++ 侧被持有，通过数据集的连接找到
+    assert owned["data_array_bytes"] >= 16 ** 3 * 2
+    assert owned["image_data_bytes"] >= 16 ** 3 * 2
+
+    delta = diff_snapshots(before, after)
+    assert delta["total"]["classes"]["vtkImageData"] == 1
+    assert "vtkImageData" in delta["grown"]
+
+    sessions.close("s1")
+    delta = diff_snapshots(before, take_snapshot(sessions))
+    assert delta["grown"] == []
+
+
+def test_load_clear_cycle_does_not_leak(tmp_path):
+    pytest.importorskip("pydicom")
+    pytest.importorskip("wslink")
+    from vtkmodules.vtkInteractionStyle import vtkInteractorStyleTrackballCamera
+    from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow, vtkRenderWindowInteractor
+    from benchmarks.synthetic_dicom import generate_ct_series
+    from core.server import VRRender
+
+    series_dir = generate_ct_series(str(tmp_path), (24, 24, 8))
+    renderer = vtkRenderer()
+    render_window = vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(64, 64)
+    render_window.AddRenderer(renderer)
+    interactor = vtkRenderWindowInteractor()
+    interactor.SetRenderWindow(render_window)
+    interactor.SetInteractorStyle(vtkInteractorStyleTrackballCamera())
+    render_window.Render()
+
+    sessions = SessionManager(idle_timeout=0)
+    tracker = LeakTracker(sessions)
+
+    def cycle():
+        sessions.open("client")
+        vr = VRRender(series_dir, render_window, renderer, interactor)
+        vr.setup()
+        sessions.attach("client", vr)
+        render_window.Render()
+        sessions.close("client")
+        render_window.Render()
+
+    # 第一轮会填充体数据缓存、创建 GL 资源，之后的轮次不应再增长
+    cycle()
+    tracker.mark()
+    for _ in range(3):
+        cycle()
+    report = tracker.report()
+    assert report["grown"] == [], report["total"]
+    render_window.Finalize()
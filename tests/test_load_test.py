@@ -0,0 +1,56 @@
+"""
+wslink 压测工具测试
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("wslink")
+pytest.importorskip("aiohttp")
+
+from benchmarks import load_test
+from benchmarks.load_test import ClientStats, summarize_level
+
+
+def test_summarize_level_merges_clients():
+    a = ClientStats(rpc={"m": [0.01, 0.02]}, frame_latency=[0.05], frames=3, frame_bytes=3000)
+    b = ClientStats(rpc={"m": [0.03], "n": [0.5]}, errors={"n": 1}, frame_latency=[0.07], frames=2)
+    level = summarize_level(2, 2.0, [a, b], memory=[100, 300, 200])
+
+    assert level["rpc"]["m"]["n"] == 3
+    assert level["rpc"]["n"]["errors"] == 1
+    assert level["rpc"]["m"]["p99_ms"] <= 30.0
+    assert level["frame_latency"]["n"] == 2
+    assert level["throughput"]["rpc_per_s"] == 2.0
+    assert level["throughput"]["frames_received_per_s"] == 2.5
+    assert level["server_memory"] == {
+        "samples": 3, "start_bytes": 100, "peak_bytes": 300, "end_bytes": 200,
+    }
+
+
+def test_mouse_event_matches_vtk_web_mouse_handler():
+    event = load_test._mouse_event("move", 0.25, 0.75)
+    for key in ("view", "action", "x", "y", "buttonLeft", "buttonMiddle", "buttonRight",
+                "shiftKey", "ctrlKey", "altKey", "metaKey"):
+        assert key in event
+    assert load_test._mouse_event("up", 0, 0)["buttonLeft"] is False
+
+
+def test_load_level_against_local_server(tmp_path):
+    pytest.importorskip("vtkmodules")
+    pytest.importorskip("pydicom")
+    from benchmarks.synthetic_dicom import generate_ct_series
+
+    series_dir = generate_ct_series(str(tmp_path), (24, 24, 8))
+    with load_test.LocalServer("load-test-secret") as server:
+        level = asyncio.run(load_test.run_level(
+            server.url, "load-test-secret", series_dir, clients=2, duration=1.5,
+            interval=0.01, server_pid=server.process.pid,
+        ))
+
+    assert level["failures"] == []
+    assert level["rpc"]["app.action.start_render"]["n"] == 2
+    assert level["rpc"]["app.action.set_window_level"]["errors"] == 0
+    assert level["frame_latency"]["n"] > 0
+    assert level["server_memory"]["peak_bytes"] > 0
@@ -0,0 +1,106 @@
+"""
+指标注册表与 /metrics 端点测试
+"""
+
+import urllib.request
+
+import pytest
+
+from core.metrics import MetricsRegistry, metered, start_metrics_server, stop_metrics_server, watch_cache
+from render.volume_cache import VolumeCache
+
+
+def test_counter_gauge_histogram_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests", "请求数", ["method"])
+    requests.inc(method="a")
+    requests.inc(2, method="a")
+    registry.gauge("demo_level", "水位").set(1.5)
+    latency = registry.histogram("demo_seconds", "耗时", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3)
+
+    text = registry.render()
+    assert "# TYPE demo_requests counter" in text
+    assert 'demo_requests_total{method="a"} 3' in text
+    assert "demo_level 1.5" in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in text
+    assert "demo_seconds_count 3" in text
+    assert "demo_seconds_sum 3.55" in text
+
+
+def test_registry_reuses_metrics_and_checks_labels():
+    registry = MetricsRegistry()
+    assert registry.counter("x", "doc", ["a"]) is registry.counter("x", "doc", ["a"])
+    with pytest.raises(ValueError):
+        registry.gauge("x", "doc", ["a"])
+    with pytest.raises(ValueError):
+        registry.counter("x", "doc", ["a"]).inc(b="1")
+
+
+def test_watch_cache_reads_stats_at_scrape_time():
+    from core.metrics import registry
+
+    cache = VolumeCache(1000, sizeof=len)
+    watch_cache("test", cache)
+    cache.put("a", b"x" * 100)
+    cache.get("a")
+    cache.get("b")
+
+    text = registry.render()
+    assert 'webvr_cache_hits_total{cache="test"} 1' in text
+    assert 'webvr_cache_misses_total{cache="test"} 1' in text
+    assert 'webvr_cache_resident_bytes{cache="test"} 100' in text
+
+
+def test_metered_counts_errors():
+    from core.metrics import RPC_ERRORS, RPC_SECONDS
+
+    @metered("test.fail")
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        fail()
+    assert RPC_ERRORS.value(method="test.fail") == 1
+    assert RPC_SECONDS.count(method="test.fail") == 1
+
+
+def test_metered_awaits_coroutines():
+    import asyncio
+
+    from core.metrics import RPC_SECONDS
+
+    @metered("test.async")
+    async def op():
+        await asyncio.sleep(0.01)
+        return 1
+
+    assert asyncio.run(op()) == 1
+    assert RPC_SECONDS.count(method="test.async") == 1
+    assert RPC_SECONDS.sum(method="test.async") >= 0.01
+
+
+def test_http_endpoint_serves_text_format():
+    registry = MetricsRegistry()
+    registry.counter("endpoint_hits", "doc").inc()
+    server = start_metrics_server(_free_port(), metrics_registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            body = resp.read().decode("utf-8")
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "endpoint_hits_total 1" in body
+    finally:
+        stop_metrics_server()
+
+
+def _free_port():
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,72 @@
+"""
+NumPy ↔ VTK 零拷贝桥接测试
+"""
+
+import gc
+
+import numpy as np
+import pytest
+
+pytest.importorskip("vtkmodules")
+
+from render.numpy_bridge import (
+    array_to_image_data,
+    array_to_vtk,
+    array_to_vtk_points,
+    image_data_to_array,
+    vtk_points_to_array,
+    vtk_to_array,
+)
+
+
+def test_image_data_round_trip_shares_memory():
+    volume = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    image = array_to_image_data(volume, spacing=(0.5, 0.5, 2.0))
+    assert image.GetDimensions() == (6, 5, 4)
+    assert image.GetSpacing() == (0.5, 0.5, 2.0)
+
+    view = image_data_to_array(image)
+    assert np.shares_memory(view, volume)
+    volume[1, 2, 3] = -7
+    assert image.GetPointData().GetScalars().GetValue(1 * 30 + 2 * 6 + 3) == -7
+
+
+def test_vtk_array_keeps_numpy_memory_alive():
+    image = array_to_image_data(np.full((8, 8, 8), 42, dtype=np.uint16))
+    gc.collect()
+    # 覆盖已释放的内存，若 NumPy 数组已被回收，读到的值会变化
+    _ = [np.zeros(512, dtype=np.uint16) for _ in range(64)]
+    assert image_data_to_array(image).min() == 42
+
+
+def test_numpy_view_outlives_image_data():
+    image = array_to_image_data(np.ones((4, 4, 4), dtype=np.float32), copy=True)
+    view = image_data_to_array(image)
+    del image
+    gc.collect()
+    assert view.sum() == 64
+
+
+def test_non_contiguous_arrays_are_rejected_without_copy():
+    volume = np.zeros((8, 8, 8), dtype=np.int16)[:, :, ::2]
+    with pytest.raises(ValueError):
+        array_to_image_data(volume)
+    image = array_to_image_data(volume, copy=True)
+    assert not np.shares_memory(image_data_to_array(image), volume)
+    with pytest.raises(ValueError):
+        array_to_vtk(np.zeros((2, 2, 2)))
+
+
+def test_multi_component_and_points():
+    rgb = np.zeros((2, 3, 4, 3), dtype=np.uint8)
+    image = array_to_image_data(rgb)
+    assert image.GetPointData().GetScalars().GetNumberOfComponents() == 3
+    assert image_data_to_array(image).shape == (2, 3, 4, 3)
+
+    points = np.random.default_rng(0).random((100, 3), dtype=np.float32)
+    vtk_points = array_to_vtk_points(points)
+    assert vtk_points.GetNumberOfPoints() == 100
+    assert np.shares_memory(vtk_points_to_array(vtk_points), points)
+    with pytest.raises(ValueError):
+        array_to_vtk_points(points.astype(np.int32))
+    assert vtk_to_array(vtk_points.GetData()).shape == (100, 3)
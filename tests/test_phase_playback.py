@@ -0,0 +1,145 @@
+"""
+4D 回放环形缓冲区与换帧调度测试
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("vtkmodules")
+
+from vtkmodules.vtkCommonDataModel import vtkImageData  # noqa: E402
+
+from render.phase_playback import PhasePlayer  # noqa: E402
+
+
+class ManualScheduler:
+    """记录定时回调，由测试逐个执行"""
+
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self, delay, callback):
+        self.pending.append((delay, callback))
+
+    def run_next(self):
+        delay, callback = self.pending.pop(0)
+        callback()
+        return delay
+
+
+def make_loader(gate=None, calls=None, broken=()):
+    def loader(path):
+        if gate is not None:
+            gate.wait(5)
+        if calls is not None:
+            calls.append(path)
+        if path in broken:
+            raise OSError(f"cannot decode {path}")
+        image = vtkImageData()
+        image.SetDimensions(4, 4, 4)
+        image.AllocateScalars(4, 1)
+        return image
+    return loader
+
+
+def phases(n):
+    return [f"/study/phase{i:02d}" for i in range(n)]
+
+
+def test_buffer_is_bounded_around_playhead():
+    shown = []
+    player = PhasePlayer(phases(10), lambda i, img, frame: shown.append(i), ManualScheduler(),
+                         loader=make_loader(), capacity=4, workers=2)
+    try:
+        assert player.wait(0, timeout=5) is not None
+        for index in player._window(0):
+            player.wait(index, timeout=5)
+        stats = player.stats()
+        assert len(stats["buffered"]) <= 4
+        # 播放头前方多、后方少（循环：0 的前一个是 9）
+        assert set(stats["buffered"]) == {9, 0, 1, 2}
+        assert player.seek(2)
+        for index in player._window(2):
+            player.wait(index, timeout=5)
+        assert set(player.stats()["buffered"]) == {1, 2, 3, 4}
+        assert shown == [2] and player.memory_bytes() > 0
+    finally:
+        player.release()
+
+
+def test_playback_advances_and_stalls_without_blocking():
+    gate = threading.Event()
+    scheduler = ManualScheduler()
+    shown = []
+    player = PhasePlayer(phases(6), lambda i, img, frame: shown.append(i), scheduler,
+                         loader=make_loader(gate), capacity=3, workers=1, fps=20)
+    try:
+        player.play()
+        # 解码尚未完成：保持当前画面并计入卡顿，按目标间隔继续调度
+        assert scheduler.run_next() == 0.0
+        assert shown == [] and player.stalls == 1
+        assert 0 < scheduler.pending[0][0] <= 0.05
+        gate.set()
+        player.wait(1, timeout=5)
+        scheduler.run_next()
+        assert shown == [1] and player.current == 1
+        player.pause()
+        scheduler.run_next()
+        assert shown == [1] and not scheduler.pending
+    finally:
+        player.release()
+
+
+def test_release_stops_loading():
+    calls = []
+    player = PhasePlayer(phases(8), lambda i, img, frame: None, ManualScheduler(),
+                         loader=make_loader(calls=calls), capacity=4, workers=1)
+    player.release()
+    assert player.stats()["buffered"] == [] and player.memory_bytes() == 0
+    assert len(calls) <= 1
+
+
+def test_frames_counted_when_rendered_and_superseded_frames_dropped():
+    scheduler = ManualScheduler()
+    posted = []
+    player = PhasePlayer(phases(4), lambda i, img, frame: posted.append(frame), scheduler,
+                         loader=make_loader(), capacity=4, workers=2, fps=20)
+    try:
+        for index in range(4):
+            player.wait(index, timeout=5)
+        player.play()
+        for _ in range(3):
+            scheduler.run_next()
+        # 已提交但尚未渲染的帧不计入 frames
+        assert posted == [1, 2, 3] and player.frames == 0
+        # 渲染线程只来得及渲染最后一帧，前两帧被取代
+        player.frame_rendered(3)
+        stats = player.stats()
+        assert (stats["posted"], stats["frames"], stats["dropped"]) == (3, 1, 2)
+        # 过期的回报被忽略
+        player.frame_rendered(2)
+        assert player.frames == 1
+    finally:
+        player.release()
+
+
+def test_failed_phase_not_resubmitted_and_skipped():
+    scheduler = ManualScheduler()
+    calls, shown = [], []
+    names = phases(4)
+    player = PhasePlayer(names, lambda i, img, frame: shown.append(i), scheduler,
+                         loader=make_loader(calls=calls, broken={names[1]}), capacity=4, workers=1, fps=20)
+    try:
+        for index in range(4):
+            player.wait(index, timeout=5)
+        assert player.stats()["failed"] == [1]
+        player.play()
+        scheduler.run_next()
+        scheduler.run_next()
+        # 跳过解码失败的期相 1，且不再重新提交
+        assert shown == [2, 3] and player.stalls == 0
+        assert calls.count(names[1]) == 1
+        assert not player.seek(1)
+    finally:
+        player.release()
@@ -0,0 +1,68 @@
+"""
+点云管线测试
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("vtkmodules")
+
+from render.point_cloud import PointCloud, PointCloudLayer, points_to_polydata, voxel_downsample
+from utils import calculate_bounding_box, generate_random_points, normalize_points
+
+
+def test_polydata_shares_point_memory():
+    points = np.random.default_rng(0).random((1000, 3), dtype=np.float32)
+    polydata = points_to_polydata(points, scalars=np.arange(1000, dtype=np.float32))
+    assert polydata.GetNumberOfPoints() == 1000
+    assert polydata.GetVerts().GetNumberOfConnectivityIds() == 1000
+    points[10] = (7, 8, 9)
+    assert polydata.GetPoint(10) == (7.0, 8.0, 9.0)
+
+
+def test_voxel_downsample_keeps_one_point_per_voxel():
+    points = np.array([[0.1, 0.1, 0.1], [0.2, 0.2, 0.2], [1.5, 0.1, 0.1], [1.6, 1.6, 1.6]])
+    assert voxel_downsample(points, 1.0).tolist() == [0, 2, 3]
+    assert voxel_downsample(points, 10.0).tolist() == [0]
+
+
+def test_point_cloud_caches_bounds_and_lods(tmp_path):
+    points = generate_random_points(20000, [0, 10, 0, 5, 0, 2]).astype(np.float32)
+    np.save(tmp_path / "cloud.npy", points)
+    cloud = PointCloud.from_file(str(tmp_path / "cloud.npy"))
+    assert isinstance(cloud.points, np.memmap)
+
+    assert cloud.bounds == pytest.approx(calculate_bounding_box(points))
+    assert np.allclose(cloud.normalized(), normalize_points(points))
+    lod = cloud.lod_indices(2000)
+    assert 0 < len(lod) <= 2000
+    assert cloud.lod_indices(2000) is lod
+    assert cloud.to_polydata(2000).GetNumberOfPoints() == len(lod)
+
+
+def test_layer_switches_levels_by_update_rate():
+    from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow
+    import vtkmodules.vtkRenderingOpenGL2  # noqa: F401
+
+    renderer = vtkRenderer()
+    window = vtkRenderWindow()
+    window.SetOffScreenRendering(1)
+    window.SetSize(64, 64)
+    window.AddRenderer(renderer)
+    cloud = PointCloud(generate_random_points(50000))
+    layer = PointCloudLayer(cloud, renderer, lod_budgets=(5000,))
+    assert layer.level_sizes()[0] == 50000 and layer.level_sizes()[1] <= 5000
+
+    window.SetDesiredUpdateRate(0.0001)
+    window.Render()
+    assert layer.active_level == 0 and layer.seconds_per_point is not None
+    # 交互时一帧预算远小于全部点的耗时
+    layer.seconds_per_point = 1.0
+    window.SetDesiredUpdateRate(15)
+    window.Render()
+    assert layer.active_level == 1
+    assert layer.memory_bytes() < cloud.points.nbytes * 2
+
+    layer.release()
+    assert renderer.GetActors().GetNumberOfItems() == 0
+    window.Finalize()
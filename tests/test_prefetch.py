@@ -0,0 +1,85 @@
+"""
+体数据缓存与同检查序列预取测试
+"""
+
+import os
+
+from render.prefetch import SeriesPrefetcher, find_sibling_series
+from render.volume_cache import VolumeCache
+
+
+def make_study(root, names):
+    for name in names:
+        series = root / name
+        series.mkdir()
+        (series / "0001.dcm").write_bytes(b"")
+    return root
+
+
+def test_cache_lru_eviction_by_bytes():
+    cache = VolumeCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.get("a")
+    cache.put("c", "xxxx")
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_get_or_load_counts_hits_and_misses():
+    cache = VolumeCache(max_bytes=100, sizeof=len)
+    calls = []
+    loader = lambda key: calls.append(key) or "data"
+    cache.get_or_load("k", loader)
+    cache.get_or_load("k", loader)
+    assert calls == ["k"]
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1
+
+
+def test_find_sibling_series_orders_by_distance(tmp_path):
+    make_study(tmp_path, ["s1", "s2", "s3", "s4"])
+    (tmp_path / "notes").mkdir()
+    siblings = find_sibling_series(str(tmp_path / "s2"))
+    assert [os.path.basename(p) for p in siblings] == ["s1", "s3", "s4"]
+    assert len(find_sibling_series(str(tmp_path / "s2"), limit=1)) == 1
+
+
+def test_find_sibling_series_stops_at_limit(tmp_path, monkeypatch):
+    from render import prefetch
+
+    make_study(tmp_path, [f"s{i:02d}" for i in range(20)])
+    scanned = []
+    has_dicom = prefetch._has_dicom_files
+    monkeypatch.setattr(prefetch, "_has_dicom_files", lambda p: scanned.append(p) or has_dicom(p))
+    siblings = find_sibling_series(str(tmp_path / "s10"), limit=2)
+    assert [os.path.basename(p) for p in siblings] == ["s09", "s11"]
+    assert len(scanned) == 2
+
+
+def test_prefetcher_warms_cache_and_reports_usage(tmp_path):
+    make_study(tmp_path, ["s1", "s2", "s3"])
+    cache = VolumeCache(max_bytes=1000, sizeof=len)
+    prefetcher = SeriesPrefetcher(cache, loader=lambda path: "volume", idle_grace=0.0)
+    queued = prefetcher.prefetch_siblings(str(tmp_path / "s1")).result(5)
+    assert len(queued) == 2
+    prefetcher.join()
+
+    assert prefetcher.stats()["loaded"] == 2
+    cache.get_or_load(str(tmp_path / "s2"), loader=lambda path: "fresh")
+    stats = prefetcher.stats()
+    assert stats["prefetched"] == 2
+    assert stats["prefetch_used"] == 1
+
+
+def test_prefetcher_waits_for_interactive_render(tmp_path):
+    make_study(tmp_path, ["s1", "s2"])
+    cache = VolumeCache(max_bytes=1000, sizeof=len)
+    prefetcher = SeriesPrefetcher(cache, loader=lambda path: "volume", idle_grace=0.0)
+    prefetcher.begin_interactive()
+    # 目录扫描同样在预取线程上、交互空闲后进行
+    discovered = prefetcher.prefetch_siblings(str(tmp_path / "s1"))
+    assert not discovered.done() and len(cache) == 0
+    prefetcher.end_interactive()
+    prefetcher.join()
+    assert len(cache) == 1
@@ -0,0 +1,58 @@
+"""
+采样 profiler 测试
+"""
+
+import threading
+import time
+
+from core.profiler import SamplingProfiler
+from core.tracing import Tracer
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_profile_collects_python_stacks_and_vtk_spans(tmp_path):
+    trace = Tracer(sample_rate=0.0)
+    profiler = SamplingProfiler(interval=0.002, trace=trace)
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    path = tmp_path / "profile.collapsed"
+    done = []
+
+    assert profiler.start(5.0, str(path), on_done=done.append)
+    assert not profiler.start(5.0, str(path))
+    worker.start()
+    # 未采样的 span 也要计入 VTK 调用耗时
+    with trace.span("vtk.Render", "render"):
+        time.sleep(0.05)
+    time.sleep(0.1)
+    stop.set()
+    worker.join()
+    result = profiler.stop()
+
+    assert done and result["path"] == str(path)
+    assert result["native_calls"] == 1 and result["samples"] > 0
+    lines = path.read_text(encoding="utf-8").splitlines()
+    busy = [line for line in lines if line.startswith("busy;") and "_busy_loop" in line]
+    assert busy
+    native = [line for line in lines if line.split(" ")[-2].endswith("[vtk.Render]")]
+    assert len(native) == 1
+    assert "test_profile_collects_python_stacks_and_vtk_spans" in native[0]
+    assert "contextlib" not in native[0]
+    assert int(native[0].rsplit(" ", 1)[1]) >= 50000
+    assert not trace._listeners
+
+
+def test_nested_vtk_spans_counted_once(tmp_path):
+    trace = Tracer(sample_rate=1.0)
+    profiler = SamplingProfiler(interval=0.5, trace=trace)
+    profiler.start(5.0, str(tmp_path / "p.collapsed"))
+    with trace.span("vtk.Update", "io"):
+        with trace.span("vtk.Render", "render"):
+            pass
+    result = profiler.stop()
+    assert result["native_calls"] == 1
+    assert any(stack.endswith("[vtk.Update]") for stack in profiler.collapsed())
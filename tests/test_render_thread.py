@@ -0,0 +1,129 @@
+"""
+渲染线程执行器测试
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from core.metrics import RENDER_SUPERSEDED
+from core.render_thread import RenderExecutor, on_render_thread, render_thread_protocol
+
+
+@pytest.fixture
+def executor():
+    executor = RenderExecutor(name="test-render")
+    yield executor
+    executor.stop(5.0)
+
+
+def _block(executor):
+    """占住渲染线程，返回放行用的 Event"""
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5.0)
+
+    executor.post(hold)
+    assert started.wait(5.0)
+    return release
+
+
+def test_tasks_run_in_order_on_one_thread(executor):
+    seen = []
+    futures = [executor.submit(lambda i=i: seen.append((i, threading.current_thread().name))) for i in range(5)]
+    for future in futures:
+        future.result(5.0)
+    assert [i for i, _ in seen] == list(range(5))
+    assert {name for _, name in seen} == {"test-render"}
+
+
+def test_keyed_tasks_superseded(executor):
+    release = _block(executor)
+    before = RENDER_SUPERSEDED.value()
+    futures = [executor.submit(lambda v=v: v, key="move") for v in range(5)]
+    other = executor.submit(lambda: "other", key="other")
+    assert executor.depth == 2
+    assert all(f is futures[0] for f in futures)
+    assert RENDER_SUPERSEDED.value() - before == 4
+    release.set()
+    assert futures[0].result(5.0) == 4
+    assert other.result(5.0) == "other"
+    # 已开始执行的任务不再被取代
+    assert executor.submit(lambda: 5, key="move") is not futures[0]
+
+
+def test_call_propagates_errors_and_nests(executor):
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        executor.call(fail)
+    # 渲染线程上的嵌套调用直接执行，不会自锁
+    assert executor.call(lambda: executor.call(lambda: 7)) == 7
+
+
+def test_run_and_call_in_loop(executor):
+    async def main():
+        loop_thread = threading.current_thread()
+        seen = []
+        done = asyncio.Event()
+
+        def work():
+            executor.call_in_loop(lambda: (seen.append(threading.current_thread()), done.set()))
+            return threading.current_thread().name
+
+        assert await executor.run(work) == "test-render"
+        await asyncio.wait_for(done.wait(), 5.0)
+        return seen == [loop_thread]
+
+    assert asyncio.run(main())
+    # 没有运行中的事件循环时直接调用
+    seen = []
+    executor.call_in_loop(seen.append, 1)
+    assert seen == [1]
+
+
+def test_stop_rejects_new_tasks():
+    executor = RenderExecutor()
+    future = executor.submit(lambda: 1)
+    executor.stop(5.0)
+    assert future.result() == 1
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: 2)
+
+
+def test_decorator_and_protocol_wrapping():
+    from wslink import register as exportRpc
+
+    class Protocol:
+        @exportRpc("unit.render")
+        def render(self, value):
+            return value, threading.current_thread().name
+
+        def helper(self):
+            return threading.current_thread().name
+
+    wrapped = render_thread_protocol(Protocol)
+    assert wrapped.render.__dict__["_wslinkuris"] == Protocol.render.__dict__["_wslinkuris"]
+    assert wrapped.helper is Protocol.helper
+    assert wrapped().render(3) == (3, "render")
+    # on_call 在提交前于调用线程上执行
+    protocol, calls = wrapped(), []
+    protocol.on_call = lambda: calls.append(threading.current_thread())
+    assert protocol.render(4) == (4, "render")
+    assert calls == [threading.current_thread()]
+
+    @on_render_thread(key=lambda value: "k" if value else None)
+    def op(value):
+        return value
+
+    assert op(0) == 0
+    assert op(1) is None
+
+    async def main():
+        return await op(0)
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,61 @@
+"""
+体数据重采样测试
+"""
+
+import numpy as np
+import pytest
+
+from render.resample import resolve_spacing, spacing_key
+
+
+def test_resolve_spacing():
+    source = (0.7, 0.7, 2.5)
+    assert resolve_spacing(None, source) is None
+    assert resolve_spacing("", source) is None
+    assert resolve_spacing("iso", source) == (0.7, 0.7, 0.7)
+    assert resolve_spacing(1, source) == (1.0, 1.0, 1.0)
+    assert resolve_spacing("0.5,0.5,1", source) == (0.5, 0.5, 1.0)
+    # 与原间距一致时无需重采样
+    assert resolve_spacing([0.7, 0.7, 2.5], source) is None
+    assert resolve_spacing("iso", (1.0, 1.0, 1.0)) is None
+    with pytest.raises(ValueError):
+        resolve_spacing([1, 0, 1], source)
+    assert spacing_key("/data/s1", None) == "/data/s1"
+    assert spacing_key("/data/s1", (0.7, 0.7, 0.7)) == "/data/s1|spacing=0.7,0.7,0.7"
+
+
+def test_resample_preserves_extent_and_linear_values():
+    pytest.importorskip("vtkmodules")
+    from render.numpy_bridge import array_to_image_data, image_data_to_array
+    from render.resample import resample_volume
+
+    # 沿 z 线性变化的体数据，线性插值后应保持线性
+    nz, ny, nx = 5, 8, 8
+    array = np.broadcast_to((np.arange(nz, dtype=np.float32) * 100)[:, None, None], (nz, ny, nx)).copy()
+    source = array_to_image_data(array, spacing=(1.0, 1.0, 3.0), origin=(0.0, 0.0, 10.0))
+    resampled = resample_volume(source, (1.0, 1.0, 1.0), threads=2)
+    assert resampled.GetSpacing() == (1.0, 1.0, 1.0)
+    assert resampled.GetDimensions() == (8, 8, 13)
+    assert resampled.GetBounds() == pytest.approx(source.GetBounds())
+    values = image_data_to_array(resampled)
+    assert np.allclose(values[:, 3, 3], np.arange(13) * 100 / 3.0, atol=1e-3)
+
+
+def test_read_volume_shares_resampled_entry(tmp_path):
+    pytest.importorskip("pydicom")
+    from benchmarks.synthetic_dicom import generate_ct_series
+    from render.dicom_io import read_volume
+    from render.volume_cache import volume_cache
+
+    series_dir = generate_ct_series(str(tmp_path), (16, 16, 4))
+    key, source = read_volume(series_dir)
+    iso_key, resampled = read_volume(series_dir, "iso")
+    assert iso_key != key and iso_key in volume_cache
+    min_spacing = min(source.GetSpacing())
+    assert resampled.GetSpacing() == pytest.approx((min_spacing,) * 3)
+    # 同一间距的第二次请求（另一个会话）直接命中缓存
+    hits = volume_cache.hits
+    assert read_volume(series_dir, "iso") == (iso_key, resampled)
+    assert volume_cache.hits == hits + 2
+    volume_cache.discard(key)
+    volume_cache.discard(iso_key)
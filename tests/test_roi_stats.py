@@ -0,0 +1,97 @@
+"""
+ROI 测量测试（与 NumPy 参考实现对照）
+"""
+
+import numpy as np
+import pytest
+
+from render.roi_stats import compute_roi_statistics, roi_cache, roi_key
+
+SPACING = (0.5, 0.8, 2.0)
+ORIGIN = (-10.0, -20.0, 5.0)
+
+
+@pytest.fixture(scope="module")
+def volume():
+    rng = np.random.default_rng(1)
+    return rng.integers(-1024, 2000, size=(30, 50, 60)).astype(np.int16)
+
+
+def voxel_centers(shape):
+    nz, ny, nx = shape
+    z, y, x = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx), indexing="ij")
+    return (ORIGIN[0] + x * SPACING[0], ORIGIN[1] + y * SPACING[1], ORIGIN[2] + z * SPACING[2])
+
+
+def assert_matches(stats, values):
+    assert stats.voxels == values.size
+    assert stats.volume_mm3 == pytest.approx(values.size * np.prod(SPACING))
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.std == pytest.approx(values.std())
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_box(volume):
+    roi = {"type": "box", "lower": [5, -1, 30], "upper": [-3, 12.3, 41]}
+    stats = compute_roi_statistics(volume, roi, SPACING, ORIGIN, chunk_voxels=1000)
+    x, y, z = voxel_centers(volume.shape)
+    inside = (x >= -3) & (x <= 5) & (y >= -1) & (y <= 12.3) & (z >= 30) & (z <= 41)
+    assert_matches(stats, volume[inside])
+
+
+def test_sphere(volume):
+    roi = {"type": "sphere", "center": [2, 0, 35], "radius": 9}
+    stats = compute_roi_statistics(volume, roi, SPACING, ORIGIN, chunk_voxels=2000)
+    x, y, z = voxel_centers(volume.shape)
+    inside = (x - 2) ** 2 + y ** 2 + (z - 35) ** 2 <= 81
+    assert_matches(stats, volume[inside])
+
+
+@pytest.mark.parametrize("axis", ["x", "y", "z"])
+def test_slab(volume, axis):
+    # 三角形多边形，坐标为另两轴（按 x, y, z 顺序）
+    coords = dict(zip("xyz", voxel_centers(volume.shape)))
+    u_name, v_name = [a for a in "xyz" if a != axis]
+    limits = {"x": (-8, 18), "y": (-18, 15), "z": (10, 60)}
+    (u_lo, u_hi), (v_lo, v_hi) = limits[u_name], limits[v_name]
+    polygon = [[u_lo, v_lo], [u_hi, v_lo], [u_lo, v_hi]]
+    slab = limits[axis]
+    roi = {"type": "slab", "axis": axis, "polygon": polygon, "range": list(slab)}
+    stats = compute_roi_statistics(volume, roi, SPACING, ORIGIN, chunk_voxels=3000)
+
+    u, v, w = coords[u_name], coords[v_name], coords[axis]
+    # 斜边 (u_hi, v_lo) - (u_lo, v_hi) 左下方
+    inside = ((u - u_lo) / (u_hi - u_lo) + (v - v_lo) / (v_hi - v_lo) < 1) & (u >= u_lo) & (v >= v_lo)
+    inside &= (w >= slab[0]) & (w <= slab[1])
+    assert_matches(stats, volume[inside])
+
+
+def test_outside_volume_is_empty(volume):
+    stats = compute_roi_statistics(volume, {"type": "sphere", "center": [500, 0, 0], "radius": 3},
+                                   SPACING, ORIGIN)
+    assert stats.voxels == 0 and stats.mean is None
+
+
+def test_invalid_roi(volume):
+    with pytest.raises(ValueError):
+        compute_roi_statistics(volume, {"type": "cone"})
+    with pytest.raises(ValueError):
+        compute_roi_statistics(volume, {"type": "slab", "polygon": [[0, 0], [1, 1]], "range": [0, 1]})
+
+
+def test_cached_per_roi():
+    pytest.importorskip("vtkmodules")
+    from render.numpy_bridge import array_to_image_data
+    from render.roi_stats import get_roi_statistics
+
+    array = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    image_data = array_to_image_data(array)
+    roi = {"type": "box", "lower": [0, 0, 0], "upper": [2, 2, 2]}
+    first = get_roi_statistics("test-roi-volume", image_data, roi)
+    # 整数与浮点写法视为同一个 ROI
+    same = {"upper": [2.0, 2.0, 2.0], "type": "box", "lower": [0.0, 0, 0]}
+    assert roi_key(same) == roi_key(roi)
+    hits = roi_cache.hits
+    assert get_roi_statistics("test-roi-volume", image_data, same) is first
+    assert roi_cache.hits == hits + 1
+    assert first.voxels == 27
@@ -0,0 +1,91 @@
+"""
+阈值 + 连通域分割测试
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("vtkmodules")
+
+from render.numpy_bridge import array_to_image_data, image_data_to_array  # noqa: E402
+from render.segmentation import (  # noqa: E402
+    SegmentationLayer,
+    get_segmentation,
+    resolve_threshold,
+    segment_volume,
+    segmentation_cache,
+    threshold_mask,
+)
+
+
+@pytest.fixture
+def two_blobs():
+    """背景 -1000，一个 6×6×6 的大块、一个 2×2×2 的小块与一个孤立体素"""
+    array = np.full((16, 16, 16), -1000, dtype=np.int16)
+    array[2:8, 2:8, 2:8] = 800
+    array[11:13, 11:13, 11:13] = 500
+    array[14, 1, 14] = 600
+    return array
+
+
+def test_threshold_matches_numpy(two_blobs):
+    mask = threshold_mask(two_blobs, 500, 700, chunk_voxels=1000)
+    assert mask.dtype == np.uint8
+    assert np.array_equal(mask, ((two_blobs >= 500) & (two_blobs < 700)).astype(np.uint8))
+    assert resolve_threshold(preset="bone") == (300.0, None)
+    with pytest.raises(ValueError):
+        resolve_threshold(5, 1)
+
+
+def test_components(two_blobs):
+    seg = segment_volume(two_blobs, 300, None)
+    assert seg.components == 3
+    assert seg.kept_sizes == [216, 8, 1]
+    assert seg.nbytes == two_blobs.size // 8
+    assert np.array_equal(seg.mask(), (two_blobs >= 300).astype(np.uint8))
+
+    largest = segment_volume(two_blobs, 300, None, keep_largest=1)
+    assert largest.voxels == 216 and largest.mask()[2:8, 2:8, 2:8].all()
+    assert largest.mask().sum() == 216
+
+    denoised = segment_volume(two_blobs, 300, None, min_voxels=2)
+    assert denoised.kept_sizes == [216, 8] and denoised.mask()[14, 1, 14] == 0
+
+    # 种子点为世界坐标 (x, y, z)，落在小块内
+    seeded = segment_volume(two_blobs, 300, None, spacing=(2, 2, 2), seeds=[[23, 23, 23]])
+    assert seeded.kept_sizes == [8] and seeded.mask()[11:13, 11:13, 11:13].all()
+
+
+def test_cached_per_parameters(two_blobs):
+    image_data = array_to_image_data(two_blobs)
+    first = get_segmentation("test-seg-volume", image_data, {"preset": "bone", "keep_largest": 2})
+    hits = segmentation_cache.hits
+    assert get_segmentation("test-seg-volume", image_data, {"low": 300, "keep_largest": 2.0}) is first
+    assert segmentation_cache.hits == hits + 1
+    assert get_segmentation("test-seg-volume", image_data, {"low": 300}) is not first
+
+
+def test_layer_modes(two_blobs):
+    from vtkmodules.vtkRenderingCore import vtkRenderer, vtkVolume
+    from vtkmodules.vtkRenderingVolumeOpenGL2 import vtkSmartVolumeMapper
+
+    image_data = array_to_image_data(two_blobs)
+    mapper = vtkSmartVolumeMapper()
+    mapper.SetInputData(image_data)
+    volume = vtkVolume()
+    volume.SetMapper(mapper)
+    renderer = vtkRenderer()
+    renderer.AddVolume(volume)
+    seg = segment_volume(two_blobs, 300, None, keep_largest=1)
+
+    overlay = SegmentationLayer(seg, renderer)
+    assert renderer.GetVolumes().GetNumberOfItems() == 2
+    assert overlay.memory_bytes() >= seg.nbytes + two_blobs.size
+    overlay.release()
+    assert renderer.GetVolumes().GetNumberOfItems() == 1
+
+    masked = SegmentationLayer(seg, renderer, volume, mode="mask")
+    values = image_data_to_array(mapper.GetInput())
+    assert values[4, 4, 4] == 800 and values[12, 12, 12] == -1000
+    masked.release()
+    assert mapper.GetInput() is image_data
@@ -0,0 +1,58 @@
+"""
+会话生命周期管理测试
+"""
+
+from core.session import SessionManager
+
+
+class FakeResource:
+    def __init__(self, size):
+        self.size = size
+        self.released = False
+
+    def memory_bytes(self):
+        return 0 if self.released else self.size
+
+    def release(self):
+        self.released = True
+
+
+def test_attach_tracks_memory_per_session():
+    manager = SessionManager(idle_timeout=60)
+    manager.attach("a", FakeResource(100))
+    manager.attach("b", FakeResource(50))
+    assert manager.resident_bytes() == 150
+    sessions = {s["session_id"]: s for s in manager.snapshot()["sessions"]}
+    assert sessions["a"]["memory_bytes"] == 100
+
+
+def test_close_releases_resources():
+    manager = SessionManager(idle_timeout=60)
+    resource = FakeResource(100)
+    manager.attach("a", resource)
+    manager.close("a")
+    assert resource.released
+    assert len(manager) == 0
+
+
+def test_detach_releases_single_resource():
+    manager = SessionManager(idle_timeout=60)
+    first, second = FakeResource(10), FakeResource(20)
+    manager.attach("a", first)
+    manager.attach("a", second)
+    manager.detach("a", first)
+    assert first.released and not second.released
+    assert manager.resident_bytes() == 20
+
+
+def test_evict_idle_sessions():
+    evicted = []
+    manager = SessionManager(idle_timeout=10, on_evict=evicted.append)
+    resource = FakeResource(100)
+    manager.attach("idle", resource)
+    manager.attach("busy", FakeResource(1))
+    manager.get("idle").last_active -= 20
+    assert manager.evict_idle() == ["idle"]
+    assert evicted == ["idle"]
+    assert resource.released
+    assert manager.get("busy") is not None
@@ -0,0 +1,83 @@
+"""
+空间索引测试（与暴力计算对照）
+"""
+
+import numpy as np
+import pytest
+
+from render.spatial_index import UniformGridIndex, voxel_to_world, world_to_voxel
+
+
+@pytest.fixture(scope="module")
+def cloud():
+    points = np.random.default_rng(3).random((20000, 3), dtype=np.float32) * [10, 20, 5]
+    return points, UniformGridIndex(points)
+
+
+def test_box_and_radius_match_brute_force(cloud):
+    points, index = cloud
+    lower, upper = np.array([2.0, 3.0, 1.0]), np.array([4.0, 9.0, 2.5])
+    expected = np.nonzero(np.all((points >= lower) & (points <= upper), axis=1))[0]
+    assert np.array_equal(np.sort(index.box_query(lower, upper)), expected)
+
+    center = np.array([5.0, 10.0, 2.0])
+    found, distances = index.radius_query(center, 1.5, sort=True)
+    brute = np.linalg.norm(points - center, axis=1)
+    assert set(found.tolist()) == set(np.nonzero(brute <= 1.5)[0].tolist())
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_knn_matches_brute_force(cloud):
+    points, index = cloud
+    for query in ([5.0, 10.0, 2.0], [0.0, 0.0, 0.0], [30.0, -4.0, 12.0]):
+        found, distances = index.knn(query, k=7)
+        brute = np.linalg.norm(points - np.array(query), axis=1)
+        assert np.allclose(distances, np.sort(brute)[:7])
+        assert np.allclose(brute[found], distances)
+
+
+def test_ray_query_returns_hits_front_to_back(cloud):
+    points, index = cloud
+    start, end = np.array([-5.0, -5.0, -5.0]), np.array([15.0, 25.0, 10.0])
+    found, t = index.ray_query(start, end, 0.2)
+    direction = end - start
+    rel = points - start
+    along = np.clip(rel @ direction / (direction @ direction), 0, 1)
+    brute = np.linalg.norm(rel - along[:, None] * direction, axis=1)
+    assert set(found.tolist()) == set(np.nonzero(brute <= 0.2)[0].tolist())
+    assert np.all(np.diff(t) >= 0)
+    first, _ = index.ray_query(start, end, 0.2, first_only=True)
+    assert first[0] == found[0]
+
+
+def test_pick_from_screen_coordinates():
+    pytest.importorskip("vtkmodules")
+    from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow
+
+    points = np.array([[0.0, 0.0, 0.0], [0.0, 0.0, -5.0], [3.0, 3.0, 0.0]], dtype=np.float32)
+    index = UniformGridIndex(points)
+    renderer = vtkRenderer()
+    camera = renderer.GetActiveCamera()
+    camera.SetPosition(0, 0, 20)
+    camera.SetFocalPoint(0, 0, 0)
+    renderer.ResetCameraClippingRange(-10, 10, -10, 10, -10, 10)
+    window = vtkRenderWindow()
+    window.SetOffScreenRendering(1)
+    window.SetSize(200, 200)
+    window.AddRenderer(renderer)
+    # 视口中心的视线同时穿过前两个点，应返回离相机近的那个
+    assert index.pick(renderer, 100, 100, tolerance=0.1) == 0
+    assert index.pick(renderer, 5, 195, tolerance=0.1) is None
+
+
+def test_voxel_coordinates_round_trip():
+    pytest.importorskip("vtkmodules")
+    from vtkmodules.vtkCommonDataModel import vtkImageData
+
+    image = vtkImageData()
+    image.SetDimensions(10, 20, 30)
+    image.SetSpacing(0.5, 0.5, 2.0)
+    image.SetOrigin(-1, -2, -3)
+    ijk = np.array([[3, 4, 5], [0, 0, 0]])
+    assert np.array_equal(world_to_voxel(image, voxel_to_world(image, ijk)), ijk)
+    assert np.array_equal(world_to_voxel(image, [[100, 100, 100]]), [[9, 19, 29]])
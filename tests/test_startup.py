@@ -0,0 +1,63 @@
+"""
+启动耗时与按需导入测试
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from core.startup import StartupProfiler, preload_modules
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_phases_are_reported_in_order():
+    profiler = StartupProfiler()
+    with profiler.phase("a"):
+        time.sleep(0.01)
+    with profiler.phase("b"):
+        time.sleep(0.02)
+    total = profiler.mark_ready()
+
+    report = profiler.report()
+    assert [p["name"] for p in report["phases"]] == ["a", "b"]
+    assert report["phases"][1]["seconds"] >= 0.02
+    assert report["total"] == pytest.approx(total, abs=1e-3)
+    assert report["other"] >= 0
+    assert "a" in profiler.format_report()
+
+
+def test_nested_phase_is_not_double_counted():
+    profiler = StartupProfiler()
+    with profiler.phase("outer"):
+        with profiler.phase("inner"):
+            time.sleep(0.01)
+    profiler.mark_ready()
+    report = profiler.report()
+    outer = next(p for p in report["phases"] if p["name"] == "outer")
+    assert report["other"] == pytest.approx(report["total"] - outer["seconds"], abs=2e-3)
+
+
+def test_preload_modules_skips_missing():
+    thread = preload_modules(["json", "module_that_does_not_exist"])
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_server_import_avoids_heavy_modules():
+    pytest.importorskip("vtkmodules")
+    pytest.importorskip("wslink")
+    code = (
+        "import sys, core.server\n"
+        "heavy = ['vtk', 'pydicom', 'trame', 'vtkmodules.all',\n"
+        "         'vtkmodules.vtkRenderingVolumeOpenGL2']\n"
+        "print(','.join(m for m in heavy if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,134 @@
+"""
+高分辨率分块导出测试
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from core.tiled_export import PNGStreamWriter, tile_layout
+
+
+def _read_png(path):
+    from vtkmodules.vtkIOImage import vtkPNGReader
+
+    from render.numpy_bridge import vtk_to_array
+
+    reader = vtkPNGReader()
+    reader.SetFileName(str(path))
+    reader.Update()
+    image = reader.GetOutput()
+    w, h, _ = image.GetDimensions()
+    return vtk_to_array(image.GetPointData().GetScalars()).reshape(h, w, -1)[::-1]
+
+
+def test_tile_layout():
+    assert tile_layout(7680, 4320, 1024) == (8, 960, 540)
+    assert tile_layout(500, 300, 1024) == (1, 500, 300)
+    m, w, h = tile_layout(1001, 999, 500)
+    assert m == 3 and w * m >= 1001 and h * m >= 999
+    with pytest.raises(ValueError):
+        tile_layout(0, 10, 512)
+
+
+def test_png_stream_round_trip(tmp_path):
+    pytest.importorskip("vtkmodules")
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (37, 53, 3), dtype=np.uint8)
+    writer = PNGStreamWriter(str(tmp_path / "a.png"), 53, 37)
+    for start in range(0, 37, 10):
+        writer.write_rows(image[start:start + 10])
+    writer.close()
+    np.testing.assert_array_equal(_read_png(tmp_path / "a.png"), image)
+
+
+def test_png_stream_validation(tmp_path):
+    writer = PNGStreamWriter(str(tmp_path / "b.png"), 4, 2)
+    with pytest.raises(ValueError):
+        writer.write_rows(np.zeros((1, 5, 3), np.uint8))
+    with pytest.raises(ValueError):
+        writer.write_rows(np.zeros((3, 4, 3), np.uint8))
+    writer.write_rows(np.zeros((1, 4, 3), np.uint8))
+    with pytest.raises(ValueError):
+        writer.close()
+    writer.abort()
+    assert not (tmp_path / "b.png").exists()
+
+
+@pytest.fixture(scope="module")
+def view(tmp_path_factory):
+    pytest.importorskip("vtkmodules")
+    pytest.importorskip("pydicom")
+    from benchmarks.synthetic_dicom import generate_ct_series
+    from core.batch_render import create_offscreen_view
+    from core.server import VRRender
+
+    series_dir = generate_ct_series(str(tmp_path_factory.mktemp("export")), (32, 32, 12))
+    render_window, renderer, interactor = create_offscreen_view(120, 80)
+    vr = VRRender(series_dir, render_window, renderer, interactor)
+    vr.setup()
+    vr.apply_view_state(colormap=[(-1000, 0, 0, 0), (0, 1, 0.5, 0.2), (1500, 1, 1, 1)],
+                        opacity_map=[(-1000, 0.0), (1500, 1.0)])
+    camera = renderer.GetActiveCamera()
+    camera.Azimuth(35)
+    camera.Elevation(20)
+    camera.OrthogonalizeViewUp()
+    renderer.ResetCameraClippingRange()
+    yield vr
+    vr.release()
+    render_window.Finalize()
+
+
+def test_tiles_match_direct_render(view):
+    from core.tiled_export import _read_pixels, render_tiles
+
+    view.render_window.Render()
+    direct = _read_pixels(view.render_window).astype(int)
+    rows = []
+    render_tiles(view.render_window, view.renderer, 120, 80, lambda band: rows.append(band.copy()), max_tile=50)
+    tiled = np.concatenate(rows).astype(int)
+    assert tiled.shape == direct.shape
+    assert np.abs(tiled - direct).mean() < 3
+    # 窗口尺寸与相机已恢复
+    assert tuple(view.render_window.GetSize()) == (120, 80)
+    assert view.renderer.GetActiveCamera().GetWindowCenter() == (0.0, 0.0)
+
+
+def test_capture_follows_displayed_phase(view):
+    from core.tiled_export import capture_view_state
+
+    assert capture_view_state(view)["study"] == view.dicom_dir
+    key, image_data = view.volume_key, view.image_data
+    view.show_volume("/phases/p1", image_data, source_dir="/phases/p1")
+    try:
+        state = capture_view_state(view)
+        assert state["study"] == "/phases/p1" and state["spacing"] is None
+    finally:
+        view.show_volume(key, image_data)
+        view.source_dir, view.source_spacing = view.dicom_dir, view.spacing
+
+
+def test_exporter_background_job(view, tmp_path):
+    from core.tiled_export import TiledExporter, capture_view_state
+
+    state = capture_view_state(view)
+    assert state["colormap"][1] == (0.0, 1.0, 0.5, 0.2)
+    exporter = TiledExporter(str(tmp_path), workers=1, niceness=0, max_tile=64)
+    try:
+        job = exporter.submit(state, 200, 150)
+        assert job["status"] == "queued" and job["tiles"] == 16
+        deadline = time.time() + 120
+        while exporter.status(job["id"])["status"] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.1)
+        done = exporter.status(job["id"])
+        assert done["status"] == "done", done
+        assert done["progress"] == 1.0 and done["bytes"] > 0
+        assert _read_png(done["path"]).shape == (150, 200, 3)
+        assert exporter.active_count() == 0
+        with pytest.raises(ValueError):
+            exporter.status("missing")
+        with pytest.raises(ValueError):
+            exporter.submit(state, 100000, 10)
+    finally:
+        exporter.shutdown()
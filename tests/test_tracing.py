@@ -0,0 +1,83 @@
+"""
+调用链追踪测试
+"""
+
+import json
+
+from core.tracing import Tracer, traced, tracer
+
+
+def test_nested_spans_exported_as_chrome_trace(tmp_path):
+    t = Tracer(capacity=100, sample_rate=1.0)
+    with t.span("rpc", "rpc"):
+        with t.span("render", "render"):
+            pass
+    path = tmp_path / "trace.json"
+    trace = t.export_chrome_trace(str(path))
+    names = [e["name"] for e in trace["traceEvents"]]
+    assert names == ["render", "rpc"]
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in trace["traceEvents"])
+    assert json.loads(path.read_text())["traceEvents"][0]["name"] == "render"
+
+
+def test_ring_buffer_is_bounded():
+    t = Tracer(capacity=10, sample_rate=1.0)
+    for i in range(50):
+        with t.span(f"s{i}"):
+            pass
+    assert len(t) == 10
+    assert t.export_chrome_trace()["traceEvents"][-1]["name"] == "s49"
+
+
+def test_children_follow_root_sampling_decision():
+    t = Tracer(capacity=100, sample_rate=0.0)
+    with t.span("root"):
+        with t.span("child"):
+            pass
+    assert len(t) == 0
+
+
+def test_queued_time_recorded():
+    t = Tracer(capacity=100, sample_rate=1.0)
+    since = t.now()
+    with t.span("rpc", queued_since=since):
+        pass
+    names = [e["name"] for e in t.export_chrome_trace()["traceEvents"]]
+    assert names == ["rpc:queued", "rpc"]
+
+
+def test_traced_decorator_uses_shared_tracer():
+    rate = tracer.sample_rate
+    tracer.set_sample_rate(1.0)
+    tracer.clear()
+    try:
+        @traced("unit.op", cat="rpc")
+        def op(x):
+            return x * 2
+
+        assert op(2) == 4
+        events = tracer.export_chrome_trace()["traceEvents"]
+        assert events[-1]["name"] == "unit.op" and events[-1]["cat"] == "rpc"
+    finally:
+        tracer.set_sample_rate(rate)
+        tracer.clear()
+
+
+def test_traced_coroutine_records_root_span():
+    import asyncio
+
+    rate = tracer.sample_rate
+    tracer.set_sample_rate(1.0)
+    tracer.clear()
+    try:
+        @traced("unit.async", cat="rpc")
+        async def op(x):
+            await asyncio.sleep(0)
+            return x + 1
+
+        assert asyncio.run(op(1)) == 2
+        events = tracer.export_chrome_trace()["traceEvents"]
+        assert [e["name"] for e in events] == ["unit.async"]
+    finally:
+        tracer.set_sample_rate(rate)
+        tracer.clear()
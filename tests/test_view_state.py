@@ -0,0 +1,89 @@
+"""
+批量视图状态（apply_view_state）测试
+"""
+
+import pytest
+
+vtk = pytest.importorskip("vtk")
+
+from core.server import VRRender
+
+
+@pytest.fixture
+def vr_render():
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    renderer = vtk.vtkRenderer()
+    render_window.AddRenderer(renderer)
+    interactor = vtk.vtkRenderWindowInteractor()
+    interactor.SetRenderWindow(render_window)
+
+    vr = VRRender("unused", render_window, renderer, interactor)
+    volume = vtk.vtkVolume()
+    volume.SetProperty(vtk.vtkVolumeProperty())
+    vr.volume = volume
+    return vr
+
+
+def count_renders(render_window):
+    counter = {"n": 0}
+
+    def on_render(obj, event):
+        counter["n"] += 1
+
+    render_window.AddObserver(vtk.vtkCommand.StartEvent, on_render)
+    return counter
+
+
+def test_apply_view_state_renders_once(vr_render):
+    counter = count_renders(vr_render.render_window)
+    version = vr_render.apply_view_state(
+        window=400,
+        level=40,
+        colormap=[(-100, 0, 0, 0), (300, 1, 1, 1)],
+        opacity_map=[(-100, 0.0), (300, 0.8)],
+        camera={"position": (0, 0, 500), "focal_point": (0, 0, 0), "view_up": (0, 1, 0)},
+    )
+    assert version == 1
+    assert counter["n"] == 1
+    prop = vr_render.volume.GetProperty()
+    assert prop.GetRGBTransferFunction().GetSize() == 2
+    assert prop.GetScalarOpacity().GetValue(300) == pytest.approx(0.8)
+    assert vr_render.renderer.GetActiveCamera().GetPosition() == pytest.approx((0, 0, 500))
+
+
+def test_window_level_used_when_no_maps(vr_render):
+    vr_render.apply_view_state(window=200, level=100)
+    opacity = vr_render.volume.GetProperty().GetScalarOpacity()
+    assert opacity.GetRange() == pytest.approx((0, 200))
+
+
+def test_invalid_state_is_rejected_without_side_effects(vr_render):
+    with pytest.raises(ValueError):
+        vr_render.apply_view_state(window=400, level=40, colormap=[(0, 1, 1)])
+    assert vr_render.window == 2000
+    assert vr_render.state_version == 0
+
+
+@pytest.mark.parametrize("camera", [
+    {"position": [1, 2]},
+    {"focal_point": [0, 0, 0], "view_angle": "wide"},
+    {"view_up": None},
+])
+def test_invalid_camera_rejected_before_any_change(vr_render, camera):
+    color_points = vr_render.volume.GetProperty().GetRGBTransferFunction().GetSize()
+    with pytest.raises(ValueError):
+        vr_render.apply_view_state(window=400, level=40, colormap=[(0, 1, 1, 1)], camera=camera)
+    assert vr_render.window == 2000 and vr_render.colormap != [(0, 1, 1, 1)]
+    assert vr_render.volume.GetProperty().GetRGBTransferFunction().GetSize() == color_points
+    assert vr_render.state_version == 0
+
+
+def test_non_numeric_window_level_rejected(vr_render):
+    with pytest.raises(ValueError):
+        vr_render.apply_view_state(window="abc", level=40)
+    assert vr_render.window == 2000
+    # 之后只设置相机的调用不受影响
+    version = vr_render.apply_view_state(camera={"position": (0, 0, 300)})
+    assert version == 1
+    assert vr_render.renderer.GetActiveCamera().GetPosition() == pytest.approx((0, 0, 300))
@@ -0,0 +1,64 @@
+"""
+trame 可视化器切换数据源测试
+"""
+
+import pytest
+
+vtk = pytest.importorskip("vtk")
+pytest.importorskip("trame")
+
+from render.dicom_render import VTKVolumeVisualizer
+
+
+class FakeState(dict):
+    def update(self, values):
+        dict.update(self, values)
+
+
+class FakeServer:
+    def __init__(self):
+        self.state = FakeState()
+
+
+def make_volume(low, high, size=16):
+    source = vtk.vtkImageNoiseSource()
+    source.SetWholeExtent(0, size - 1, 0, size - 1, 0, size - 1)
+    source.SetMinimum(low)
+    source.SetMaximum(high)
+    source.Update()
+    return source.GetOutput()
+
+
+def test_switching_data_source_reuses_pipeline():
+    visualizer = VTKVolumeVisualizer(FakeServer(), make_volume(-1000, 1000))
+    render_window = visualizer.render_window
+    mapper = visualizer.volume_mapper
+    color_func = visualizer.color_func
+
+    second = make_volume(-2000, 3000)
+    visualizer.set_data_source(second)
+
+    assert visualizer.render_window is render_window
+    assert visualizer.volume_mapper is mapper
+    assert mapper.GetInput() is second
+    assert visualizer.renderer.GetVolumes().GetNumberOfItems() == 1
+    assert visualizer.renderer.GetLights().GetNumberOfItems() == 1
+    low, high = color_func.GetRange()
+    assert low == pytest.approx(second.GetScalarRange()[0])
+    assert high == pytest.approx(second.GetScalarRange()[1])
+
+
+def test_segmentation_computed_off_thread_and_dropped_when_stale():
+    visualizer = VTKVolumeVisualizer(FakeServer(), make_volume(-1000, 1000))
+    volume = visualizer.displayed_volume()
+    params = {"low": 0, "high": 1000, "mode": "overlay"}
+    result = VTKVolumeVisualizer.compute_segmentation(volume, params)
+    assert result.voxels > 0
+
+    visualizer.set_data_source(make_volume(-500, 500))
+    assert not visualizer.show_segmentation(volume, result, params)
+    assert visualizer.segmentation is None
+    current = visualizer.displayed_volume()
+    assert visualizer.show_segmentation(current, VTKVolumeVisualizer.compute_segmentation(current, params), params)
+    assert visualizer.segmentation is not None
+    visualizer.release()
@@ -0,0 +1,44 @@
+"""
+体数据统计服务测试
+"""
+
+import numpy as np
+import pytest
+
+from render.volume_stats import TISSUE_BANDS, compute_volume_statistics
+
+
+@pytest.fixture
+def ct_like():
+    rng = np.random.default_rng(0)
+    return rng.integers(-1024, 2000, size=(20, 64, 64)).astype(np.int16)
+
+
+def test_matches_numpy_reference(ct_like):
+    stats = compute_volume_statistics(ct_like, chunk_voxels=10000)
+    assert stats.scalar_range == (ct_like.min(), ct_like.max())
+    assert stats.mean == pytest.approx(ct_like.mean())
+    assert stats.std == pytest.approx(ct_like.std())
+    assert sum(stats.histogram) == ct_like.size
+    assert len(stats.histogram) == 4096
+
+
+def test_percentiles_within_one_bin(ct_like):
+    stats = compute_volume_statistics(ct_like)
+    for q in (1, 50, 99):
+        assert abs(stats.percentile(q) - np.percentile(ct_like, q)) <= stats.bin_width * 1.5
+
+
+def test_tissue_band_counts(ct_like):
+    stats = compute_volume_statistics(ct_like, chunk_voxels=7777)
+    for name, (low, high) in TISSUE_BANDS.items():
+        expected = int(((ct_like >= low) & (ct_like < high)).sum())
+        assert stats.tissue_bands[name] == expected, name
+
+
+def test_auto_window_and_serialization(ct_like):
+    stats = compute_volume_statistics(ct_like)
+    window, level = stats.auto_window_level(1, 99)
+    assert window > 0 and ct_like.min() < level < ct_like.max()
+    compact = stats.to_dict(include_histogram=False)
+    assert "histogram" not in compact and "auto_window" in compact
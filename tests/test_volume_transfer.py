@@ -0,0 +1,58 @@
+"""
+本地渲染体数据传输编码测试
+"""
+
+import numpy as np
+import pytest
+
+vtk = pytest.importorskip("vtk")
+
+from render.volume_transfer import (
+    decode_volume_payload,
+    downsample_factor,
+    encode_volume_payload,
+    image_data_to_array,
+    make_local_image_data,
+    quantize,
+)
+
+
+def make_image(shape=(40, 64, 64)):
+    nz, ny, nx = shape
+    z, y, x = np.mgrid[0:nz, 0:ny, 0:nx]
+    values = (x * 10 + y * 5 + z - 1000).astype(np.int16)
+    image = vtk.vtkImageData()
+    image.SetDimensions(nx, ny, nz)
+    image.SetSpacing(0.7, 0.7, 2.5)
+    from vtk.util import numpy_support
+    image.GetPointData().SetScalars(numpy_support.numpy_to_vtk(values.ravel(), deep=1))
+    return image, values
+
+
+def test_quantize_roundtrip_error_within_one_step():
+    data = np.linspace(-1000, 3000, 1000).reshape(10, 10, 10)
+    q, scale, offset = quantize(data, bits=8)
+    assert q.dtype == np.uint8
+    assert np.abs(q * scale + offset - data).max() <= scale / 2 + 1e-6
+
+
+def test_payload_roundtrip_with_downsampling():
+    image, values = make_image()
+    payload = encode_volume_payload(image, max_dim=32, bits=16)
+    assert payload["dimensions"] == [32, 32, 20]
+    assert payload["spacing"] == pytest.approx([1.4, 1.4, 5.0])
+    assert len(payload["data"]) < payload["raw_bytes"]
+    decoded = decode_volume_payload(payload)
+    assert np.abs(decoded - values[::2, ::2, ::2]).max() <= payload["scale"]
+
+
+def test_local_image_keeps_value_domain():
+    image, values = make_image()
+    local = make_local_image_data(image, max_dim=32)
+    assert local.GetDimensions() == (32, 32, 20)
+    assert np.array_equal(image_data_to_array(local), values[::2, ::2, ::2])
+
+
+def test_downsample_factor():
+    assert downsample_factor((100, 512, 512), 256) == 2
+    assert downsample_factor((10, 20, 30), 256) == 1
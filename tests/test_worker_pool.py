@@ -0,0 +1,115 @@
+"""
+会话路由策略测试
+"""
+
+import asyncio
+import socket
+
+from core.worker_pool import SessionRouter, WorkerInfo
+
+
+def make_router(n=3, slack=2):
+    workers = [WorkerInfo(index=i, port=9100 + i) for i in range(n)]
+    return SessionRouter(workers, affinity_slack=slack), workers
+
+
+def test_new_session_goes_to_least_loaded():
+    router, workers = make_router()
+    workers[0].connections = 3
+    workers[1].connections = 1
+    workers[2].connections = 2
+    assert router.route("s1").index == 1
+
+
+def test_session_is_sticky():
+    router, workers = make_router()
+    first = router.route("s1")
+    first.connections += 5
+    assert router.route("s1").index == first.index
+
+
+def test_same_study_lands_on_same_worker():
+    router, workers = make_router()
+    w = router.route("a", study="/data/study1/series1")
+    w.connections += 1
+    assert router.route("b", study="/data/study1/series1").index == w.index
+
+
+def test_study_affinity_yields_to_overload():
+    router, workers = make_router(slack=1)
+    w = router.route("a", study="st")
+    w.connections += 5
+    assert router.route("b", study="st").index != w.index
+
+
+def test_forget_worker_clears_affinity():
+    router, workers = make_router()
+    w = router.route("a", study="st")
+    w.connections += 1
+    router.forget_worker(w.index)
+    assert "st" not in router.snapshot()["workers"][w.index]["studies"]
+    assert router.route("b", study="st").index != w.index
+
+
+def test_connections_from_before_respawn_are_not_counted(monkeypatch):
+    from core.worker_pool import RenderWorkerPool
+
+    class DeadProcess:
+        pid = 0
+        returncode = 1
+
+        def poll(self):
+            return 1
+
+    pool = RenderWorkerPool(1, 9100, "key")
+    monkeypatch.setattr(pool, "_spawn", lambda worker: None)
+    worker = pool.workers[0]
+    worker.process = DeadProcess()
+    stale = [worker.connect(), worker.connect()]
+    assert pool.respawn_dead() == [0]
+    fresh = worker.connect()
+    for generation in stale:
+        worker.disconnect(generation)
+    assert worker.connections == 1
+    worker.disconnect(fresh)
+    assert worker.connections == 0
+
+
+class AliveProcess:
+    pid = 0
+    returncode = None
+
+    def poll(self):
+        return None
+
+
+def test_workers_not_ready_are_skipped():
+    router, workers = make_router()
+    for worker in workers:
+        worker.process = AliveProcess()
+        worker.ready = True
+    first = router.route("s1", study="st")
+    first.connections += 1
+    # 进程刚重启、端口尚未就绪
+    first.ready = False
+    assert router.route("s2").index != first.index
+    assert router.route("s3", study="st").index != first.index
+    assert router.route("s1").index != first.index
+    assert router.snapshot()["workers"][first.index]["ready"] is False
+
+
+def test_wait_ready_marks_worker_placeable():
+    from core.worker_pool import RenderWorkerPool
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    try:
+        pool = RenderWorkerPool(1, listener.getsockname()[1], "key")
+        worker = pool.workers[0]
+        worker.process = AliveProcess()
+        assert not worker.placeable
+        assert asyncio.run(pool.wait_ready(worker, timeout=5))
+        assert worker.placeable
+    finally:
+        listener.close()